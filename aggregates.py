@@ -0,0 +1,227 @@
+# aggregates.py
+
+import math
+from datetime import datetime
+from types import SimpleNamespace
+from startup import lazy_import
+from analysis_engine import METRIC_KEYS, load_series
+
+np = lazy_import("numpy")
+
+# Running moments kept per user (see WellbeingAggregate in app.py).
+# *_mean / *_m2 are Welford's running mean and sum of squared deviations,
+# *_cm are the matching co-moments (sum of cross-products of deviations).
+# Temperature can be NULL, so mood is tracked a second time over only the
+# rows that have a temperature (temp_mood_*), which keeps the pairs aligned.
+MOMENT_FIELDS = (
+    'count',
+    'mood_mean', 'mood_m2',
+    'sleep_mean', 'sleep_m2',
+    'exercise_mean', 'exercise_m2',
+    'mood_sleep_cm', 'mood_exercise_cm',
+    'temp_count',
+    'temp_mean', 'temp_m2',
+    'temp_mood_mean', 'temp_mood_m2',
+    'mood_temp_cm',
+)
+
+
+def init_moments(agg):
+    """Zeroes every running moment on an aggregate (model instance or namespace)."""
+    for field in MOMENT_FIELDS:
+        setattr(agg, field, 0 if field.endswith('count') else 0.0)
+    return agg
+
+
+def get_or_create_aggregate(db, WellbeingAggregate, user_id):
+    """Returns the user's aggregate row, adding an empty one to the session if missing."""
+    agg = db.session.get(WellbeingAggregate, user_id)
+    if agg is None:
+        agg = init_moments(WellbeingAggregate(user_id=user_id, data_version=0))
+        db.session.add(agg)
+    return agg
+
+
+def bump_data_version(agg):
+    """Marks the user's data as changed; cached reports for older versions stop matching."""
+    agg.data_version = (agg.data_version or 0) + 1
+    agg.updated_at = datetime.utcnow()
+
+
+def mark_rewritten(agg):
+    """
+    After bump_data_version() when existing check-ins changed (not only new ones added):
+    series caches then reload the user's rows instead of fetching just the new ones.
+    """
+    agg.series_version = agg.data_version
+
+
+def get_data_version(db, WellbeingAggregate, user_id):
+    """Returns (data_version, updated_at) for a user, or None if there is no aggregate row yet."""
+    row = db.session.execute(
+        db.select(WellbeingAggregate.data_version, WellbeingAggregate.updated_at)
+        .filter_by(user_id=user_id)
+    ).first()
+    if row is None or row.updated_at is None:
+        return None
+    return row.data_version, row.updated_at
+
+
+def add_temperature(agg, mood, temperature):
+    """Welford update of the mood/temperature pair moments."""
+    agg.temp_count += 1
+    n = agg.temp_count
+    d_temp = temperature - agg.temp_mean
+    d_mood = mood - agg.temp_mood_mean
+    agg.temp_mean += d_temp / n
+    agg.temp_mood_mean += d_mood / n
+    agg.temp_m2 += d_temp * (temperature - agg.temp_mean)
+    agg.temp_mood_m2 += d_mood * (mood - agg.temp_mood_mean)
+    agg.mood_temp_cm += d_mood * (temperature - agg.temp_mean)
+
+
+def add_checkin(agg, mood, sleep_hours, exercise_minutes, temperature=None):
+    """Welford update of all running moments with a single check-in."""
+    agg.count += 1
+    n = agg.count
+    d_mood = mood - agg.mood_mean
+    d_sleep = sleep_hours - agg.sleep_mean
+    d_exercise = exercise_minutes - agg.exercise_mean
+    agg.mood_mean += d_mood / n
+    agg.sleep_mean += d_sleep / n
+    agg.exercise_mean += d_exercise / n
+    agg.mood_m2 += d_mood * (mood - agg.mood_mean)
+    agg.sleep_m2 += d_sleep * (sleep_hours - agg.sleep_mean)
+    agg.exercise_m2 += d_exercise * (exercise_minutes - agg.exercise_mean)
+    agg.mood_sleep_cm += d_mood * (sleep_hours - agg.sleep_mean)
+    agg.mood_exercise_cm += d_mood * (exercise_minutes - agg.exercise_mean)
+
+    if temperature is not None:
+        add_temperature(agg, mood, temperature)
+
+
+def _merge_block(agg, other, count_field, mean_fields, m2_fields, cm_pairs):
+    # Chan et al. pairwise combination of two sets of running moments
+    n_a = getattr(agg, count_field)
+    n_b = getattr(other, count_field)
+    if n_b == 0:
+        return
+    n = n_a + n_b
+    deltas = {f: getattr(other, f) - getattr(agg, f) for f in mean_fields}
+    for cm_field, (x, y) in cm_pairs.items():
+        setattr(agg, cm_field, getattr(agg, cm_field) + getattr(other, cm_field) + deltas[x] * deltas[y] * n_a * n_b / n)
+    for mean_field, m2_field in zip(mean_fields, m2_fields):
+        setattr(agg, m2_field, getattr(agg, m2_field) + getattr(other, m2_field) + deltas[mean_field] ** 2 * n_a * n_b / n)
+        setattr(agg, mean_field, getattr(agg, mean_field) + deltas[mean_field] * n_b / n)
+    setattr(agg, count_field, n)
+
+
+def merge_moments(agg, other):
+    """Folds another set of moments (e.g. from a batch of new rows) into `agg`."""
+    _merge_block(
+        agg, other, 'count',
+        ('mood_mean', 'sleep_mean', 'exercise_mean'),
+        ('mood_m2', 'sleep_m2', 'exercise_m2'),
+        {'mood_sleep_cm': ('mood_mean', 'sleep_mean'), 'mood_exercise_cm': ('mood_mean', 'exercise_mean')},
+    )
+    _merge_block(
+        agg, other, 'temp_count',
+        ('temp_mean', 'temp_mood_mean'),
+        ('temp_m2', 'temp_mood_m2'),
+        {'mood_temp_cm': ('temp_mood_mean', 'temp_mean')},
+    )
+
+
+def moments_from_series(values, target):
+    """Fills every running moment on `target` from an analysis_engine series matrix, vectorized."""
+    init_moments(target)
+    columns = {key: values[:, i] for i, key in enumerate(METRIC_KEYS)}
+    mood = columns['mood']
+    n = len(mood)
+    if n == 0:
+        return target
+
+    target.count = n
+    deviations = {}
+    for key in ('mood', 'sleep', 'exercise'):
+        mean = columns[key].mean()
+        deviations[key] = columns[key] - mean
+        setattr(target, f'{key}_mean', float(mean))
+        setattr(target, f'{key}_m2', float((deviations[key] ** 2).sum()))
+    target.mood_sleep_cm = float((deviations['mood'] * deviations['sleep']).sum())
+    target.mood_exercise_cm = float((deviations['mood'] * deviations['exercise']).sum())
+
+    has_temp = ~np.isnan(columns['temperature'])
+    if has_temp.any():
+        temperature = columns['temperature'][has_temp]
+        temp_mood = mood[has_temp]
+        d_temp = temperature - temperature.mean()
+        d_mood = temp_mood - temp_mood.mean()
+        target.temp_count = int(has_temp.sum())
+        target.temp_mean = float(temperature.mean())
+        target.temp_m2 = float((d_temp ** 2).sum())
+        target.temp_mood_mean = float(temp_mood.mean())
+        target.temp_mood_m2 = float((d_mood ** 2).sum())
+        target.mood_temp_cm = float((d_mood * d_temp).sum())
+    return target
+
+
+def compute_aggregate(db, WellbeingData, user_id, target=None):
+    """Recomputes a user's moments from the raw rows (numeric columns only)."""
+    if target is None:
+        target = SimpleNamespace(user_id=user_id)
+    _, values = load_series(db, WellbeingData, user_id)
+    return moments_from_series(values, target)
+
+
+def rebuild_aggregates(db, WellbeingData, WellbeingAggregate, user_id=None):
+    """Recomputes and stores aggregates for one user, or for every user with check-ins."""
+    if user_id is None:
+        user_ids = db.session.execute(db.select(WellbeingData.user_id).distinct()).scalars().all()
+    else:
+        user_ids = [user_id]
+
+    for uid in user_ids:
+        agg = compute_aggregate(db, WellbeingData, uid, target=get_or_create_aggregate(db, WellbeingAggregate, uid))
+        bump_data_version(agg)
+        mark_rewritten(agg)  # rebuilds follow out-of-band changes to the rows
+    db.session.commit()
+    return len(user_ids)
+
+
+def _stdev(m2, n):
+    return math.sqrt(m2 / (n - 1)) if n > 1 else 0.0
+
+
+def _pearson(cm, m2_x, m2_y, n):
+    # A (near) zero variance on either side means there is no variation to correlate
+    if n < 2 or m2_x <= 1e-12 or m2_y <= 1e-12:
+        return None
+    r = cm / math.sqrt(m2_x * m2_y)
+    return max(-1.0, min(1.0, r))
+
+
+def aggregate_stats(agg):
+    """Turns running moments into means, standard deviations and Pearson r values in O(1)."""
+    n = agg.count
+    n_temp = agg.temp_count
+    return {
+        'entries': n,
+        'mean': {
+            'mood': agg.mood_mean,
+            'sleep': agg.sleep_mean,
+            'exercise': agg.exercise_mean,
+            'temperature': agg.temp_mean if n_temp else 0.0,
+        },
+        'stdev': {
+            'mood': _stdev(agg.mood_m2, n),
+            'sleep': _stdev(agg.sleep_m2, n),
+            'exercise': _stdev(agg.exercise_m2, n),
+            'temperature': _stdev(agg.temp_m2, n_temp),
+        },
+        'correlations': {
+            'temperature': _pearson(agg.mood_temp_cm, agg.temp_mood_m2, agg.temp_m2, n_temp),
+            'sleep': _pearson(agg.mood_sleep_cm, agg.mood_m2, agg.sleep_m2, n),
+            'exercise': _pearson(agg.mood_exercise_cm, agg.mood_m2, agg.exercise_m2, n),
+        },
+    }
@@ -0,0 +1,81 @@
+# analysis_engine.py
+# Vectorized analysis over a user's columnar series (one NumPy array, NaN = missing).
+# Adding a metric means adding one entry to METRICS; no per-pair code is needed.
+
+from startup import lazy_import
+
+np = lazy_import("numpy")
+
+# (key, WellbeingData column). The first metric is the one every other is correlated against.
+METRICS = [
+    ('mood', 'mood_score'),
+    ('temperature', 'temperature'),
+    ('sleep', 'sleep_hours'),
+    ('exercise', 'exercise_minutes'),
+]
+METRIC_KEYS = [key for key, _ in METRICS]
+FACTOR_KEYS = METRIC_KEYS[1:]
+
+# Variance at or below this is treated as "no variation"
+MIN_VARIANCE = 1e-12
+
+
+def load_series(db, WellbeingData, user_id):
+    """
+    Loads the user's history as (timestamps, values): a datetime64 vector and an
+    (n_rows, len(METRICS)) float matrix with NaN for NULLs. Only numeric columns are read.
+    """
+    columns = [getattr(WellbeingData, column) for _, column in METRICS]
+    rows = db.session.execute(
+        db.select(WellbeingData.timestamp, *columns)
+        .filter_by(user_id=user_id)
+        .order_by(WellbeingData.timestamp.asc())
+    ).all()
+    if not rows:
+        return np.empty(0, dtype='datetime64[us]'), np.empty((0, len(METRICS)))
+    timestamps = np.array([row[0] for row in rows], dtype='datetime64[us]')
+    values = np.array([row[1:] for row in rows], dtype=float)  # None -> NaN
+    return timestamps, values
+
+
+def compute_stats(values, keys=METRIC_KEYS):
+    """
+    Means, sample stdevs and mood-vs-factor Pearson r for every metric in one pass.
+    Correlations use pairwise-complete observations, so a NULL in one factor never
+    shifts the alignment of another. Returns the same shape as aggregates.aggregate_stats().
+    `keys` names the columns of `values`; the first is the one correlated against.
+    """
+    values = np.asarray(values, dtype=float)
+    present = ~np.isnan(values)
+    counts = present.sum(axis=0)
+    filled = np.where(present, values, 0.0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, filled.sum(axis=0) / counts, 0.0)
+        deviations = np.where(present, values - means, 0.0)
+        m2 = (deviations ** 2).sum(axis=0)
+        stdevs = np.where(counts > 1, np.sqrt(m2 / (counts - 1)), 0.0)
+
+        # Pairwise-complete moments of mood (column 0) against every column
+        paired = present & present[:, :1]
+        pair_counts = paired.sum(axis=0)
+        pair_x = np.where(paired, values[:, :1], 0.0)
+        pair_y = np.where(paired, values, 0.0)
+        x_means = pair_x.sum(axis=0) / pair_counts
+        y_means = pair_y.sum(axis=0) / pair_counts
+        x_dev = np.where(paired, values[:, :1] - x_means, 0.0)
+        y_dev = np.where(paired, values - y_means, 0.0)
+        x_m2 = (x_dev ** 2).sum(axis=0)
+        y_m2 = (y_dev ** 2).sum(axis=0)
+        r = np.clip((x_dev * y_dev).sum(axis=0) / np.sqrt(x_m2 * y_m2), -1.0, 1.0)
+
+    valid_r = (pair_counts >= 2) & (x_m2 > MIN_VARIANCE) & (y_m2 > MIN_VARIANCE)
+    return {
+        'entries': int(counts[0]),
+        'mean': {key: float(means[i]) for i, key in enumerate(keys)},
+        'stdev': {key: float(stdevs[i]) for i, key in enumerate(keys)},
+        'correlations': {
+            key: float(r[i]) if valid_r[i] else None
+            for i, key in enumerate(keys) if i > 0
+        },
+    }
@@ -2,20 +2,136 @@ import requests
 import json
 import csv
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from breaker import CircuitOpenError, get_breaker
+from cache import cached
+import metrics
 
 # --- Configuration ---
 LOG_FILE_PATH = os.path.join("data_logs", "wellbeing_log.csv")
-QUOTE_API_URL = "https://zenquotes.io/api/today"
-LOCATION_API_URL = "http://ip-api.com/json/"
-WEATHER_API_URL = "https://api.open-meteo.com/v1/forecast"
+# Upstream endpoints; the env overrides point them at local stand-ins (see benchmarks/stub_apis.py)
+QUOTE_API_URL = os.environ.get("WELLBEING_QUOTE_API_URL", "https://zenquotes.io/api/today")
+LOCATION_API_URL = os.environ.get("WELLBEING_LOCATION_API_URL", "http://ip-api.com/json/")
+WEATHER_API_URL = os.environ.get("WELLBEING_WEATHER_API_URL", "https://api.open-meteo.com/v1/forecast")
+
+# Cache lifetimes in seconds. Stale entries are served for one more TTL while refreshing in the background.
+QUOTE_CACHE_TTL = 60 * 60        # zenquotes "today" only changes once a day
+WEATHER_CACHE_TTL = 15 * 60      # open-meteo current conditions update every ~15 minutes
+FORECAST_CACHE_TTL = 60 * 60
+# How long past that an old value still stands in when the upstream fails or its circuit is open
+QUOTE_LAST_GOOD_TTL = 24 * 60 * 60
+WEATHER_LAST_GOOD_TTL = 60 * 60  # older temperatures would be stored against the wrong hour
+FORECAST_LAST_GOOD_TTL = 6 * 60 * 60
+
+# Outbound HTTP: one pooled keep-alive session per process, bounded retries on transient errors.
+HTTP_TIMEOUT = (3.05, 5)         # (connect, read) seconds
+HTTP_RETRIES = 2
+HTTP_POOL_SIZE = 10
+ENRICHMENT_WORKERS = 8
+ENRICHMENT_QUEUE_SIZE = 32       # upstream calls waiting for a worker; beyond this new calls are shed
+# Seconds a request waits for quote and weather together; late calls finish in the background
+ENRICHMENT_BUDGET = float(os.environ.get("WELLBEING_ENRICHMENT_BUDGET", "1.5"))
 # --- End Configuration ---
 
+DEFAULT_QUOTE = {'quote': 'Knowing yourself is the beginning of all wisdom.', 'author': 'Aristotle'}
+
+def _build_session():
+    """Creates the shared requests session with connection pooling and retry policy."""
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=0.2,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,
+        respect_retry_after_header=False,  # never park a worker on a long Retry-After
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+http = _build_session()
+
+def upstream_failed(response):
+    # 4xx other than rate limiting means the upstream is up and answering
+    return response.status_code >= 500 or response.status_code == 429
+
+def upstream_get(upstream, url, **kwargs):
+    """
+    GET through the shared session and the upstream's circuit breaker, recording latency
+    and outcome (ok, error, timeout, short_circuit) per upstream.
+    """
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        response = get_breaker(upstream).call(http.get, url, timeout=HTTP_TIMEOUT, is_failure=upstream_failed, **kwargs)
+        if response.ok:
+            outcome = "ok"
+        return response
+    except CircuitOpenError:
+        outcome = "short_circuit"
+        raise
+    except requests.Timeout:
+        outcome = "timeout"
+        raise
+    finally:
+        if outcome != "short_circuit":
+            metrics.observe("upstream_request_duration_seconds", time.perf_counter() - started, upstream=upstream)
+        metrics.inc("upstream_requests_total", upstream=upstream, outcome=outcome)
+
+class ExecutorBusy(RuntimeError):
+    """Raised by BoundedExecutor.submit() when every worker is busy and the queue is full."""
+
+
+class BoundedExecutor:
+    """
+    A ThreadPoolExecutor that holds at most `max_workers + queue_size` tasks. Past that,
+    submit() raises ExecutorBusy at once instead of queueing work no caller will wait for.
+    """
+
+    def __init__(self, max_workers, queue_size, thread_name_prefix=""):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self._slots = threading.BoundedSemaphore(max_workers + queue_size)
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorBusy("upstream executor queue is full")
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Returns the process-wide bounded thread pool used for concurrent upstream calls."""
+    global _executor, _executor_pid
+    # Threads do not survive a fork, so each gunicorn worker gets its own pool
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = BoundedExecutor(ENRICHMENT_WORKERS, ENRICHMENT_QUEUE_SIZE, thread_name_prefix="upstream")
+                _executor_pid = os.getpid()
+    return _executor
+
 # NOTE: get_current_location() is no longer needed/used in app.py due to hardcoding, but is kept for completeness.
 def get_current_location():
     """Fetches the current city based on IP address."""
     try:
-        response = requests.get(LOCATION_API_URL, timeout=5)
+        response = upstream_get("location", LOCATION_API_URL)
         response.raise_for_status()
         data = response.json()
         if data.get('status') == 'success':
@@ -24,99 +140,143 @@ def get_current_location():
     except (requests.RequestException, json.JSONDecodeError):
         return "Unknown Location"
 
+# Request parameters and response parsing, shared with the async client in async_api.py
+def weather_params(city):
+    LAT = 51.5074
+    LON = 0.1278
+    return {
+        "latitude": LAT,
+        "longitude": LON,
+        "current": ["temperature_2m", "relative_humidity_2m", "rain", "snowfall", "wind_speed_10m", "wind_direction_10m", "apparent_temperature"],
+        "timezone": "Europe/London"
+    }
+
+def forecast_params(city):
+    LAT = 51.5074
+    LON = 0.1278
+    return {
+        "latitude": LAT,
+        "longitude": LON,
+        "daily": ["temperature_2m_max", "temperature_2m_min", "precipitation_sum"],
+        "timezone": "Europe/London",
+        "forecast_days": 7
+    }
+
+def parse_quote(payload):
+    data = payload[0] 
+    quote = data.get('q', 'No quote available.')
+    author = data.get('a', 'Unknown')
+    print(f"Quote: {quote} — {author}")
+    return {'quote': quote, 'author': author}
+
+def parse_weather(payload):
+    current = payload['current']
+    
+    return {
+        'temp': current['temperature_2m'],
+        'humidity': current['relative_humidity_2m'],
+        'wind_speed': current['wind_speed_10m'],
+        'rain': current['rain'],
+        'snowfall': current['snowfall'],
+        'feels_like': current.get('apparent_temperature', current['temperature_2m'])
+    }
+
+def parse_forecast(city, payload):
+    daily = payload['daily']
+    forecast_list = []
+    
+    for i in range(7):
+        date = daily['time'][i]
+        max_temp = daily['temperature_2m_max'][i]
+        min_temp = daily['temperature_2m_min'][i]
+        precip = daily['precipitation_sum'][i]
+        
+        if precip > 5.0:
+            icon = 'heavy_rain'
+        elif precip > 0.1:
+            icon = 'rain'
+        else:
+            icon = 'sun'
+        
+        forecast_list.append({
+            "date": date,
+            "max_temp": f"{max_temp:.1f}",
+            "min_temp": f"{min_temp:.1f}",
+            "precipitation_mm": f"{precip:.1f}",
+            "icon_key": icon
+        })
+
+    return {"city": city, "forecast": forecast_list}
+
+@cached("quote", QUOTE_CACHE_TTL, accept=lambda result: result != DEFAULT_QUOTE, last_good_ttl=QUOTE_LAST_GOOD_TTL)
 def fetch_wellbeing_quote():
     """Fetches a daily quote and returns a dictionary."""
     # Print statement kept for terminal debugging/logging
     print("\n*** Your Daily Dose of Wellbeing ***") 
     try:
-        response = requests.get(QUOTE_API_URL, timeout=5)
+        response = upstream_get("quote", QUOTE_API_URL)
         response.raise_for_status()
-        data = response.json()[0] 
-        quote = data.get('q', 'No quote available.')
-        author = data.get('a', 'Unknown')
-        print(f"Quote: {quote} — {author}")
-        return {'quote': quote, 'author': author}
+        return parse_quote(response.json())
     except requests.RequestException as e:
         print(f"[Quote API Error] Could not fetch quote. Using default. Error: {e}")
-        return {'quote': 'Knowing yourself is the beginning of all wisdom.', 'author': 'Aristotle'}
+        return dict(DEFAULT_QUOTE)
 
+@cached("weather", WEATHER_CACHE_TTL, accept=lambda result: result is not None, last_good_ttl=WEATHER_LAST_GOOD_TTL)
 def fetch_weather(city):
     """Fetches current weather data for the detected city and returns a dictionary."""
-    LAT = 51.5074
-    LON = 0.1278
-    params = {
-        "latitude": LAT,
-        "longitude": LON,
-        "current": ["temperature_2m", "relative_humidity_2m", "rain", "snowfall", "wind_speed_10m", "wind_direction_10m", "apparent_temperature"],
-        "timezone": "Europe/London"
-    }
-    
     try:
-        response = requests.get(WEATHER_API_URL, params=params, timeout=5)
+        response = upstream_get("weather", WEATHER_API_URL, params=weather_params(city))
         response.raise_for_status()
-        current = response.json()['current']
-        
-        return {
-            'temp': current['temperature_2m'],
-            'humidity': current['relative_humidity_2m'],
-            'wind_speed': current['wind_speed_10m'],
-            'rain': current['rain'],
-            'snowfall': current['snowfall'],
-            'feels_like': current.get('apparent_temperature', current['temperature_2m'])
-        }
+        return parse_weather(response.json())
     except requests.RequestException as e:
         print(f"[Weather API Error] Could not fetch weather data. Error: {e}")
         return None
 
 
+@cached("forecast", FORECAST_CACHE_TTL, accept=lambda result: "error" not in result, last_good_ttl=FORECAST_LAST_GOOD_TTL)
 def fetch_forecast(city):
     """
     MODIFIED: Fetches the 7-day weather forecast and returns a list of dictionaries 
     for the API, instead of printing.
     """
-    LAT = 51.5074
-    LON = 0.1278
-    params = {
-        "latitude": LAT,
-        "longitude": LON,
-        "daily": ["temperature_2m_max", "temperature_2m_min", "precipitation_sum"],
-        "timezone": "Europe/London",
-        "forecast_days": 7
-    }
-    
-    forecast_list = []
-    
     try:
-        response = requests.get(WEATHER_API_URL, params=params, timeout=5)
+        response = upstream_get("forecast", WEATHER_API_URL, params=forecast_params(city))
         response.raise_for_status()
-        daily = response.json()['daily']
-        
-        for i in range(7):
-            date = daily['time'][i]
-            max_temp = daily['temperature_2m_max'][i]
-            min_temp = daily['temperature_2m_min'][i]
-            precip = daily['precipitation_sum'][i]
-            
-            if precip > 5.0:
-                icon = 'heavy_rain'
-            elif precip > 0.1:
-                icon = 'rain'
-            else:
-                icon = 'sun'
-            
-            forecast_list.append({
-                "date": date,
-                "max_temp": f"{max_temp:.1f}",
-                "min_temp": f"{min_temp:.1f}",
-                "precipitation_mm": f"{precip:.1f}",
-                "icon_key": icon
-            })
-
-        return {"city": city, "forecast": forecast_list}
+        return parse_forecast(city, response.json())
 
     except requests.RequestException as e:
         return {"error": f"Could not fetch forecast data: {e}"}
 
+def _result_within(future, deadline, upstream, fallback):
+    """The future's result if it lands before `deadline` (None waits forever), else `fallback()`."""
+    timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        metrics.inc("enrichment_budget_exceeded_total", upstream=upstream)
+        return fallback()
+    except ExecutorBusy:
+        metrics.inc("enrichment_shed_total", upstream=upstream)
+        return fallback()
+
+def fetch_enrichment(city, budget=ENRICHMENT_BUDGET):
+    """
+    Fetches the daily quote and current weather concurrently.
+    Returns (quote_result, weather_result); latency is the slower of the two calls, capped at
+    `budget` seconds (None: no cap). A call still running then keeps going in the background
+    and fills the cache, and this request gets the last known good value (the default quote,
+    or None for the weather) right away. Cache hits never touch the executor, concurrent
+    misses share one call per key, and calls the full executor sheds get that value too.
+    """
+    executor = get_executor()
+    deadline = None if budget is None else time.monotonic() + budget
+    quote_future = fetch_wellbeing_quote.submit(executor)
+    weather_future = fetch_weather.submit(executor, city)
+    quote_result = _result_within(quote_future, deadline, "quote",
+                                  lambda: fetch_wellbeing_quote.last_good() or dict(DEFAULT_QUOTE))
+    weather_result = _result_within(weather_future, deadline, "weather", lambda: fetch_weather.last_good(city))
+    return quote_result, weather_result
+
 def log_wellbeing_data(quote, author, city, temp, mood, sleep_hours, exercise_done, exercise_minutes): 
     """Logs daily wellbeing data to a CSV file."""
     
@@ -1,26 +1,57 @@
 	# app.py
 
-from flask import Flask, jsonify, request 
+from flask import Flask, Response, jsonify, request, send_file, stream_with_context 
 import json
 import os
 import statistics
+import subprocess
+import sys
 from datetime import datetime # ADDED for database timestamps
 from api_service import (
     fetch_wellbeing_quote, 
     fetch_weather, 
+    fetch_enrichment,
     # log_wellbeing_data is removed
     fetch_forecast 
 ) 
-from main import analyze_wellbeing_log as get_wellbeing_analysis 
+from main import analyze_wellbeing_log as get_wellbeing_analysis, analyze_windows, get_latest_mood
+from aggregates import add_checkin, bump_data_version, get_data_version, get_or_create_aggregate
+from enrichment import CHECKIN_MODE, enqueue, ensure_worker, queue_status
+from ingest import DEFAULT_CITY, MOOD_SCORES, REQUIRED_FIELDS, insert_checkins, iter_request_rows
+from history import DEFAULT_PAGE_SIZE, fetch_page, iter_export
+from reference_data import reference_ids
+from weather_history import day_weather_stats
+from rollups import BUCKETS, add_checkins_to_rollups, parse_windows
 from flask_sqlalchemy import SQLAlchemy 
 from sqlalchemy.orm import relationship 
+from werkzeug.exceptions import BadRequest
+from migrations import current_version, migrate
+from sqlite_profile import install_sqlite_profile
+from report_cache import conditional_report, make_key
+from identity import current_user, ensure_default_user, init_identity
+from analysis_engine import METRIC_KEYS, METRICS
+from downsample import DEFAULT_MAX_POINTS, MAX_POINTS_LIMIT, METHODS, downsample_series
+from charts import CHART_FORMATS, CHART_RETRY_AFTER, parse_options, request_chart
+from charts import stats as chart_stats
+from cache import stats as upstream_cache_stats
+from identity import stats as identity_stats
+from report_cache import stats as report_cache_stats
+from series_cache import append_checkin, get_series
+from series_cache import stats as series_stats
+from shards import ShardedSession, init_sharding
+import metrics
 
 app = Flask(__name__)
 
 # --- DATABASE CONFIGURATION ---
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///wellbeing.db' 
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///wellbeing.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+# Per-user tables go to the caller's shard file when WELLBEING_SHARDS is set (see shards.py)
+db = SQLAlchemy(app, session_options={"class_": ShardedSession})
+
+# WAL, busy_timeout, mmap etc. on every new connection (see sqlite_profile.py)
+with app.app_context():
+    install_sqlite_profile(db.engine)
 
 # --- USER MODEL DEFINITION ---
 class User(db.Model):
@@ -44,28 +75,174 @@ class WellbeingData(db.Model):
     sleep_hours = db.Column(db.Float, nullable=False)
     exercise_minutes = db.Column(db.Integer, nullable=False)
     
-    # External Data
-    city = db.Column(db.String(50))
+    # External Data: the reading itself stays on the row for analysis; where and when it
+    # was observed, and the day's quote, are interned (see reference_data.py)
     temperature = db.Column(db.Float)
-    
-    # Daily Quote
-    quote_text = db.Column(db.String(500))
-    quote_author = db.Column(db.String(100))
+    weather_id = db.Column(db.Integer, db.ForeignKey('weather_observation.id'))
+    quote_id = db.Column(db.Integer, db.ForeignKey('quote.id'))
+    weather = db.relationship('WeatherObservation')
+    quote = db.relationship('Quote')
+
+    # Schema changes are applied by migrations.py; keep this in step with it
+    __table_args__ = (
+        db.Index('ix_wellbeing_data_user_timestamp', 'user_id', 'timestamp'),
+    )
     
     def __repr__(self):
         return f'<Log {self.timestamp} - Mood: {self.mood_score}>'
 
-# --- USER TIER SIMULATION FUNCTION ---
+# --- INTERNED REFERENCE DATA (One row per day's quote and per hourly weather observation) ---
+class Quote(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    text = db.Column(db.String(500), nullable=False)
+    author = db.Column(db.String(100), nullable=False, default='')
+
+    __table_args__ = (db.UniqueConstraint('day', 'text', 'author'),)
+
+    def __repr__(self):
+        return f'<Quote {self.day} - {self.author}>'
+
+class WeatherObservation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    location = db.Column(db.String(50), nullable=False)
+    hour = db.Column(db.DateTime, nullable=False)
+    temperature = db.Column(db.Float)
+
+    __table_args__ = (db.UniqueConstraint('location', 'hour'),)
+
+    def __repr__(self):
+        return f'<Weather {self.location} {self.hour}: {self.temperature}>'
+
+# --- DAILY WEATHER HISTORY (Backfilled per location and UTC day, see weather_history.py) ---
+class DailyWeather(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    location = db.Column(db.String(50), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    temp_min = db.Column(db.Float)
+    temp_max = db.Column(db.Float)
+    temp_mean = db.Column(db.Float)
+    precipitation = db.Column(db.Float)
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('location', 'day'),)
+
+    def __repr__(self):
+        return f'<DailyWeather {self.location} {self.day}: {self.temp_min}-{self.temp_max}>'
+
+# --- PER-USER RUNNING AGGREGATES (Updated on every check-in, see aggregates.py) ---
+class WellbeingAggregate(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+    # Welford running means / squared deviations over all check-ins
+    mood_mean = db.Column(db.Float, default=0.0, nullable=False)
+    mood_m2 = db.Column(db.Float, default=0.0, nullable=False)
+    sleep_mean = db.Column(db.Float, default=0.0, nullable=False)
+    sleep_m2 = db.Column(db.Float, default=0.0, nullable=False)
+    exercise_mean = db.Column(db.Float, default=0.0, nullable=False)
+    exercise_m2 = db.Column(db.Float, default=0.0, nullable=False)
+    mood_sleep_cm = db.Column(db.Float, default=0.0, nullable=False)
+    mood_exercise_cm = db.Column(db.Float, default=0.0, nullable=False)
+
+    # Same moments over only the check-ins that have a temperature
+    temp_count = db.Column(db.Integer, default=0, nullable=False)
+    temp_mean = db.Column(db.Float, default=0.0, nullable=False)
+    temp_m2 = db.Column(db.Float, default=0.0, nullable=False)
+    temp_mood_mean = db.Column(db.Float, default=0.0, nullable=False)
+    temp_mood_m2 = db.Column(db.Float, default=0.0, nullable=False)
+    mood_temp_cm = db.Column(db.Float, default=0.0, nullable=False)
+
+    # Bumped on every write to the user's check-ins; keys the cached analysis responses
+    data_version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime)
+    # data_version of the last change to existing check-ins, as opposed to new ones
+    series_version = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<Aggregate user={self.user_id} n={self.count}>'
+
+# --- DAILY ROLLUPS (Sums per user and day for rolling windows, see rollups.py) ---
+class DailyRollup(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    mood_sum = db.Column(db.Float, default=0.0, nullable=False)
+    mood_sq = db.Column(db.Float, default=0.0, nullable=False)
+    sleep_sum = db.Column(db.Float, default=0.0, nullable=False)
+    sleep_sq = db.Column(db.Float, default=0.0, nullable=False)
+    exercise_sum = db.Column(db.Float, default=0.0, nullable=False)
+    exercise_sq = db.Column(db.Float, default=0.0, nullable=False)
+    mood_sleep_sum = db.Column(db.Float, default=0.0, nullable=False)
+    mood_exercise_sum = db.Column(db.Float, default=0.0, nullable=False)
+    temp_count = db.Column(db.Integer, default=0, nullable=False)
+    temp_sum = db.Column(db.Float, default=0.0, nullable=False)
+    temp_sq = db.Column(db.Float, default=0.0, nullable=False)
+    temp_mood_sum = db.Column(db.Float, default=0.0, nullable=False)
+    temp_mood_sq = db.Column(db.Float, default=0.0, nullable=False)
+    mood_temp_sum = db.Column(db.Float, default=0.0, nullable=False)
+
+    def __repr__(self):
+        return f'<Rollup user={self.user_id} day={self.day} n={self.count}>'
+
+# --- PRECOMPUTED REPORTS (Written offline by cohort_job.py) ---
+class AnalysisReport(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    entries = db.Column(db.Integer, nullable=False)    # rows covered
+    data_version = db.Column(db.Integer)               # the aggregate's version when computed; stale once it moves
+    stats = db.Column(db.Text, nullable=False)         # JSON, same shape as analysis_engine.compute_stats()
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<Report user={self.user_id} n={self.entries}>'
+
+class CohortReport(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    users = db.Column(db.Integer, nullable=False)
+    entries = db.Column(db.Integer, nullable=False)
+    stats = db.Column(db.Text, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<CohortReport {self.computed_at} users={self.users}>'
+
+# --- WRITE-BEHIND ENRICHMENT QUEUE (Check-ins still waiting for weather/quote, see enrichment.py) ---
+class PendingEnrichment(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    log_id = db.Column(db.Integer, db.ForeignKey('wellbeing_data.id'), unique=True, nullable=False)
+    bucket = db.Column(db.DateTime, nullable=False, index=True)
+    enqueued_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    location = db.Column(db.String(50))
+    log = db.relationship('WellbeingData')
+
+    def __repr__(self):
+        return f'<Pending log={self.log_id} bucket={self.bucket}>'
+
+# --- METRICS ---
+# Request, database, upstream and cache instrumentation, served on /metrics (see metrics.py).
+# Registered before the identity hook so request timings include resolving the caller.
+metrics.init_metrics(app, db)
+for cache_name, cache_stats in (("upstream", upstream_cache_stats), ("report", report_cache_stats),
+                                ("identity", identity_stats), ("chart", chart_stats),
+                                ("series", series_stats)):
+    metrics.register_stats(cache_name, cache_stats)
+
+# --- USER IDENTITY ---
+# The caller is resolved once per request by identity.py (signed bearer token)
+init_identity(app, db, User)
+# ...and then the shard their check-ins live on
+init_sharding(app, db)
+
+# Create the default user once at startup (the schema may not exist yet on a fresh install;
+# `python app.py`, init_db.py and db_setup.py create it after migrating)
+with app.app_context():
+    with db.engine.connect() as conn:
+        if current_version(conn) > 0:
+            ensure_default_user(db, User)
+
 def get_current_user():
-    # Simulates fetching the logged-in user and creates a dummy user if none exists
-    with app.app_context():
-        user = db.session.execute(db.select(User).filter_by(username='test_user')).scalar_one_or_none()
-        if not user:
-            dummy_user = User(username='test_user', tier='free')
-            db.session.add(dummy_user)
-            db.session.commit()
-            return dummy_user
-        return user
+    # (id, username, tier) for this request, from the before_request hook
+    return current_user()
 
 # =================================================================
 # FIX: ROOT ROUTE / HEALTH CHECK (NEW CODE ADDED HERE)
@@ -81,6 +258,37 @@ def health_check():
 # =================================================================
 
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text exposition of the counters and histograms of every worker."""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def status_payload(tier, quote_result, weather_result):
+    """The /api/status body (shared with the ASGI route in asgi.py)."""
+    response_data = {
+        "status": "ok",
+        "user_tier": tier,
+        "quote": {
+            "text": quote_result.get('quote', 'N/A'),
+            "author": quote_result.get('author', 'N/A')
+        },
+        "weather": {
+            "temp": 'N/A',
+            "feels_like": 'N/A',
+            "advice": "Weather data is unavailable right now."
+        }
+    }
+    # None when the weather API is down (or over the latency budget) with nothing recent cached
+    if weather_result is not None:
+        response_data["weather"] = {
+            "temp": weather_result.get('temp', 'N/A'),
+            "feels_like": weather_result.get('feels_like', 'N/A'),
+            "advice": "😌 Current weather conditions are generally mild." 
+        }
+    return response_data
+
+
 # ---------------------------------------
 # Endpoint 1: Status & Daily Data
 # ---------------------------------------
@@ -89,27 +297,75 @@ def get_status_data():
     current_user = get_current_user() 
     
     try:
-        quote_result = fetch_wellbeing_quote() 
-        weather_result = fetch_weather("Waltham Forest") 
+        quote_result, weather_result = fetch_enrichment("Waltham Forest") 
+        response_data = status_payload(current_user.tier, quote_result, weather_result)
 
-        response_data = {
-            "status": "ok",
-            "user_tier": current_user.tier,
-            "quote": {
-                "text": quote_result.get('quote', 'N/A'),
-                "author": quote_result.get('author', 'N/A')
-            },
-            "weather": {
-                "temp": weather_result.get('temp', 'N/A'),
-                "feels_like": weather_result.get('feels_like', 'N/A'),
-                "advice": "😌 Current weather conditions are generally mild." 
-            }
-        }
-        return jsonify(response_data)
+        # Cached upstream data changes rarely; let clients revalidate with If-None-Match
+        response = jsonify(response_data)
+        response.add_etag()
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({"status": "error", "message": f"Server error on /api/status: {e}"}), 500
 
 
+def store_checkin(user_id, data, quote_result, weather_result):
+    """
+    Stores one validated check-in with its aggregates and rollups, enriched if both lookups
+    succeeded and queued for enrichment otherwise. Returns (body, status code); shared with
+    the ASGI route in asgi.py. The caller rolls back on error.
+    """
+    enriched = bool(quote_result and weather_result)
+
+    # Create and save a new database entry (replacing CSV logging)
+    timestamp = datetime.utcnow()
+    temperature = weather_result['temp'] if enriched else None
+    quote_id, weather_id = None, None
+    if enriched:
+        quote_id, weather_id = reference_ids(
+            db, Quote, WeatherObservation, timestamp, DEFAULT_CITY, temperature,
+            quote_result['quote'], quote_result['author']
+        )
+    new_log = WellbeingData(
+        user_id=user_id,
+        timestamp=timestamp,
+        mood_score=int(data['mood']),
+        sleep_hours=float(data['sleep_hours']),
+        exercise_minutes=int(data['exercise_minutes']),
+        temperature=temperature,
+        quote_id=quote_id,
+        weather_id=weather_id
+    )
+
+    db.session.add(new_log)
+    if not enriched:
+        enqueue(db, PendingEnrichment, new_log, DEFAULT_CITY)
+
+    # Keep the running aggregates in the same transaction as the new row
+    aggregate = get_or_create_aggregate(db, WellbeingAggregate, user_id)
+    add_checkin(aggregate, new_log.mood_score, new_log.sleep_hours, new_log.exercise_minutes, new_log.temperature)
+    bump_data_version(aggregate)
+    add_checkins_to_rollups(db, DailyRollup, user_id, [
+        (new_log.timestamp, new_log.mood_score, new_log.sleep_hours, new_log.exercise_minutes, new_log.temperature)
+    ])
+
+    db.session.flush()
+    appended = (new_log.id, aggregate.data_version, aggregate.updated_at, aggregate.count)
+    db.session.commit()
+
+    # This worker's cached series (if any) takes the new row without a reload
+    log_id, version, updated_at, count = appended
+    append_checkin(user_id, version - 1, version, updated_at, count, log_id, timestamp, [
+        getattr(new_log, column) for _, column in METRICS
+    ])
+
+    if not enriched:
+        ensure_worker(app, db, WellbeingData, WellbeingAggregate, DailyRollup, PendingEnrichment, Quote, WeatherObservation,
+                      DailyWeather)
+        return {"status": "accepted", "message": "Data logged; weather and quote will be added shortly."}, 202
+
+    return {"status": "success", "message": "Data logged to database successfully."}, 201
+
+
 # ---------------------------------------
 # Endpoint 2: Check-in (Logs Data to DB)
 # ---------------------------------------
@@ -120,36 +376,68 @@ def checkin():
     try:
         data = request.get_json()
 
-        required_fields = ['mood', 'sleep_hours', 'exercise_done', 'exercise_minutes']
-        if not all(field in data for field in required_fields):
+        if not all(field in data for field in REQUIRED_FIELDS):
             return jsonify({"status": "error", "message": "Missing required fields"}), 400
 
-        quote_result = fetch_wellbeing_quote() 
-        weather_result = fetch_weather("Waltham Forest")
-
-        if not quote_result or not weather_result:
-             return jsonify({"status": "error", "message": "External API failure preventing log."}), 500
-
-        # Create and save a new database entry (replacing CSV logging)
-        new_log = WellbeingData(
-            user_id=current_user.id,
-            mood_score=int(data['mood']),
-            sleep_hours=float(data['sleep_hours']),
-            exercise_minutes=int(data['exercise_minutes']),
-            city="Waltham Forest",
-            temperature=weather_result['temp'],
-            quote_text=quote_result['quote'],
-            quote_author=quote_result['author']
-        )
+        # In async mode (or when an upstream fails) the row is stored now and enriched later
+        quote_result, weather_result = None, None
+        if CHECKIN_MODE != 'async':
+            quote_result, weather_result = fetch_enrichment(DEFAULT_CITY)
+        payload, status_code = store_checkin(current_user.id, data, quote_result, weather_result)
+        return jsonify(payload), status_code
 
-        db.session.add(new_log)
-        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error during checkin: {e}")
+        return jsonify({"status": "error", "message": f"Internal server error: {e}"}), 500
 
-        return jsonify({"status": "success", "message": "Data logged to database successfully."}), 201
 
+# ---------------------------------------
+# Endpoint 2a: Bulk Check-in (JSON array or NDJSON)
+# ---------------------------------------
+@app.route('/api/checkin/batch', methods=['POST'])
+def checkin_batch():
+    current_user = get_current_user() 
+    
+    try:
+        inserted, error_count, errors = insert_checkins(
+            db, WellbeingData, WellbeingAggregate, DailyRollup, Quote, WeatherObservation,
+            current_user.id, iter_request_rows(request)
+        )
+    except (ValueError, BadRequest) as e:
+        # BadRequest: a JSON array body that does not parse
+        db.session.rollback()
+        message = e.description if isinstance(e, BadRequest) else str(e)
+        return jsonify({"status": "error", "message": message}), 400
     except Exception as e:
         db.session.rollback()
-        print(f"Error during checkin: {e}")
+        print(f"Error during batch checkin: {e}")
+        return jsonify({"status": "error", "message": f"Internal server error: {e}"}), 500
+
+    if error_count and not inserted:
+        status, code = "error", 400
+    elif error_count:
+        status, code = "partial", 207
+    else:
+        status, code = "success", 201
+
+    return jsonify({
+        "status": status,
+        "inserted": inserted,
+        "error_count": error_count,
+        "errors": errors
+    }), code
+
+
+# ---------------------------------------
+# Endpoint 2b: Enrichment Queue Status
+# ---------------------------------------
+@app.route('/api/checkin/queue', methods=['GET'])
+def checkin_queue_status():
+    try:
+        return jsonify({"status": "success", "queue": queue_status(db, PendingEnrichment)})
+    except Exception as e:
+        print(f"Error during queue status: {e}")
         return jsonify({"status": "error", "message": f"Internal server error: {e}"}), 500
 
 
@@ -161,22 +449,63 @@ def analysis():
     current_user = get_current_user() 
     
     try:
-        current_mood = 4 
-        
-        # Pass the database models and user ID to the analysis function
-        analysis_data = get_wellbeing_analysis(
-            current_mood=current_mood, 
-            user_tier=current_user.tier, 
-            user_id=current_user.id,
-            db=db, 
-            WellbeingData=WellbeingData
-        ) 
-        
-        return jsonify({
+        # Optional rolling windows (?window=7d,30d&bucket=week) answered from the daily rollups
+        windows = parse_windows(request.args['window']) if 'window' in request.args else None
+        bucket = request.args.get('bucket', 'day')
+        if bucket not in BUCKETS:
+            raise ValueError(f"bucket must be one of: {', '.join(BUCKETS)}")
+        requested_mood = request.args.get('current_mood', type=int)
+        if 'current_mood' in request.args and requested_mood not in MOOD_SCORES:
+            raise ValueError(f"current_mood must be a whole number from {MOOD_SCORES[0]} to {MOOD_SCORES[-1]}")
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    def build_report():
+        current_mood = requested_mood
+        if current_mood is None:
+            current_mood = get_latest_mood(current_user.id, db, WellbeingData)
+        with metrics.timer("analysis_compute_duration_seconds", tier=current_user.tier):
+            # Day-level weather only feeds the premium correlations, so free reports skip the join
+            day_weather = None
+            if current_user.tier == 'premium':
+                day_weather = day_weather_stats(db, WellbeingData, WellbeingAggregate, WeatherObservation, DailyWeather,
+                                                current_user.id)
+
+            # Pass the database models and user ID to the analysis function
+            analysis_data = get_wellbeing_analysis(
+                current_mood=current_mood, 
+                user_tier=current_user.tier, 
+                user_id=current_user.id,
+                db=db, 
+                WellbeingData=WellbeingData,
+                WellbeingAggregate=WellbeingAggregate,
+                AnalysisReport=AnalysisReport,
+                day_weather=day_weather
+            ) 
+
+        response_data = {
             "status": "success",
             "tier": current_user.tier,
             "report": analysis_data 
-        })
+        }
+        if windows:
+            response_data["rolling"] = analyze_windows(current_user.tier, current_user.id, db, DailyRollup, windows, bucket)
+        return response_data, 200
+
+    try:
+        # Served from the report cache while the user's data version is unchanged
+        version = get_data_version(db, WellbeingAggregate, current_user.id)
+        if version is None:
+            return jsonify(build_report()[0])
+        data_version, updated_at = version
+        key = make_key(current_user.id, current_user.tier, request.args)
+        not_before = None
+        if windows:
+            # Trailing windows end today, so they also expire at midnight
+            today = datetime.utcnow().date()
+            key += f":{today}"
+            not_before = datetime.combine(today, datetime.min.time())
+        return conditional_report(request, key, data_version, updated_at, build_report, not_before=not_before)
 
     except Exception as e:
         print(f"Error during analysis: {e}")
@@ -204,10 +533,141 @@ def get_forecast_data():
         return jsonify({"status": "error", "message": f"Internal server error: {e}"}), 500 # 💡 SYNTAX ERROR IS FIXED HERE!
 
 
+# ---------------------------------------
+# Endpoint 5: History (Keyset-paginated raw logs)
+# ---------------------------------------
+@app.route('/api/logs', methods=['GET'])
+def get_logs():
+    current_user = get_current_user() 
+    
+    try:
+        rows, next_cursor = fetch_page(
+            db, WellbeingData, Quote, WeatherObservation, current_user.id,
+            after=request.args.get('after'),
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE)
+        )
+        return jsonify({
+            "status": "success",
+            "data": rows,
+            "next_cursor": next_cursor
+        })
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        print(f"Error during logs fetch: {e}")
+        return jsonify({"status": "error", "message": f"Internal server error: {e}"}), 500
+
+
+# ---------------------------------------
+# Endpoint 6: History Export (Streamed CSV / NDJSON)
+# ---------------------------------------
+@app.route('/api/logs/export', methods=['GET'])
+def export_logs():
+    current_user = get_current_user() 
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"status": "error", "message": "format must be 'csv' or 'ndjson'"}), 400
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(iter_export(db, WellbeingData, Quote, WeatherObservation, current_user.id, fmt)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=wellbeing_logs.{fmt}"}
+    )
+
+
+# ---------------------------------------
+# Endpoint 7: Charts (rendered in the background, served from a content-addressed cache)
+# ---------------------------------------
+@app.route('/api/charts', methods=['GET'])
+def charts():
+    current_user = get_current_user() 
+
+    try:
+        fmt, options = parse_options(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        version = get_data_version(db, WellbeingAggregate, current_user.id)
+        if version is None:
+            return jsonify({"status": "error", "message": "No check-ins to chart yet"}), 404
+
+        state, detail = request_chart(
+            current_user.id, version[0], fmt, options,
+            load=lambda: get_series(db, WellbeingData, WellbeingAggregate, current_user.id)
+        )
+        if state == "ready":
+            # The file name is the content hash, so it doubles as a strong ETag
+            response = send_file(detail, mimetype=CHART_FORMATS[fmt], etag=os.path.basename(detail), max_age=0)
+            response.cache_control.private = True
+            return response.make_conditional(request)
+        if state == "failed":
+            return jsonify({"status": "error", "message": f"Chart rendering failed: {detail}"}), 422
+
+        # Still rendering: the client polls the same URL
+        response = jsonify({"status": "pending", "job": detail, "retry_after": CHART_RETRY_AFTER})
+        response.status_code = 202
+        response.headers["Retry-After"] = str(CHART_RETRY_AFTER)
+        return response
+
+    except Exception as e:
+        print(f"Error during chart request: {e}")
+        return jsonify({"status": "error", "message": f"Internal server error: {e}"}), 500
+
+
+# ---------------------------------------
+# Endpoint 8: Trends (downsampled series for the front end)
+# ---------------------------------------
+@app.route('/api/trends', methods=['GET'])
+def trends():
+    current_user = get_current_user() 
+
+    try:
+        requested_metrics = request.args.get('metrics', ','.join(METRIC_KEYS)).split(',')
+        unknown = [metric for metric in requested_metrics if metric not in METRIC_KEYS]
+        if unknown:
+            raise ValueError(f"Unknown metrics: {', '.join(unknown)} (expected {', '.join(METRIC_KEYS)})")
+        points = request.args.get('points', DEFAULT_MAX_POINTS, type=int)
+        if not 3 <= points <= MAX_POINTS_LIMIT:
+            raise ValueError(f"points must be between 3 and {MAX_POINTS_LIMIT}")
+        method = request.args.get('method', 'lttb')
+        if method not in METHODS:
+            raise ValueError(f"method must be one of: {', '.join(METHODS)}")
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    def build_trends():
+        timestamps, values = get_series(db, WellbeingData, WellbeingAggregate, current_user.id)
+        series = {
+            metric: downsample_series(timestamps, values[:, METRIC_KEYS.index(metric)], points, method)
+            for metric in requested_metrics
+        }
+        return {"status": "success", "method": method, "entries": len(timestamps), "series": series}, 200
+
+    try:
+        version = get_data_version(db, WellbeingAggregate, current_user.id)
+        if version is None:
+            return jsonify(build_trends()[0])
+        key = make_key(current_user.id, current_user.tier, request.args, kind="trends")
+        return conditional_report(request, key, version[0], version[1], build_trends)
+
+    except Exception as e:
+        print(f"Error during trends request: {e}")
+        return jsonify({"status": "error", "message": f"Internal server error: {e}"}), 500
+
+
 if __name__ == '__main__':
+    if '--profile-startup' in sys.argv:
+        # Needs a fresh interpreter: everything is already imported in this one
+        raise SystemExit(subprocess.call([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup.py')] + sys.argv[1:]))
+
     print("--- Starting Flask API Backend with DB ---")
+    metrics.reset_directory()
     with app.app_context():
-        # Create the database file and table if they don't exist
-        db.create_all() 
+        # Create or upgrade the database schema (see migrations.py)
+        migrate(db.engine) 
+        ensure_default_user(db, User)
     # Use 0.0.0.0 for compatibility with Render environment
     app.run(debug=True, host='0.0.0.0')
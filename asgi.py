@@ -0,0 +1,276 @@
+# asgi.py
+# ASGI entry point. The endpoints that spend their time waiting on zenquotes/open-meteo
+# (/api/status, /api/checkin, /api/forecast) run natively on the event loop with the async
+# client in async_api.py, so hundreds of them can be in flight in one process without
+# holding a thread each. Their SQLite work, like every other (unchanged) Flask route, runs
+# on a bounded thread pool. Responses are built by Flask's own JSON provider, so the
+# contracts (bodies, status codes, ETags) are those of the WSGI app.
+# Usage: uvicorn asgi:app --workers 2
+#        gunicorn -k uvicorn.workers.UvicornWorker asgi:app   (gunicorn.conf.py applies)
+
+import asyncio
+import contextvars
+import io
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import async_api
+import metrics
+from app import CHECKIN_MODE, DEFAULT_CITY, REQUIRED_FIELDS, User, app as flask_app, db, status_payload, store_checkin
+from identity import lookup_user, username_from_request
+from shards import SHARD_COUNT, shard_of, use_shard
+
+# --- Configuration ---
+ASGI_THREADS = int(os.environ.get("WELLBEING_ASGI_THREADS", "16"))   # database work and the Flask routes
+WSGI_BODY_QUEUE = 8             # response chunks buffered ahead of a slow client (streamed exports)
+# --- End Configuration ---
+
+_pool = {"executor": None, "pid": None}
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # Threads do not survive a fork, so each worker process gets its own pool
+    if _pool["executor"] is None or _pool["pid"] != os.getpid():
+        with _pool_lock:
+            if _pool["executor"] is None or _pool["pid"] != os.getpid():
+                _pool["executor"] = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix="asgi")
+                _pool["pid"] = os.getpid()
+    return _pool["executor"]
+
+
+async def run_in_app(func, *args):
+    """
+    Runs func(*args) on the pool inside an app context (so db.session is scoped and removed)
+    and the caller's context variables (so it works on the request's shard).
+    """
+    def call():
+        with flask_app.app_context():
+            try:
+                return func(*args)
+            except Exception:
+                db.session.rollback()
+                raise
+    return await asyncio.get_running_loop().run_in_executor(get_pool(), contextvars.copy_context().run, call)
+
+
+# --- Requests and responses ---
+
+def build_environ(scope, body):
+    """A WSGI environ for an ASGI http scope and its complete body."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body.extend(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return bytes(body)
+
+
+def json_response(payload, status_code=200):
+    response = flask_app.json.response(payload)
+    response.status_code = status_code
+    return response
+
+
+async def send_response(send, response):
+    headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in response.headers.items()]
+    await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": response.get_data()})
+
+
+# --- Native routes ---
+
+async def status_route(request, user):
+    quote_result, weather_result = await async_api.fetch_enrichment("Waltham Forest")
+    response = json_response(status_payload(user.tier, quote_result, weather_result))
+    # Cached upstream data changes rarely; let clients revalidate with If-None-Match
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+async def checkin_route(request, user):
+    data = request.get_json()
+    if not all(field in data for field in REQUIRED_FIELDS):
+        return json_response({"status": "error", "message": "Missing required fields"}, 400)
+
+    # In async mode (or when an upstream fails) the row is stored now and enriched later
+    quote_result, weather_result = None, None
+    if CHECKIN_MODE != 'async':
+        quote_result, weather_result = await async_api.fetch_enrichment(DEFAULT_CITY)
+    payload, status_code = await run_in_app(store_checkin, user.id, data, quote_result, weather_result)
+    return json_response(payload, status_code)
+
+
+async def forecast_route(request, user):
+    forecast_result = await async_api.fetch_forecast("Waltham Forest")
+    if "error" in forecast_result:
+        return json_response({"status": "error", "message": forecast_result["error"]}, 500)
+    return json_response({"status": "success", "data": forecast_result})
+
+
+# (method, path) -> (Flask endpoint name, handler, error log prefix, error message prefix)
+NATIVE_ROUTES = {
+    ("GET", "/api/status"): ("get_status_data", status_route, None, "Server error on /api/status: "),
+    ("POST", "/api/checkin"): ("checkin", checkin_route, "Error during checkin", "Internal server error: "),
+    ("GET", "/api/forecast"): ("get_forecast_data", forecast_route, "Error during forecast fetch", "Internal server error: "),
+}
+
+
+async def handle_native(route, scope, receive, send):
+    endpoint, handler, log_prefix, message_prefix = route
+    started = time.perf_counter()
+    request = flask_app.request_class(build_environ(scope, await read_body(receive)))
+
+    # What identity.py's before_request hook does for the Flask routes
+    username = username_from_request(request)
+    user = None
+    if username is not None:
+        with metrics.timer("identity_lookup_duration_seconds"):
+            user = await run_in_app(lookup_user, db, User, username)
+    if username is None:
+        response = json_response({"status": "error", "message": "Invalid or expired token"}, 401)
+    elif user is None:
+        response = json_response({"status": "error", "message": f"Unknown user: {username}"}, 401)
+    else:
+        try:
+            # What shards.py's hook does: the rest of the request works on the caller's shard
+            shard = await run_in_app(shard_of, db, user.id) if SHARD_COUNT else None
+            with use_shard(shard):
+                response = await handler(request, user)
+        except Exception as e:
+            if log_prefix:
+                print(f"{log_prefix}: {e}")
+            response = json_response({"status": "error", "message": f"{message_prefix}{e}"}, 500)
+
+    await send_response(send, response)
+    metrics.observe("http_request_duration_seconds", time.perf_counter() - started,
+                    endpoint=endpoint, method=scope["method"], status=response.status_code)
+    metrics.flush()
+
+
+# --- Everything else: the Flask app on the pool ---
+
+async def handle_wsgi(scope, receive, send):
+    """
+    Runs the Flask app for one request on the pool. The whole call, including iterating a
+    streamed body, stays on one thread (stream_with_context needs that); chunks cross over
+    through a bounded queue, so a slow client holds back the producer instead of memory.
+    """
+    loop = asyncio.get_running_loop()
+    environ = build_environ(scope, await read_body(receive))
+    chunks = asyncio.Queue(maxsize=WSGI_BODY_QUEUE)
+    started = {}
+    done = object()
+    cancelled = threading.Event()
+
+    def put(item):
+        asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+    def run():
+        iterable = None
+        try:
+            iterable = flask_app(environ, start_response)
+            for chunk in iterable:
+                if cancelled.is_set():
+                    break
+                if chunk:
+                    put(chunk)
+        except BaseException as e:
+            put(e)
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+            put(done)
+
+    future = loop.run_in_executor(get_pool(), run)
+    sent_start = False
+    item = None
+    try:
+        while True:
+            item = await chunks.get()
+            if isinstance(item, BaseException):
+                print(f"[ASGI] Error while streaming {scope['path']}: {item}")
+                break
+            if not sent_start:
+                await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+                sent_start = True
+            if item is done:
+                break
+            await send({"type": "http.response.body", "body": item, "more_body": True})
+        if sent_start:
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        # The client went away (or the app failed): stop the producer and let it finish
+        cancelled.set()
+        while item is not done:
+            item = await chunks.get()
+    await future
+
+
+# --- ASGI application ---
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await async_api.close_client()
+            if _pool["executor"] is not None:
+                _pool["executor"].shutdown(wait=False)
+            metrics.flush(force=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        raise RuntimeError(f"Unsupported ASGI scope: {scope['type']}")
+    route = NATIVE_ROUTES.get((scope["method"], scope["path"]))
+    if route is not None:
+        return await handle_native(route, scope, receive, send)
+    return await handle_wsgi(scope, receive, send)
@@ -0,0 +1,130 @@
+# async_api.py
+# Async counterparts of the api_service fetchers for the ASGI mode (asgi.py): one pooled
+# httpx.AsyncClient per event loop, the same circuit breakers, caches, latency budget,
+# fallbacks and metrics, so a request waiting on an upstream holds no thread.
+
+import asyncio
+import time
+
+import httpx
+
+import metrics
+from api_service import (
+    DEFAULT_QUOTE, ENRICHMENT_BUDGET, FORECAST_CACHE_TTL, FORECAST_LAST_GOOD_TTL, HTTP_RETRIES, HTTP_TIMEOUT,
+    QUOTE_API_URL, QUOTE_CACHE_TTL, QUOTE_LAST_GOOD_TTL, WEATHER_API_URL, WEATHER_CACHE_TTL, WEATHER_LAST_GOOD_TTL,
+    forecast_params, parse_forecast, parse_quote, parse_weather, upstream_failed, weather_params,
+)
+from breaker import CircuitOpenError, get_breaker
+from cache import async_cached
+
+# --- Configuration ---
+ASYNC_MAX_CONNECTIONS = 100      # per process; far more in-flight requests than sync workers could hold
+# --- End Configuration ---
+
+_clients = {}
+
+
+def get_client():
+    """The AsyncClient for the running event loop (clients cannot be shared across loops)."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        connect, read = HTTP_TIMEOUT
+        client = _clients[loop] = httpx.AsyncClient(
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS),
+            # Connection failures only; unlike the urllib3 policy, 5xx answers are not retried
+            transport=httpx.AsyncHTTPTransport(retries=HTTP_RETRIES),
+        )
+    return client
+
+
+async def close_client():
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def upstream_get_async(upstream, url, **kwargs):
+    """upstream_get() on the event loop: breaker, latency and outcome per upstream."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        response = await get_breaker(upstream).call_async(get_client().get, url, is_failure=upstream_failed, **kwargs)
+        if response.is_success:
+            outcome = "ok"
+        return response
+    except CircuitOpenError:
+        outcome = "short_circuit"
+        raise
+    except httpx.TimeoutException:
+        outcome = "timeout"
+        raise
+    finally:
+        if outcome != "short_circuit":
+            metrics.observe("upstream_request_duration_seconds", time.perf_counter() - started, upstream=upstream)
+        metrics.inc("upstream_requests_total", upstream=upstream, outcome=outcome)
+
+
+# Upstream failures as they surface here: transport errors, bad statuses and open circuits
+UPSTREAM_ERRORS = (httpx.HTTPError, CircuitOpenError)
+
+
+@async_cached("quote", QUOTE_CACHE_TTL, accept=lambda result: result != DEFAULT_QUOTE, last_good_ttl=QUOTE_LAST_GOOD_TTL)
+async def fetch_wellbeing_quote():
+    """Fetches a daily quote and returns a dictionary."""
+    print("\n*** Your Daily Dose of Wellbeing ***")
+    try:
+        response = await upstream_get_async("quote", QUOTE_API_URL)
+        response.raise_for_status()
+        return parse_quote(response.json())
+    except UPSTREAM_ERRORS as e:
+        print(f"[Quote API Error] Could not fetch quote. Using default. Error: {e}")
+        return dict(DEFAULT_QUOTE)
+
+
+@async_cached("weather", WEATHER_CACHE_TTL, accept=lambda result: result is not None, last_good_ttl=WEATHER_LAST_GOOD_TTL)
+async def fetch_weather(city):
+    """Fetches current weather data for the city and returns a dictionary, or None."""
+    try:
+        response = await upstream_get_async("weather", WEATHER_API_URL, params=weather_params(city))
+        response.raise_for_status()
+        return parse_weather(response.json())
+    except UPSTREAM_ERRORS as e:
+        print(f"[Weather API Error] Could not fetch weather data. Error: {e}")
+        return None
+
+
+@async_cached("forecast", FORECAST_CACHE_TTL, accept=lambda result: "error" not in result, last_good_ttl=FORECAST_LAST_GOOD_TTL)
+async def fetch_forecast(city):
+    """Fetches the 7-day forecast, or {"error": ...}."""
+    try:
+        response = await upstream_get_async("forecast", WEATHER_API_URL, params=forecast_params(city))
+        response.raise_for_status()
+        return parse_forecast(city, response.json())
+    except UPSTREAM_ERRORS as e:
+        return {"error": f"Could not fetch forecast data: {e}"}
+
+
+async def _result_within(task, deadline, upstream, fallback):
+    timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+    try:
+        # Shielded: past the budget the call keeps going and still fills the cache
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        metrics.inc("enrichment_budget_exceeded_total", upstream=upstream)
+        return await fallback()
+
+
+async def fetch_enrichment(city, budget=ENRICHMENT_BUDGET):
+    """api_service.fetch_enrichment() on the event loop: quote and weather concurrently, within `budget` seconds."""
+    deadline = None if budget is None else time.monotonic() + budget
+    quote_task = asyncio.ensure_future(fetch_wellbeing_quote())
+    weather_task = asyncio.ensure_future(fetch_weather(city))
+
+    async def last_good_quote():
+        return await fetch_wellbeing_quote.last_good() or dict(DEFAULT_QUOTE)
+
+    quote_result = await _result_within(quote_task, deadline, "quote", last_good_quote)
+    weather_result = await _result_within(weather_task, deadline, "weather", lambda: fetch_weather.last_good(city))
+    return quote_result, weather_result
@@ -0,0 +1,123 @@
+# benchmarks/bench_analysis.py
+# Micro-benchmarks for the analysis and chart code paths, without HTTP in the way:
+# analyze_wellbeing_log (the served report) and the engine fallback over the raw rows for
+# each seeded user, and generate_wellbeing_charts over synthetic CSV logs.
+# Usage: python benchmarks/bench_analysis.py --database /tmp/bench.db [--sizes 1k,100k] [--repeat 20]
+#        [--chart-rows 1000,100000] [--out analysis.json]
+
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+from bench_common import emit, run_metadata, summarise
+from seed_data import SIZES, bench_username, generate_rows, parse_sizes
+
+# --- Configuration ---
+DEFAULT_REPEAT = 20
+DEFAULT_CHART_REPEAT = 3
+DEFAULT_CHART_ROWS = "1000,100000"
+# --- End Configuration ---
+
+
+def timed(func, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def bench_analysis(models, sizes, repeat):
+    """analyze_wellbeing_log as /api/analysis calls it, and compute_stats over load_series (the uncached fallback)."""
+    from analysis_engine import compute_stats, load_series
+    from main import analyze_wellbeing_log
+    from shards import user_shard
+
+    db = models.db
+    results = {}
+    for size in sizes:
+        username = bench_username(size)
+        user = db.session.execute(db.select(models.User).filter_by(username=username)).scalar_one_or_none()
+        if user is None:
+            print(f"[Bench] {username} not found; run seed_data.py --sizes {size} first", file=sys.stderr)
+            continue
+
+        def report():
+            analyze_wellbeing_log(4, user.tier, user.id, db, models.WellbeingData, models.WellbeingAggregate, models.AnalysisReport)
+            db.session.rollback()
+
+        def engine():
+            compute_stats(load_series(db, models.WellbeingData, user.id)[1])
+            db.session.rollback()
+
+        with user_shard(db, user.id):
+            results[size] = {
+                "rows": SIZES[size],
+                "analyze_wellbeing_log": summarise(timed(report, repeat)),
+                "load_series_compute_stats": summarise(timed(engine, max(1, repeat // 4))),
+            }
+        print(f"[Bench] analysis {size}: report p50 {results[size]['analyze_wellbeing_log']['p50_ms']} ms, "
+              f"engine p50 {results[size]['load_series_compute_stats']['p50_ms']} ms", file=sys.stderr)
+    return results
+
+
+def write_legacy_log(path, rows):
+    """A v2 CSV log (the format generate_wellbeing_charts reads) with `rows` seeded check-ins."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Timestamp", "City", "Temperature", "MoodScore", "SleepHours", "ExerciseDone", "ExerciseMinutes", "Quote", "Author"])
+        for row in generate_rows(1, rows):
+            writer.writerow([
+                row["timestamp"].strftime("%Y-%m-%d %H:%M:%S"), row["city"], row["temperature"], row["mood_score"],
+                row["sleep_hours"], row["exercise_minutes"] > 0, row["exercise_minutes"], row["quote_text"], row["quote_author"],
+            ])
+
+
+def bench_charts(row_counts, repeat, workdir):
+    from data_analysis import generate_wellbeing_charts
+
+    results = {}
+    for rows in row_counts:
+        log_path = os.path.join(workdir, f"log_{rows}.csv")
+        chart_path = os.path.join(workdir, f"chart_{rows}.png")
+        write_legacy_log(log_path, rows)
+        latencies = timed(lambda: generate_wellbeing_charts(log_path, chart_path), repeat)
+        if not os.path.exists(chart_path):
+            raise RuntimeError(f"generate_wellbeing_charts produced no chart for {rows} rows")
+        results[str(rows)] = {"generate_wellbeing_charts": summarise(latencies), "png_bytes": os.path.getsize(chart_path)}
+        print(f"[Bench] chart {rows} rows: p50 {results[str(rows)]['generate_wellbeing_charts']['p50_ms']} ms", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for analyze_wellbeing_log and generate_wellbeing_charts.")
+    parser.add_argument("--database", help="seeded SQLite file (default: DATABASE_URL); skip analysis if neither is set")
+    parser.add_argument("--sizes", type=parse_sizes, default=["1k", "100k"], help="seeded users to analyse")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--chart-rows", default=DEFAULT_CHART_ROWS, help="comma-separated CSV log sizes to chart")
+    parser.add_argument("--chart-repeat", type=int, default=DEFAULT_CHART_REPEAT)
+    parser.add_argument("--out", help="write the JSON results to this file as well")
+    args = parser.parse_args()
+
+    if args.database:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.database)}"
+    config = {key: value for key, value in vars(args).items() if key != "out"}
+    results = {"benchmark": "analysis", "meta": run_metadata(), "config": config}
+
+    if "DATABASE_URL" in os.environ:
+        import app as models
+        with models.app.app_context():
+            results["analysis"] = bench_analysis(models, args.sizes, args.repeat)
+
+    row_counts = [int(value) for value in args.chart_rows.split(",") if value.strip()]
+    with tempfile.TemporaryDirectory() as workdir:
+        results["charts"] = bench_charts(row_counts, args.chart_repeat, workdir)
+    emit(results, args.out)
+
+
+if __name__ == "__main__":
+    main()
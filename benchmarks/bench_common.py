@@ -0,0 +1,60 @@
+# benchmarks/bench_common.py
+# Shared helpers for the benchmark scripts: latency summaries, run metadata and JSON output,
+# so every script's results can be diffed with benchmarks/compare.py.
+
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list (p in 0-100)."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))  # ceil without floats
+    return sorted_values[min(int(rank), len(sorted_values)) - 1]
+
+
+def summarise(latencies, seconds=None, errors=0):
+    """Count, throughput and p50/p95/p99/max in milliseconds for a list of latencies in seconds."""
+    ordered = sorted(latencies)
+    summary = {"requests": len(ordered), "errors": errors}
+    if seconds:
+        summary["throughput_per_s"] = round(len(ordered) / seconds, 1)
+    for name, p in (("p50_ms", 50), ("p95_ms", 95), ("p99_ms", 99)):
+        value = percentile(ordered, p)
+        summary[name] = round(value * 1000, 2) if value is not None else None
+    summary["max_ms"] = round(ordered[-1] * 1000, 2) if ordered else None
+    return summary
+
+
+def run_metadata():
+    """Where and on what a result was produced, so runs are comparable."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def emit(results, out=None):
+    """Prints the results as JSON (and writes them to `out` if given)."""
+    output = json.dumps(results, indent=2)
+    print(output)
+    if out:
+        with open(out, "w") as f:
+            f.write(output)
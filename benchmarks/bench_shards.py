@@ -0,0 +1,112 @@
+# benchmarks/bench_shards.py
+# Check-in write throughput with sharding off and with N shards: concurrent writer
+# processes (like gunicorn workers) store enriched check-ins through app.store_checkin for
+# users spread over every shard, against a fresh database per configuration.
+# Commits only run in parallel where there is something to overlap (fsyncs under the
+# "durable" profile, or spare CPUs), so report results with the machine's cpu count.
+# Usage: python benchmarks/bench_shards.py [--shards 0,1,2,4] [--writers 4] [--seconds 5] [--profile durable]
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bench_common import emit, run_metadata
+
+# --- Configuration ---
+BENCH_USERS = 64
+QUOTE_RESULT = {"quote": "Knowing yourself is the beginning of all wisdom.", "author": "Aristotle"}
+WEATHER_RESULT = {"temp": 12.5, "description": "Overcast"}
+# --- End Configuration ---
+
+
+def _setup(_):
+    """Migrates the fresh database and creates the users (and their shard assignments)."""
+    from app import app, db, User
+    from identity import ensure_default_user
+    from migrations import migrate
+    from shards import shard_of
+
+    with app.app_context():
+        migrate(db.engine)
+        ensure_default_user(db, User)  # before the writers import the app all at once
+        db.session.add_all([User(username=f"shard_bench_{n}", tier="premium") for n in range(BENCH_USERS)])
+        db.session.commit()
+        user_ids = db.session.execute(
+            db.select(User.id).where(User.username.like("shard_bench_%")).order_by(User.id)
+        ).scalars().all()
+        return {user_id: shard_of(db, user_id) for user_id in user_ids}
+
+
+def _writer(args):
+    user_ids, seconds, seed = args
+    from app import app, db, store_checkin
+    from shards import user_shard
+
+    rng = random.Random(seed)
+    commits = errors = 0
+    deadline = time.perf_counter() + seconds
+    with app.app_context():
+        while time.perf_counter() < deadline:
+            user_id = rng.choice(user_ids)
+            data = {"mood": rng.randint(1, 5), "sleep_hours": round(rng.uniform(4, 9), 1),
+                    "exercise_done": True, "exercise_minutes": rng.choice((0, 15, 30, 45))}
+            try:
+                with user_shard(db, user_id):
+                    store_checkin(user_id, data, QUOTE_RESULT, WEATHER_RESULT)
+                commits += 1
+            except Exception:
+                db.session.rollback()
+                errors += 1
+    return commits, errors
+
+
+def bench_configuration(workdir, shards, writers, seconds, profile):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, f'shards{shards}.db')}"
+    os.environ["WELLBEING_SHARDS"] = str(shards)
+    os.environ["WELLBEING_SQLITE_PROFILE"] = profile
+    # Spawned, so every process imports the app with this configuration's environment
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        placements = pool.map(_setup, [None])[0]
+    user_ids = sorted(placements)
+    jobs = [(user_ids[i::writers], seconds, i) for i in range(writers)]
+    with context.Pool(writers) as pool:
+        results = pool.map(_writer, jobs)
+    commits = sum(result[0] for result in results)
+    return {
+        "shards": shards,
+        "users_per_shard": {str(shard): sum(1 for s in placements.values() if s == shard)
+                            for shard in sorted(set(placements.values()), key=str)},
+        "commits": commits,
+        "errors": sum(result[1] for result in results),
+        "checkins_per_s": round(commits / seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check-in write throughput by shard count")
+    parser.add_argument("--shards", default="0,1,2,4", help="comma-separated shard counts (0 = unsharded)")
+    parser.add_argument("--writers", type=int, default=4, help="concurrent writer processes")
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of each configuration")
+    parser.add_argument("--profile", default="durable", help="SQLite profile (sqlite_profile.SQLITE_PROFILES)")
+    parser.add_argument("--out", help="write the JSON results to this file as well")
+    args = parser.parse_args()
+
+    results = {"benchmark": "shards", "writers": args.writers, "seconds": args.seconds, "profile": args.profile,
+               "metadata": run_metadata(), "configurations": []}
+    with tempfile.TemporaryDirectory() as workdir:
+        for shards in (int(value) for value in args.shards.split(",")):
+            print(f"[Bench] {shards} shard(s), {args.writers} writers...", file=sys.stderr)
+            results["configurations"].append(bench_configuration(workdir, shards, args.writers, args.seconds, args.profile))
+    baseline = results["configurations"][0]["checkins_per_s"]
+    for configuration in results["configurations"]:
+        configuration["speedup"] = round(configuration["checkins_per_s"] / baseline, 2) if baseline else None
+    emit(results, args.out)
+
+
+if __name__ == "__main__":
+    main()
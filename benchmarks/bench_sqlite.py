@@ -0,0 +1,194 @@
+# benchmarks/bench_sqlite.py
+# Read/write throughput of the check-in table before and after the composite index
+# and SQLite performance profile.
+# Usage: python benchmarks/bench_sqlite.py [--rows 1000000] [--users 1000] [--out results.json]
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import MIGRATIONS          # noqa: E402
+from sqlite_profile import SQLITE_PROFILES, apply_pragmas  # noqa: E402
+
+CONFIGURATIONS = {
+    # Schema without the composite index, SQLite default pragmas
+    "before": {"migrations": 3, "profile": "default"},
+    "after": {"migrations": MIGRATIONS[-1][0], "profile": "performance"},
+}
+
+ANALYSIS_QUERY = (
+    "SELECT mood_score, sleep_hours, exercise_minutes, temperature FROM wellbeing_data "
+    "WHERE user_id = ? ORDER BY timestamp"
+)
+# Before schema 8 the city and quote were repeated on every row; since then they are interned
+LEGACY_INSERT_QUERY = (
+    "INSERT INTO wellbeing_data (user_id, timestamp, mood_score, sleep_hours, exercise_minutes, "
+    "city, temperature, quote_text, quote_author) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+INSERT_QUERY = (
+    "INSERT INTO wellbeing_data (user_id, timestamp, mood_score, sleep_hours, exercise_minutes, "
+    "temperature, quote_id, weather_id) VALUES (?, ?, ?, ?, ?, ?, 1, 1)"
+)
+QUOTE = "Knowing yourself is the beginning of all wisdom."
+NORMALISED_VERSION = 8
+
+
+def insert_query(version):
+    return INSERT_QUERY if version >= NORMALISED_VERSION else LEGACY_INSERT_QUERY
+
+
+def checkin_row(version, user_id, timestamp, mood, sleep, exercise, temperature):
+    if version >= NORMALISED_VERSION:
+        return (user_id, timestamp, mood, sleep, exercise, temperature)
+    return (user_id, timestamp, mood, sleep, exercise, "Waltham Forest", temperature, QUOTE, "Aristotle")
+
+
+def connect(path, profile):
+    conn = sqlite3.connect(path, timeout=30)
+    apply_pragmas(conn, SQLITE_PROFILES[profile])
+    return conn
+
+
+def build_database(path, config, rows, users):
+    conn = connect(path, config["profile"])
+    for version, _, statements in MIGRATIONS:
+        if version > config["migrations"]:
+            break
+        for statement in statements:
+            conn.execute(statement)
+    conn.executemany("INSERT INTO user (id, username, tier) VALUES (?, ?, 'free')",
+                     [(uid, f"user_{uid}") for uid in range(1, users + 1)])
+    version = config["migrations"]
+    if version >= NORMALISED_VERSION:
+        # One shared quote and observation; what matters here is the row width
+        conn.execute("INSERT INTO quote (id, day, text, author) VALUES (1, '2023-01-01', ?, 'Aristotle')", (QUOTE,))
+        conn.execute("INSERT INTO weather_observation (id, location, hour, temperature) "
+                     "VALUES (1, 'Waltham Forest', '2023-01-01 00:00:00.000000', 12.0)")
+    query = insert_query(version)
+
+    # Check-ins arrive interleaved across users, as they would in production
+    rng = random.Random(42)
+    start = datetime(2023, 1, 1)
+    started = time.perf_counter()
+    batch = []
+    for i in range(rows):
+        batch.append(checkin_row(
+            version, i % users + 1,
+            (start + timedelta(minutes=i)).isoformat(sep=' '),
+            rng.randint(1, 5), round(rng.uniform(4, 9), 1), rng.randint(0, 90),
+            round(rng.uniform(-2, 28), 1),
+        ))
+        if len(batch) == 50000:
+            conn.executemany(query, batch)
+            batch = []
+    if batch:
+        conn.executemany(query, batch)
+    conn.commit()
+    seed_seconds = time.perf_counter() - started
+    if config["migrations"] >= 4:
+        conn.execute("ANALYZE")
+    conn.close()
+    return rows / seed_seconds
+
+
+def bench_reads(path, profile, users, queries=200):
+    conn = connect(path, profile)
+    rng = random.Random(7)
+    started = time.perf_counter()
+    for _ in range(queries):
+        conn.execute(ANALYSIS_QUERY, (rng.randint(1, users),)).fetchall()
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return queries / elapsed
+
+
+def bench_writes(path, profile, version, users, transactions=2000):
+    # One INSERT + COMMIT per check-in, like /api/checkin
+    conn = connect(path, profile)
+    rng = random.Random(11)
+    started = time.perf_counter()
+    for _ in range(transactions):
+        conn.execute(insert_query(version), checkin_row(
+            version, rng.randint(1, users), datetime.utcnow().isoformat(sep=' '), 3, 7.0, 30, 12.0))
+        conn.commit()
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return transactions / elapsed
+
+
+def _mixed_worker(args):
+    path, profile, version, users, role, seconds, seed = args
+    conn = connect(path, profile)
+    rng = random.Random(seed)
+    ops = errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            if role == "writer":
+                conn.execute(insert_query(version), checkin_row(
+                    version, rng.randint(1, users), datetime.utcnow().isoformat(sep=' '), 3, 7.0, 30, 12.0))
+                conn.commit()
+            else:
+                conn.execute(ANALYSIS_QUERY, (rng.randint(1, users),)).fetchall()
+            ops += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            conn.rollback()
+    conn.close()
+    return role, ops, errors
+
+
+def bench_mixed(path, profile, version, users, writers=2, readers=4, seconds=5.0):
+    """Concurrent processes, like gunicorn workers serving check-ins and analysis at once."""
+    jobs = [(path, profile, version, users, "writer", seconds, i) for i in range(writers)]
+    jobs += [(path, profile, version, users, "reader", seconds, 100 + i) for i in range(readers)]
+    with multiprocessing.Pool(len(jobs)) as pool:
+        results = pool.map(_mixed_worker, jobs)
+    totals = {"writes_per_s": 0.0, "reads_per_s": 0.0, "lock_errors": 0}
+    for role, ops, errors in results:
+        totals["writes_per_s" if role == "writer" else "reads_per_s"] += ops / seconds
+        totals["lock_errors"] += errors
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite throughput before/after the index and pragma profile")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--out", help="write the JSON results to this file as well")
+    args = parser.parse_args()
+
+    results = {"benchmark": "sqlite", "rows": args.rows, "users": args.users, "configurations": {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, config in CONFIGURATIONS.items():
+            path = os.path.join(workdir, f"{name}.db")
+            print(f"[Bench] {name}: seeding {args.rows} rows...", file=sys.stderr)
+            seed_rate = build_database(path, config, args.rows, args.users)
+            results["configurations"][name] = {
+                "profile": config["profile"],
+                "schema_version": config["migrations"],
+                "bulk_insert_rows_per_s": round(seed_rate),
+                "database_bytes": os.path.getsize(path),
+                "analysis_queries_per_s": round(bench_reads(path, config["profile"], args.users), 1),
+                "checkin_commits_per_s": round(bench_writes(path, config["profile"], config["migrations"], args.users), 1),
+                "mixed": {k: round(v, 1) for k, v in bench_mixed(path, config["profile"], config["migrations"], args.users).items()},
+            }
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/compare.py
+# Compares two JSON results from the same benchmark script and flags regressions.
+# Latencies (*_ms) regress when they grow, rates (*_per_s) when they shrink.
+# Usage: python benchmarks/compare.py BASELINE.json CANDIDATE.json [--threshold 10]
+
+import argparse
+import json
+import sys
+
+# --- Configuration ---
+DEFAULT_THRESHOLD = 10.0    # percent change reported as a regression
+# --- End Configuration ---
+
+SKIPPED_SECTIONS = {"meta", "config"}
+
+
+def flatten(results, prefix=""):
+    """{'a': {'b_ms': 1}} -> {'a.b_ms': 1} for numeric leaves."""
+    values = {}
+    for key, value in results.items():
+        if key in SKIPPED_SECTIONS and not prefix:
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+
+def direction(name):
+    """+1 if bigger is better, -1 if smaller is better, 0 if the metric is informational."""
+    leaf = name.rsplit(".", 1)[-1]
+    if leaf.endswith("_ms") or leaf.endswith("_seconds") or leaf in ("errors", "lock_errors"):
+        return -1
+    if leaf.endswith("_per_s"):
+        return 1
+    return 0
+
+
+def compare(baseline, candidate, threshold=DEFAULT_THRESHOLD):
+    """Returns [(metric, baseline, candidate, percent change, regressed)] for metrics in both runs."""
+    old, new = flatten(baseline), flatten(candidate)
+    rows = []
+    for name in sorted(old.keys() & new.keys()):
+        sign = direction(name)
+        if sign == 0:
+            continue
+        before, after = old[name], new[name]
+        change = (after - before) / before * 100 if before else (0.0 if after == before else float("inf"))
+        rows.append((name, before, after, change, sign * change < -threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark JSON results.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="percent change that counts as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    if baseline.get("benchmark") != candidate.get("benchmark"):
+        print(f"[Compare] Warning: comparing '{baseline.get('benchmark')}' with '{candidate.get('benchmark')}'", file=sys.stderr)
+
+    rows = compare(baseline, candidate, args.threshold)
+    regressions = [row for row in rows if row[4]]
+    print(f"{'metric':<60}{'baseline':>12}{'candidate':>12}{'change':>10}")
+    for name, before, after, change, regressed in rows:
+        print(f"{name:<60}{before:>12}{after:>12}{change:>+9.1f}%{'  REGRESSION' if regressed else ''}")
+    print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0f}% in {len(rows)} compared metrics")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+# benchmarks/load_driver.py
+# HTTP load against the API: throughput and p50/p95/p99 per endpoint, as JSON.
+# By default it starts the stub upstreams and a gunicorn server on a seeded database
+# (see seed_data.py), so nothing leaves the machine; --url targets a running server instead
+# (pass --token, a bearer token for --user, unless it trusts X-User headers).
+# Usage: python benchmarks/load_driver.py --database /tmp/bench.db [--user bench_100k]
+#        [--endpoints checkin,status,analysis,forecast] [--duration 10] [--concurrency 8] [--server asgi] [--out load.json]
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from bench_common import ROOT, emit, run_metadata, summarise
+from stub_apis import DEFAULT_FAILURE_RATE, DEFAULT_JITTER_MS, DEFAULT_LATENCY_MS, start_stub_server, stub_environment
+
+# --- Configuration ---
+DEFAULT_DURATION = 10.0         # seconds measured per endpoint
+DEFAULT_WARMUP = 1.0            # seconds per endpoint before measuring
+DEFAULT_CONCURRENCY = 8
+DEFAULT_WORKERS = 2             # gunicorn workers when the driver starts the server
+SERVER_START_TIMEOUT = 60
+# --- End Configuration ---
+
+CHECKIN_BODY = {"mood": 4, "sleep_hours": 7.5, "exercise_done": True, "exercise_minutes": 30}
+# --server -> (gunicorn worker class arguments, application)
+SERVERS = {
+    "wsgi": ([], "app:app"),
+    "asgi": (["-k", "uvicorn.workers.UvicornWorker"], "asgi:app"),
+}
+# name -> (method, path, JSON body)
+ENDPOINTS = {
+    "checkin": ("POST", "/api/checkin", CHECKIN_BODY),
+    "status": ("GET", "/api/status", None),
+    "analysis": ("GET", "/api/analysis", None),
+    "forecast": ("GET", "/api/forecast", None),
+}
+
+
+def start_server(database, port, workers, environment, log_path, mode="wsgi"):
+    """Runs the app under gunicorn (with gunicorn.conf.py) and waits until it answers."""
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.abspath(database)}", **environment)
+    worker_args, application = SERVERS[mode]
+    with open(log_path, "w") as log:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-w", str(workers), *worker_args, "-b", f"127.0.0.1:{port}", application],
+            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            with open(log_path) as log:
+                raise RuntimeError(f"gunicorn exited with {server.returncode}: {log.read()[-2000:]}")
+        try:
+            if requests.get(base_url + "/", timeout=1).ok:
+                return server, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"server did not answer within {SERVER_START_TIMEOUT}s")
+
+
+def run_endpoint(base_url, name, user, duration, warmup, concurrency, token=None):
+    """Hammers one endpoint from `concurrency` threads; returns its latency summary and status counts."""
+    method, path, body = ENDPOINTS[name]
+    lock = threading.Lock()
+    latencies, statuses = [], {}
+    errors = [0]
+    measure_from = time.perf_counter() + warmup
+    stop_at = measure_from + duration
+
+    def client():
+        session = requests.Session()
+        if token:
+            session.headers["Authorization"] = f"Bearer {token}"
+        else:
+            session.headers["X-User"] = user
+        while True:
+            started = time.perf_counter()
+            if started >= stop_at:
+                break
+            try:
+                response = session.request(method, base_url + path, json=body, timeout=30)
+                status, failed = response.status_code, response.status_code >= 400
+            except requests.RequestException as e:
+                status, failed = type(e).__name__, True
+            elapsed = time.perf_counter() - started
+            if started < measure_from:
+                continue
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    summary = summarise(latencies, seconds=duration, errors=errors[0])
+    summary["status_codes"] = statuses
+    print(f"[Load] {name}: {summary['throughput_per_s']}/s, p50 {summary['p50_ms']} ms, "
+          f"p99 {summary['p99_ms']} ms, {summary['errors']} errors", file=sys.stderr)
+    return summary
+
+
+def parse_endpoints(value):
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in ENDPOINTS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown endpoint(s) {', '.join(unknown)}; choose from {', '.join(ENDPOINTS)}")
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API and report per-endpoint latency percentiles as JSON.")
+    parser.add_argument("--url", help="target a running server instead of starting one (no stubs are started)")
+    parser.add_argument("--database", help="seeded SQLite file for the started server (default: a fresh one seeded with 1k rows)")
+    parser.add_argument("--user", default="bench_1k", help="username sent as X-User")
+    parser.add_argument("--token", help="bearer token to send instead of X-User (identity.py issues them)")
+    parser.add_argument("--endpoints", type=parse_endpoints, default=list(ENDPOINTS))
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION)
+    parser.add_argument("--warmup", type=float, default=DEFAULT_WARMUP)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--server", choices=list(SERVERS), default="wsgi", help="sync workers (app:app) or the ASGI mode (asgi:app)")
+    parser.add_argument("--stub-latency-ms", type=float, default=DEFAULT_LATENCY_MS)
+    parser.add_argument("--stub-jitter-ms", type=float, default=DEFAULT_JITTER_MS)
+    parser.add_argument("--stub-failure-rate", type=float, default=DEFAULT_FAILURE_RATE)
+    parser.add_argument("--out", help="write the JSON results to this file as well")
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items() if key not in ("out", "token")}
+    results = {"benchmark": "load", "meta": run_metadata(), "config": config, "endpoints": {}}
+    server = stub = None
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            base_url = args.url
+            if base_url is None:
+                stub, stub_state, stub_url = start_stub_server(
+                    latency_ms=args.stub_latency_ms, jitter_ms=args.stub_jitter_ms, failure_rate=args.stub_failure_rate, seed=0
+                )
+                database = args.database
+                if database is None:
+                    database = os.path.join(workdir, "bench.db")
+                    subprocess.run([sys.executable, os.path.join(ROOT, "benchmarks", "seed_data.py"), "--sizes", "1k"],
+                                   cwd=ROOT, env=dict(os.environ, DATABASE_URL=f"sqlite:///{database}"),
+                                   check=True, stdout=subprocess.DEVNULL)
+                # A local server on throwaway data: identify the benchmark user by header
+                environment = dict(stub_environment(stub_url), WELLBEING_TRUST_IDENTITY_HEADERS="1")
+                server, base_url = start_server(database, args.port, args.workers, environment,
+                                                os.path.join(workdir, "gunicorn.log"), args.server)
+
+            for name in args.endpoints:
+                results["endpoints"][name] = run_endpoint(base_url, name, args.user, args.duration, args.warmup,
+                                                          args.concurrency, args.token)
+            if stub is not None:
+                results["stub_requests"] = dict(stub_state.requests)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+            if stub is not None:
+                stub.shutdown()
+    emit(results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# benchmarks/seed_data.py
+# Deterministic benchmark data: one premium user per size (bench_1k, bench_100k, bench_1m)
+# with that many check-ins, written through ingest.write_checkins so aggregates, rollups
+# and interned references match what the API itself would have stored.
+# Usage: DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/seed_data.py [--sizes 1k,100k,1m] [--reset]
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bench_common import emit, run_metadata
+
+# --- Configuration ---
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+SEED_CHUNK_ROWS = 20_000
+SEED_INTERVAL_MINUTES = 30          # spacing between a user's check-ins
+SEED_END = datetime(2025, 1, 1)     # fixed, so every run seeds identical rows
+SEED_TIER = "premium"               # every correlation is computed for premium users
+# --- End Configuration ---
+
+QUOTES = [
+    ("Knowing yourself is the beginning of all wisdom.", "Aristotle"),
+    ("The best way out is always through.", "Robert Frost"),
+    ("Happiness depends upon ourselves.", "Aristotle"),
+]
+
+
+def bench_username(size):
+    return f"bench_{size}"
+
+
+def generate_rows(user_id, rows, seed=0):
+    """Yields `rows` WellbeingData dicts ending at SEED_END, with mood loosely tracking sleep and temperature."""
+    rng = random.Random(f"{seed}:{user_id}")
+    start = SEED_END - timedelta(minutes=SEED_INTERVAL_MINUTES * rows)
+    for i in range(rows):
+        timestamp = start + timedelta(minutes=SEED_INTERVAL_MINUTES * i)
+        temperature = round(10 + 8 * rng.random() - 6 * ((timestamp.month - 7) / 6) ** 2, 1)
+        sleep = round(rng.uniform(4, 9), 1)
+        exercise = rng.choice((0, 0, 15, 30, 45, 60))
+        mood = min(5, max(1, round(1 + 0.4 * (sleep - 4) + 0.08 * temperature + rng.gauss(0, 0.8))))
+        quote_text, quote_author = QUOTES[timestamp.toordinal() % len(QUOTES)]
+        yield {
+            "user_id": user_id,
+            "timestamp": timestamp,
+            "mood_score": mood,
+            "sleep_hours": sleep,
+            "exercise_minutes": exercise,
+            "city": "Waltham Forest",
+            "temperature": temperature if rng.random() > 0.02 else None,  # a few failed lookups
+            "quote_text": quote_text,
+            "quote_author": quote_author,
+        }
+
+
+def clear_user(db, models, user_id):
+    """Deletes a user's check-ins and everything derived from them."""
+    logs = db.select(models.WellbeingData.id).where(models.WellbeingData.user_id == user_id)
+    db.session.execute(db.delete(models.PendingEnrichment).where(models.PendingEnrichment.log_id.in_(logs)))
+    for model in (models.WellbeingData, models.DailyRollup, models.WellbeingAggregate, models.AnalysisReport):
+        db.session.execute(db.delete(model).where(model.user_id == user_id))
+    db.session.commit()
+
+
+def seed_user(db, models, size, rows, reset=False, seed=0):
+    """Creates bench_<size> with `rows` check-ins (skipped if it already has them). Returns a summary."""
+    from ingest import write_checkins
+    from shards import user_shard
+
+    username = bench_username(size)
+    user = db.session.execute(db.select(models.User).filter_by(username=username)).scalar_one_or_none()
+    if user is None:
+        user = models.User(username=username, tier=SEED_TIER)
+        db.session.add(user)
+        db.session.commit()
+    user_id = user.id
+
+    with user_shard(db, user_id):
+        existing = db.session.execute(
+            db.select(db.func.count()).select_from(models.WellbeingData).filter_by(user_id=user_id)
+        ).scalar()
+        if existing == rows and not reset:
+            print(f"[Seed] {username} already has {rows} rows", file=sys.stderr)
+            return {"user": username, "rows": rows, "seeded": False}
+        if existing:
+            clear_user(db, models, user_id)
+
+        started = time.perf_counter()
+        chunk = []
+        for row in generate_rows(user_id, rows, seed):
+            chunk.append(row)
+            if len(chunk) >= SEED_CHUNK_ROWS:
+                write_checkins(db, models.WellbeingData, models.WellbeingAggregate, models.DailyRollup,
+                               models.Quote, models.WeatherObservation, user_id, chunk)
+                chunk = []
+        if chunk:
+            write_checkins(db, models.WellbeingData, models.WellbeingAggregate, models.DailyRollup,
+                           models.Quote, models.WeatherObservation, user_id, chunk)
+        seconds = time.perf_counter() - started
+        print(f"[Seed] {username}: {rows} rows in {seconds:.1f}s", file=sys.stderr)
+        return {"user": username, "rows": rows, "seeded": True, "seconds": round(seconds, 2),
+                "rows_per_s": round(rows / max(seconds, 1e-9))}
+
+
+def parse_sizes(value):
+    sizes = [size.strip().lower() for size in value.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown size(s) {', '.join(unknown)}; choose from {', '.join(SIZES)}")
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed deterministic benchmark users into DATABASE_URL.")
+    parser.add_argument("--sizes", type=parse_sizes, default=list(SIZES), help="comma-separated: " + ",".join(SIZES))
+    parser.add_argument("--reset", action="store_true", help="reseed users that already exist")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON summary to this file as well")
+    args = parser.parse_args()
+
+    import app as models
+    from migrations import migrate
+
+    results = {"benchmark": "seed_data", "meta": run_metadata(), "database": models.app.config["SQLALCHEMY_DATABASE_URI"], "users": []}
+    with models.app.app_context():
+        migrate(models.db.engine)
+        for size in args.sizes:
+            results["users"].append(seed_user(models.db, models, size, SIZES[size], reset=args.reset, seed=args.seed))
+    emit(results, args.out)
+
+
+if __name__ == "__main__":
+    main()
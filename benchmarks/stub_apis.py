@@ -0,0 +1,154 @@
+# benchmarks/stub_apis.py
+# Local stand-ins for the upstream APIs (zenquotes, open-meteo forecast and archive) so the
+# service can be measured offline. Latency and failure rate are configurable; responses
+# are shaped like the real ones, and the app is pointed here through WELLBEING_*_URL.
+# Usage: python benchmarks/stub_apis.py [--port 8099] [--latency-ms 50] [--jitter-ms 10] [--failure-rate 0.0]
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# --- Configuration ---
+DEFAULT_PORT = 8099
+DEFAULT_LATENCY_MS = 50
+DEFAULT_JITTER_MS = 10
+DEFAULT_FAILURE_RATE = 0.0
+# --- End Configuration ---
+
+QUOTE_PATH = "/api/today"
+FORECAST_PATH = "/v1/forecast"
+ARCHIVE_PATH = "/v1/archive"
+LOCATION_PATH = "/json/"
+
+
+class StubState:
+    """Behaviour shared by every handler thread; safe to change while serving."""
+
+    def __init__(self, latency_ms=DEFAULT_LATENCY_MS, jitter_ms=DEFAULT_JITTER_MS, failure_rate=DEFAULT_FAILURE_RATE, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = {}
+
+    def delay(self):
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms)
+            failed = self.random.random() < self.failure_rate
+        time.sleep(max(self.latency_ms + jitter, 0) / 1000)
+        return failed
+
+    def count(self, path):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+
+def _daily(start, days, rng):
+    dates = [start + timedelta(days=i) for i in range(days)]
+    low = [round(rng.uniform(-2, 12), 1) for _ in dates]
+    high = [round(value + rng.uniform(3, 10), 1) for value in low]
+    return {
+        "time": [day.isoformat() for day in dates],
+        "temperature_2m_min": low,
+        "temperature_2m_max": high,
+        "temperature_2m_mean": [round((a + b) / 2, 1) for a, b in zip(low, high)],
+        "precipitation_sum": [round(max(rng.gauss(1, 3), 0), 1) for _ in dates],
+    }
+
+
+def make_handler(state):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real upstreams
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            state.count(url.path)
+            if state.delay():
+                return self._send(503, {"error": "stub failure"})
+            rng = random.Random(zlib.crc32(url.query.encode()))  # same query, same answer
+
+            if url.path == QUOTE_PATH:
+                # Not api_service.DEFAULT_QUOTE, which the quote cache treats as a failed lookup
+                return self._send(200, [{"q": "Well begun is half done.", "a": "Aristotle", "h": ""}])
+            if url.path == LOCATION_PATH:
+                return self._send(200, {"status": "success", "city": "Waltham Forest"})
+            if url.path == FORECAST_PATH:
+                body = {}
+                if "current" in params:
+                    temperature = round(rng.uniform(0, 20), 1)
+                    body["current"] = {
+                        "temperature_2m": temperature, "relative_humidity_2m": 70, "rain": 0.0, "snowfall": 0.0,
+                        "wind_speed_10m": 12.0, "wind_direction_10m": 220, "apparent_temperature": temperature - 1,
+                    }
+                if "daily" in params:
+                    body["daily"] = _daily(date.today(), int(params.get("forecast_days", ["7"])[0]), rng)
+                return self._send(200, body)
+            if url.path == ARCHIVE_PATH:
+                try:
+                    start = date.fromisoformat(params["start_date"][0])
+                    end = date.fromisoformat(params["end_date"][0])
+                except (KeyError, ValueError):
+                    return self._send(400, {"error": True, "reason": "start_date and end_date are required"})
+                return self._send(200, {"daily": _daily(start, (end - start).days + 1, rng)})
+            return self._send(404, {"error": f"no stub for {url.path}"})
+
+        def _send(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub_server(port=0, latency_ms=DEFAULT_LATENCY_MS, jitter_ms=DEFAULT_JITTER_MS,
+                      failure_rate=DEFAULT_FAILURE_RATE, seed=None):
+    """Serves the stubs from a background thread. Returns (server, state, base_url)."""
+    state = StubState(latency_ms, jitter_ms, failure_rate, seed)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-apis", daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_port}"
+
+
+def stub_environment(base_url):
+    """The WELLBEING_*_URL variables that point the app at a stub server."""
+    return {
+        "WELLBEING_QUOTE_API_URL": base_url + QUOTE_PATH,
+        "WELLBEING_LOCATION_API_URL": base_url + LOCATION_PATH,
+        "WELLBEING_WEATHER_API_URL": base_url + FORECAST_PATH,
+        "WELLBEING_WEATHER_HISTORY_URL": base_url + ARCHIVE_PATH,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve local stand-ins for the quote and weather APIs.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency-ms", type=float, default=DEFAULT_LATENCY_MS)
+    parser.add_argument("--jitter-ms", type=float, default=DEFAULT_JITTER_MS)
+    parser.add_argument("--failure-rate", type=float, default=DEFAULT_FAILURE_RATE, help="fraction of requests answered 503")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server, state, base_url = start_stub_server(args.port, args.latency_ms, args.jitter_ms, args.failure_rate, args.seed)
+    print(f"[Stub] Serving on {base_url}; point the app at it with:")
+    for name, value in stub_environment(base_url).items():
+        print(f"  export {name}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"[Stub] Requests served: {state.requests}")
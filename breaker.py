@@ -0,0 +1,127 @@
+# breaker.py
+# One circuit breaker per upstream, per worker process. After BREAKER_FAILURE_THRESHOLD
+# consecutive failures the circuit opens and calls fail immediately (CircuitOpenError, a
+# requests.RequestException, so every fetch_* falls back as it does for any other
+# error). After BREAKER_RESET_SECONDS one half-open probe is let through: a success
+# closes the circuit again, a failure re-opens it for another BREAKER_RESET_SECONDS.
+
+import os
+import threading
+import time
+
+import requests
+
+import metrics
+
+# --- Configuration ---
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("WELLBEING_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("WELLBEING_BREAKER_RESET_SECONDS", "30"))
+# --- End Configuration ---
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _move(self, state):
+        if state != self.state:
+            print(f"[Breaker] {self.name}: {self.state} -> {state}")
+            metrics.inc("circuit_breaker_transitions_total", upstream=self.name, state=state)
+            self.state = state
+
+    def allow(self):
+        """True if a call may go out now; in half-open state only the single probe may."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    return False
+                self._move(HALF_OPEN)
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._move(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._move(OPEN)
+
+    def call(self, func, *args, is_failure=None, **kwargs):
+        """
+        Runs func(*args, **kwargs) through the breaker. Exceptions count as failures, and so
+        do results for which `is_failure(result)` is true (e.g. 5xx responses).
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open; retrying after {self.reset_seconds:.0f}s")
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        if is_failure is not None and is_failure(result):
+            self.record_failure()
+        else:
+            self.record_success()
+        return result
+
+    async def call_async(self, func, *args, is_failure=None, **kwargs):
+        """call() for a coroutine function."""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open; retrying after {self.reset_seconds:.0f}s")
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Cancelled: no verdict on the upstream, but a half-open probe must not stay claimed
+            with self._lock:
+                self._probing = False
+            raise
+        if is_failure is not None and is_failure(result):
+            self.record_failure()
+        else:
+            self.record_success()
+        return result
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """The process-wide breaker for upstream `name`, created on first use."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def breaker_states():
+    """{upstream: state} for this process."""
+    return {name: breaker.state for name, breaker in _breakers.items()}
@@ -0,0 +1,447 @@
+# cache.py
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from functools import wraps
+
+# --- Configuration ---
+# "memory" keeps entries per worker process, "sqlite" shares them between all gunicorn workers.
+CACHE_BACKEND = os.environ.get("WELLBEING_CACHE_BACKEND", "memory")
+CACHE_DB_PATH = os.environ.get("WELLBEING_CACHE_PATH", os.path.join("data_logs", "api_cache.db"))
+# Cross-worker single-flight: with the sqlite backend, one worker at a time holds a lease per key
+# and the others wait for its result to appear in the shared cache.
+SINGLE_FLIGHT_LEASE = os.environ.get("WELLBEING_SINGLE_FLIGHT_LEASE", "0") == "1"
+LEASE_SECONDS = 15               # longer than one upstream call including its retries
+LEASE_POLL_INTERVAL = 0.05
+# --- End Configuration ---
+
+
+class MemoryBackend:
+    """Process-local cache store: key -> (stored_at, value)."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key, value, stored_at):
+        with self._lock:
+            self._entries[key] = (stored_at, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def prune(self, prefix, stored_before):
+        """Drops entries under `prefix` stored before `stored_before` (epoch seconds)."""
+        with self._lock:
+            for key in [key for key, (stored_at, _) in self._entries.items()
+                        if key.startswith(prefix) and stored_at < stored_before]:
+                del self._entries[key]
+
+    def acquire_lease(self, key, owner, seconds):
+        return True  # a single process is already coalesced in memory
+
+    def release_lease(self, key, owner):
+        pass
+
+
+class SQLiteBackend:
+    """Cache store in a small SQLite file so every worker process sees the same entries."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        # sqlite3 connections must not cross threads or forked processes
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS api_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS api_lease ("
+                "key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT stored_at, value FROM api_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def set(self, key, value, stored_at):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO api_cache (key, value, stored_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), stored_at),
+        )
+
+    def clear(self):
+        self._connection().execute("DELETE FROM api_cache")
+
+    def prune(self, prefix, stored_before):
+        """Drops entries under `prefix` stored before `stored_before` (epoch seconds)."""
+        self._connection().execute(
+            "DELETE FROM api_cache WHERE key >= ? AND key < ? AND stored_at < ?",
+            (prefix, prefix + "\uffff", stored_before),
+        )
+
+    def acquire_lease(self, key, owner, seconds):
+        """Takes the lease on `key` if it is free or expired; one atomic statement."""
+        now = time.time()
+        cursor = self._connection().execute(
+            "INSERT INTO api_lease (key, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE api_lease.expires_at < ?",
+            (key, owner, now + seconds, now),
+        )
+        return cursor.rowcount == 1
+
+    def release_lease(self, key, owner):
+        self._connection().execute("DELETE FROM api_lease WHERE key = ? AND owner = ?", (key, owner))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+_inflight = {}
+_inflight_lock = threading.Lock()
+stats = {"hits": 0, "stale_hits": 0, "misses": 0, "last_good": 0, "upstream_calls": 0, "coalesced": 0, "lease_waits": 0}
+
+
+def get_backend():
+    """Returns the configured cache backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if CACHE_BACKEND == "sqlite":
+                    _backend = SQLiteBackend(CACHE_DB_PATH)
+                else:
+                    _backend = MemoryBackend()
+    return _backend
+
+
+def _make_key(source, args):
+    return f"{source}:{json.dumps(args)}"
+
+
+def _refresh(key, func, args, accept):
+    """Calls the upstream function and stores the result if it is worth keeping."""
+    stats["upstream_calls"] += 1
+    value = func(*args)
+    if accept is None or accept(value):
+        get_backend().set(key, value, time.time())
+    return value
+
+
+def _single_flight(key, call):
+    """
+    Runs `call()` once per key at a time in this process: concurrent callers for the
+    same key wait on the in-flight call and share its result (or exception).
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    if not leader:
+        stats["coalesced"] += 1
+        return future.result()
+
+    try:
+        future.set_result(call())
+    except BaseException as e:
+        future.set_exception(e)
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+    return future.result()
+
+
+def _leased_refresh(key, func, args, accept, ttl):
+    """
+    Cross-worker single flight: fetches only while holding the key's lease. Without it,
+    polls the shared cache until the holder's result lands (or the lease frees up, e.g.
+    because the holder's result was rejected, in which case this worker takes its turn).
+    """
+    backend = get_backend()
+    owner = f"{os.getpid()}:{threading.get_ident()}"
+    waited = False
+    while True:
+        if backend.acquire_lease(key, owner, LEASE_SECONDS):
+            try:
+                # The previous holder may have stored a fresh result just before releasing
+                entry = backend.get(key)
+                if entry is not None and time.time() - entry[0] < ttl:
+                    return entry[1]
+                return _refresh(key, func, args, accept)
+            finally:
+                backend.release_lease(key, owner)
+        if not waited:
+            stats["lease_waits"] += 1
+            waited = True
+        time.sleep(LEASE_POLL_INTERVAL)
+        entry = backend.get(key)
+        if entry is not None and time.time() - entry[0] < ttl:
+            return entry[1]
+
+
+def _submit_flight(executor, key, call):
+    """
+    _single_flight() for callers that must not block: returns the key's in-flight Future,
+    or submits `call()` to `executor` as that in-flight call. Concurrent callers wait on the
+    Future in their own threads, so there is at most one executor task per key. If the
+    executor refuses the task (e.g. its queue is full) the Future holds that exception.
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            stats["coalesced"] += 1
+            return future
+        future = _inflight[key] = Future()
+
+    def run():
+        try:
+            future.set_result(call())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with _inflight_lock:
+                del _inflight[key]
+
+    try:
+        executor.submit(run)
+    except Exception as e:
+        with _inflight_lock:
+            del _inflight[key]
+        future.set_exception(e)
+    return future
+
+
+def _upstream_call(key, func, args, accept, ttl):
+    if SINGLE_FLIGHT_LEASE and CACHE_BACKEND == "sqlite":
+        return lambda: _leased_refresh(key, func, args, accept, ttl)
+    return lambda: _refresh(key, func, args, accept)
+
+
+def _fetch(key, func, args, accept, ttl):
+    return _single_flight(key, _upstream_call(key, func, args, accept, ttl))
+
+
+def _refresh_in_background(key, func, args, accept, ttl):
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            _fetch(key, func, args, accept, ttl)
+        except Exception as e:
+            print(f"[Cache] Background refresh failed for {key}. Error: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=run, name=f"cache-refresh-{key}", daemon=True).start()
+
+
+def cached(source, ttl, stale_ttl=None, accept=None, last_good_ttl=0):
+    """
+    Caches a lookup per source and arguments.
+
+    Entries younger than `ttl` seconds are served directly. Entries up to
+    `stale_ttl` seconds past that are still served, while a background thread
+    fetches a fresh copy (stale-while-revalidate). Older or missing entries are
+    fetched synchronously. Results for which `accept(result)` is false (e.g.
+    error fallbacks) are returned but never stored; instead the last accepted
+    result is returned if it is at most `last_good_ttl` seconds past the stale
+    window. `wrapper.last_good(*args)` returns that value without calling out
+    (or None), for callers that cannot wait for the upstream.
+
+    Upstream calls are single-flight: concurrent misses for the same key share one
+    call within a process, and across workers too with WELLBEING_SINGLE_FLIGHT_LEASE=1.
+    `wrapper.submit(executor, *args)` is the non-blocking form: a Future that is already
+    done on a hit, and otherwise shares the key's one in-flight call on `executor`.
+    """
+    if stale_ttl is None:
+        stale_ttl = ttl
+
+    def decorator(func):
+        def lookup(key, args):
+            """(served, entry): `served` is [value] when the cache can answer without waiting."""
+            entry = get_backend().get(key)
+            if entry is not None:
+                age = time.time() - entry[0]
+                if age < ttl:
+                    stats["hits"] += 1
+                    return [entry[1]], entry
+                if age < ttl + stale_ttl:
+                    stats["stale_hits"] += 1
+                    _refresh_in_background(key, func, args, accept, ttl)
+                    return [entry[1]], entry
+            stats["misses"] += 1
+            return None, entry
+
+        def settle(value, entry):
+            if accept is not None and not accept(value) and entry is not None \
+                    and time.time() - entry[0] < ttl + stale_ttl + last_good_ttl:
+                stats["last_good"] += 1
+                return entry[1]
+            return value
+
+        @wraps(func)
+        def wrapper(*args):
+            key = _make_key(source, args)
+            served, entry = lookup(key, args)
+            if served:
+                return served[0]
+            return settle(_fetch(key, func, args, accept, ttl), entry)
+
+        def submit(executor, *args):
+            key = _make_key(source, args)
+            served, entry = lookup(key, args)
+            result = Future()
+            if served:
+                result.set_result(served[0])
+                return result
+
+            def finish(flight):
+                try:
+                    result.set_result(settle(flight.result(), entry))
+                except BaseException as e:
+                    result.set_exception(e)
+
+            _submit_flight(executor, key, _upstream_call(key, func, args, accept, ttl)).add_done_callback(finish)
+            return result
+
+        def last_good(*args):
+            entry = get_backend().get(_make_key(source, args))
+            if entry is None or time.time() - entry[0] >= ttl + stale_ttl + last_good_ttl:
+                return None
+            stats["last_good"] += 1
+            return entry[1]
+
+        wrapper.submit = submit
+        wrapper.last_good = last_good
+        return wrapper
+
+    return decorator
+
+
+# --- Coroutine functions (the ASGI mode, see asgi.py) ---
+
+_async_inflight = {}
+_background_tasks = set()   # the event loop only keeps weak references to tasks
+
+
+async def _backend_call(method, *args):
+    # The SQLite store may wait on a lock, which must not block the event loop
+    if CACHE_BACKEND == "sqlite":
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+
+async def _refresh_async(key, func, args, accept):
+    stats["upstream_calls"] += 1
+    value = await func(*args)
+    if accept is None or accept(value):
+        await _backend_call(get_backend().set, key, value, time.time())
+    return value
+
+
+async def _fetch_async(key, func, args, accept):
+    """Single flight within the event loop; waiters are shielded, so a timed-out caller never cancels the shared call."""
+    task = _async_inflight.get(key)
+    if task is None:
+        task = _async_inflight[key] = asyncio.ensure_future(_refresh_async(key, func, args, accept))
+        task.add_done_callback(lambda _: _async_inflight.pop(key, None))
+    else:
+        stats["coalesced"] += 1
+    return await asyncio.shield(task)
+
+
+def _refresh_in_background_async(key, func, args, accept):
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    async def run():
+        try:
+            await _fetch_async(key, func, args, accept)
+        except Exception as e:
+            print(f"[Cache] Background refresh failed for {key}. Error: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    task = asyncio.ensure_future(run())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def async_cached(source, ttl, stale_ttl=None, accept=None, last_good_ttl=0):
+    """
+    cached() for coroutine functions, sharing its backend and keys, so the sync and async
+    fetchers of one source serve each other's entries. Calls are coalesced per event loop
+    (the cross-worker lease is not used here).
+    """
+    if stale_ttl is None:
+        stale_ttl = ttl
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args):
+            key = _make_key(source, args)
+            entry = await _backend_call(get_backend().get, key)
+            if entry is not None:
+                stored_at, value = entry
+                age = time.time() - stored_at
+                if age < ttl:
+                    stats["hits"] += 1
+                    return value
+                if age < ttl + stale_ttl:
+                    stats["stale_hits"] += 1
+                    _refresh_in_background_async(key, func, args, accept)
+                    return value
+            stats["misses"] += 1
+            value = await _fetch_async(key, func, args, accept)
+            if accept is not None and not accept(value) and entry is not None and age < ttl + stale_ttl + last_good_ttl:
+                stats["last_good"] += 1
+                return entry[1]
+            return value
+
+        async def last_good(*args):
+            entry = await _backend_call(get_backend().get, _make_key(source, args))
+            if entry is None or time.time() - entry[0] >= ttl + stale_ttl + last_good_ttl:
+                return None
+            stats["last_good"] += 1
+            return entry[1]
+
+        wrapper.last_good = last_good
+        return wrapper
+
+    return decorator
@@ -0,0 +1,160 @@
+# charts.py
+# Per-user chart rendering off the request path. Renders run in a process pool
+# (matplotlib Agg) and their output is cached on disk under a content address:
+# a hash of (user, data version, chart options). A new check-in bumps the data
+# version, so stale charts are never served and nothing has to be purged.
+
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# --- Configuration ---
+CHART_WORKERS = int(os.environ.get("WELLBEING_CHART_WORKERS", "2"))
+CHART_CACHE_DIR = os.environ.get("WELLBEING_CHART_DIR", os.path.join("data_logs", "charts"))
+CHART_CACHE_MAX_FILES = 5000     # oldest files are pruned beyond this
+CHART_RETRY_AFTER = 1            # seconds clients wait before polling a pending render
+CHART_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+# option -> (default, min, max)
+CHART_OPTIONS = {
+    "width": (12, 4, 24),
+    "panel_height": (4, 2, 8),
+    "dpi": (100, 50, 200),
+    "max_points": (1000, 100, 5000),   # per trend line (downsample.lttb)
+}
+# --- End Configuration ---
+
+_pool = None
+_pool_pid = None
+_lock = threading.RLock()
+_jobs = {}       # chart key -> Future of the render in progress
+_failures = {}   # chart key -> error message, reported once then retried
+stats = {"hits": 0, "renders": 0, "coalesced": 0, "failures": 0}
+
+
+def parse_options(args):
+    """Validates chart query parameters into (fmt, options); raises ValueError on bad input."""
+    fmt = args.get("format", "png").lower()
+    if fmt not in CHART_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(CHART_FORMATS)}")
+    options = {}
+    for name, (default, low, high) in CHART_OPTIONS.items():
+        try:
+            value = int(args.get(name, default))
+        except ValueError:
+            raise ValueError(f"{name} must be an integer")
+        if not low <= value <= high:
+            raise ValueError(f"{name} must be between {low} and {high}")
+        options[name] = value
+    if fmt == "svg":
+        options["dpi"] = CHART_OPTIONS["dpi"][0]  # resolution-independent; keep one cache entry
+    return fmt, options
+
+
+def chart_key(user_id, data_version, fmt, options):
+    """Content address of one rendered chart."""
+    spec = json.dumps({"user": user_id, "version": data_version, "format": fmt, "options": options}, sort_keys=True)
+    return hashlib.sha256(spec.encode()).hexdigest()
+
+
+def chart_path(key, fmt):
+    return os.path.abspath(os.path.join(CHART_CACHE_DIR, f"{key}.{fmt}"))
+
+
+def _get_pool():
+    global _pool, _pool_pid
+    # Processes are spawned (not forked) so they never inherit the server's threads or connections
+    if _pool is None or _pool_pid != os.getpid():
+        with _lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def render_job(timestamps, values, fmt, options):
+    """Worker: renders the user's series (sent over as arrays) to bytes."""
+    from data_analysis import render_wellbeing_figure
+
+    return render_wellbeing_figure(timestamps, values, fmt=fmt, **options)
+
+
+def _store(key, fmt, future):
+    try:
+        image = future.result()
+        os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+        path = chart_path(key, fmt)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(image)
+        os.replace(temp_path, path)  # atomic: readers see the whole file or none
+        _prune()
+    except Exception as e:
+        stats["failures"] += 1
+        _failures[key] = str(e) or type(e).__name__
+        print(f"[Charts] Render {key[:12]} failed. Error: {e}")
+    finally:
+        with _lock:
+            _jobs.pop(key, None)
+
+
+def _prune():
+    try:
+        entries = [entry for entry in os.scandir(CHART_CACHE_DIR) if not entry.name.endswith(".tmp")]
+    except FileNotFoundError:
+        return
+    if len(entries) <= CHART_CACHE_MAX_FILES:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:len(entries) - CHART_CACHE_MAX_FILES]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def request_chart(user_id, data_version, fmt, options, load):
+    """
+    Non-blocking chart lookup; `load()` returns the user's (timestamps, values) and is only
+    called when a render has to be queued. Returns one of:
+      ("ready", path)   - cached output exists
+      ("pending", key)  - a render is queued or running (one per key, however many callers)
+      ("failed", msg)   - the last render for this key failed; the next call retries
+    """
+    key = chart_key(user_id, data_version, fmt, options)
+    path = chart_path(key, fmt)
+    if os.path.exists(path):
+        stats["hits"] += 1
+        return "ready", path
+
+    error = _failures.pop(key, None)
+    if error is not None:
+        return "failed", error
+
+    with _lock:
+        if key in _jobs:
+            stats["coalesced"] += 1
+            return "pending", key
+    # The DB read runs outside the lock, so one slow load never holds up other users' charts
+    timestamps, values = load()
+    with _lock:
+        if key in _jobs:  # another caller queued it while we were loading
+            stats["coalesced"] += 1
+            return "pending", key
+        try:
+            future = _get_pool().submit(render_job, timestamps, values, fmt, options)
+        except BrokenProcessPool:
+            _reset_pool()
+            future = _get_pool().submit(render_job, timestamps, values, fmt, options)
+        _jobs[key] = future
+        stats["renders"] += 1
+    future.add_done_callback(lambda done: _store(key, fmt, done))
+    return "pending", key
+
+
+def _reset_pool():
+    global _pool
+    _pool = None  # caller holds _lock; the next _get_pool() builds a fresh one
@@ -0,0 +1,216 @@
+# cohort_job.py
+# Offline batch analytics: computes every user's analysis stats in parallel and
+# stores them in analysis_report (served directly by /api/analysis), plus
+# cohort-level statistics in cohort_report. With sharding on, every shard is read in parallel.
+# Usage: python cohort_job.py [--workers N] [--chunk-rows N]
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+from types import SimpleNamespace
+import numpy as np
+from sqlalchemy import create_engine, text
+from aggregates import MOMENT_FIELDS, aggregate_stats, init_moments, merge_moments, moments_from_series
+from analysis_engine import FACTOR_KEYS, METRICS, compute_stats
+from sqlite_profile import install_sqlite_profile
+
+# --- Configuration ---
+MIN_CHUNK_ROWS = 50000          # don't bother shipping tiny chunks to a worker
+CHUNKS_PER_WORKER = 8           # more chunks than workers keeps the pool busy at the tail
+FETCH_SIZE = 10000
+WRITE_BATCH_SIZE = 5000
+PERCENTILES = [10, 25, 50, 75, 90]
+# --- End Configuration ---
+
+VERSION_QUERY = text(
+    "SELECT user_id, data_version FROM wellbeing_aggregate WHERE user_id BETWEEN :first AND :last"
+)
+SERIES_QUERY = text(
+    "SELECT user_id, " + ", ".join(column for _, column in METRICS) + " FROM wellbeing_data "
+    "WHERE user_id BETWEEN :first AND :last ORDER BY user_id, timestamp"
+)
+
+
+def plan_chunks(row_counts, target_rows):
+    """
+    Splits (user_id, row_count) pairs, sorted by user_id, into contiguous user-id
+    ranges of roughly `target_rows` rows each. Returns [(first_id, last_id, rows), ...].
+    """
+    chunks = []
+    first = None
+    rows = 0
+    for user_id, count in row_counts:
+        if first is None:
+            first = user_id
+        rows += count
+        if rows >= target_rows:
+            chunks.append((first, user_id, rows))
+            first, rows = None, 0
+    if first is not None:
+        chunks.append((first, row_counts[-1][0], rows))
+    return chunks
+
+
+def analyse_chunk(database_url, first_id, last_id):
+    """
+    Worker: streams one user-id range with a single index-ordered query and
+    computes each user's stats. Returns per-user (user_id, entries, data_version, stats)
+    results and the chunk's pooled moments.
+    """
+    engine = create_engine(database_url)
+    install_sqlite_profile(engine)
+    pooled = init_moments(SimpleNamespace())
+    results = []
+
+    def finish(user_id, rows):
+        values = np.array(rows, dtype=float)
+        results.append((user_id, len(rows), versions.get(user_id), compute_stats(values)))
+        merge_moments(pooled, moments_from_series(values, SimpleNamespace()))
+
+    with engine.connect() as conn:
+        # Versions before rows: a write landing in between makes the report look stale
+        # (recomputed on request), never a stale report look current
+        versions = dict(conn.execute(VERSION_QUERY, {"first": first_id, "last": last_id}).all())
+        stream = conn.execution_options(yield_per=FETCH_SIZE).execute(
+            SERIES_QUERY, {"first": first_id, "last": last_id}
+        )
+        current_user, rows = None, []
+        for partition in stream.partitions():
+            for row in partition:
+                if row[0] != current_user:
+                    if rows:
+                        finish(current_user, rows)
+                    current_user, rows = row[0], []
+                rows.append(row[1:])
+        if rows:
+            finish(current_user, rows)
+    engine.dispose()
+    return results, {field: getattr(pooled, field) for field in MOMENT_FIELDS}
+
+
+def _percentiles(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def cohort_stats(user_stats, pooled):
+    """Population-level stats: pooled moments over all check-ins plus per-user distributions."""
+    population = aggregate_stats(pooled)
+    distributions = {
+        "entries": _percentiles([stats['entries'] for stats in user_stats]),
+        "avg_mood": _percentiles([stats['mean']['mood'] for stats in user_stats]),
+    }
+    for factor in FACTOR_KEYS:
+        distributions[f"r_{factor}"] = _percentiles([stats['correlations'][factor] for stats in user_stats])
+    return {"population": population, "per_user_percentiles": distributions}
+
+
+def count_rows(database_url):
+    """(user_id, row_count) pairs of one database file, sorted by user_id."""
+    engine = create_engine(database_url)
+    install_sqlite_profile(engine)
+    with engine.connect() as conn:
+        row_counts = conn.execute(text(
+            "SELECT user_id, COUNT(*) FROM wellbeing_data GROUP BY user_id ORDER BY user_id"
+        )).all()
+    engine.dispose()
+    return [tuple(row) for row in row_counts]
+
+
+def run_job(database_url, workers=None, chunk_rows=None, shard_urls=None):
+    """
+    Runs the whole job against `database_url` and returns a summary dict. With `shard_urls`
+    the check-ins (and their analysis reports) are read from and written to those files
+    instead; every shard is queried at once and their chunks share the pool.
+    """
+    started = time.perf_counter()
+    sources = shard_urls or [database_url]
+    engines = {}
+    for url in [database_url] + sources:
+        if url not in engines:
+            engines[url] = create_engine(url)
+            install_sqlite_profile(engines[url])
+    workers = workers or os.cpu_count() or 1
+
+    with ThreadPoolExecutor(max_workers=len(sources)) as counter:
+        counts = dict(zip(sources, counter.map(count_rows, sources)))
+    total_rows = sum(count for row_counts in counts.values() for _, count in row_counts)
+    users = sum(len(row_counts) for row_counts in counts.values())
+    if not users:
+        return {"users": 0, "entries": 0, "seconds": 0.0}
+
+    target = chunk_rows or max(MIN_CHUNK_ROWS, total_rows // (workers * CHUNKS_PER_WORKER))
+    chunks = [(url, first, last) for url in sources if counts[url] for first, last, _ in plan_chunks(counts[url], target)]
+    shards_note = f" across {len(sources)} shards" if shard_urls else ""
+    print(f"[Cohort] {users} users, {total_rows} rows{shards_note} in {len(chunks)} chunks on {workers} workers")
+
+    pooled = init_moments(SimpleNamespace())
+    user_stats = []
+    computed_at = datetime.utcnow()
+    pending_rows = {url: [] for url in sources}
+
+    def flush(conn, url):
+        conn.execute(text(
+            "INSERT OR REPLACE INTO analysis_report (user_id, entries, data_version, stats, computed_at) "
+            "VALUES (:user_id, :entries, :data_version, :stats, :computed_at)"
+        ), pending_rows[url])
+        pending_rows[url].clear()
+
+    # The parent is the only writer, so workers never contend for SQLite's write lock
+    with ProcessPoolExecutor(max_workers=workers) as pool, ExitStack() as stack:
+        conns = {url: stack.enter_context(engine.begin()) for url, engine in engines.items()}
+        futures = [(url, pool.submit(analyse_chunk, url, first, last)) for url, first, last in chunks]
+        for url, future in futures:
+            results, chunk_moments = future.result()
+            merge_moments(pooled, SimpleNamespace(**chunk_moments))
+            for user_id, entries, data_version, stats in results:
+                user_stats.append(stats)
+                pending_rows[url].append({
+                    "user_id": user_id, "entries": entries, "data_version": data_version,
+                    "stats": json.dumps(stats), "computed_at": computed_at,
+                })
+                if len(pending_rows[url]) >= WRITE_BATCH_SIZE:
+                    flush(conns[url], url)
+        for url in sources:
+            if pending_rows[url]:
+                flush(conns[url], url)
+
+        summary = cohort_stats(user_stats, pooled)
+        conns[database_url].execute(text(
+            "INSERT INTO cohort_report (users, entries, stats, computed_at) "
+            "VALUES (:users, :entries, :stats, :computed_at)"
+        ), {"users": len(user_stats), "entries": total_rows, "stats": json.dumps(summary), "computed_at": computed_at})
+
+    for engine in engines.values():
+        engine.dispose()
+    return {
+        "users": len(user_stats),
+        "entries": total_rows,
+        "seconds": round(time.perf_counter() - started, 2),
+        "cohort": summary,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Precompute analysis reports for every user.")
+    parser.add_argument("--workers", type=int, help="process pool size (default: CPU count)")
+    parser.add_argument("--chunk-rows", type=int, help="target rows per work chunk")
+    args = parser.parse_args()
+
+    from app import app, db
+    from migrations import migrate
+    from shards import SHARD_COUNT, shard_database_urls
+
+    with app.app_context():
+        migrate(db.engine)
+        database_url = db.engine.url.render_as_string(hide_password=False)
+        shard_urls = shard_database_urls(db) if SHARD_COUNT else None
+
+    summary = run_job(database_url, workers=args.workers, chunk_rows=args.chunk_rows, shard_urls=shard_urls)
+    print(json.dumps(summary, indent=2))
@@ -1,110 +1,144 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+import io
 import os
-import numpy as np 
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")  # headless: never needs a display, safe in worker processes
+from matplotlib.figure import Figure
+from analysis_engine import METRIC_KEYS
+from downsample import lttb
 
 # Define the file paths
 LOG_FILE_PATH = os.path.join("data_logs", "wellbeing_log.csv")
-CHART_FILE_NAME = "wellbeing_full_report.png" 
+CHART_FILE_NAME = "wellbeing_full_report.png"
 
-def generate_wellbeing_charts(log_file=LOG_FILE_PATH, chart_file=CHART_FILE_NAME):
+# Legacy CSV column for each analysis_engine metric
+CSV_COLUMNS = {'mood': 'MoodScore', 'temperature': 'Temperature', 'sleep': 'SleepHours', 'exercise': 'ExerciseMinutes'}
+
+# (metric, title, y label, marker, colour) for the four trend panels
+TREND_PANELS = [
+    ('mood', 'Emotional Wellbeing Trend Over Time', 'Mood Score (1-5)', 'o', '#5B9BD5'),
+    ('temperature', 'Environmental Temperature Trend Over Time', 'Temperature (°C)', 's', '#ED7D31'),
+    ('sleep', 'Sleep Duration Trend Over Time', 'Sleep Hours', '^', '#3CB371'),
+    ('exercise', 'Exercise Duration Trend Over Time', 'Exercise Minutes', 'x', '#9467BD'),
+]
+TREND_LABELS = {'mood': 'Mood Score', 'temperature': 'Temperature (°C)', 'sleep': 'Sleep Hours', 'exercise': 'Exercise Minutes'}
+MAX_TREND_POINTS = 1000     # per trend panel; longer series are reduced with LTTB
+MAX_MARKER_POINTS = 200     # markers only help while individual points are distinguishable
+
+
+def load_log_series(log_file=LOG_FILE_PATH):
     """
-    Reads the log data and generates a composite chart with 5 panels:
+    Reads the legacy CSV log into (timestamps, values) in the analysis_engine.METRICS layout.
+    Rows missing sleep or exercise are dropped.
+    """
+    import pandas as pd
+
+    df = pd.read_csv(log_file)
+    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+
+    # Clean data: Drop rows that might be missing the required correlation columns
+    for key in METRIC_KEYS:
+        column = CSV_COLUMNS[key]
+        if column not in df.columns:
+            df[column] = np.nan
+        # Ensure values are float/numeric before dropping NaNs
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    df = df.dropna(subset=[CSV_COLUMNS['sleep'], CSV_COLUMNS['exercise']])
+    timestamps = df['Timestamp'].to_numpy(dtype='datetime64[us]')
+    values = df[[CSV_COLUMNS[key] for key in METRIC_KEYS]].to_numpy(dtype=float)
+    return timestamps, values
+
+
+def render_wellbeing_figure(timestamps, values, fmt='png', width=12, panel_height=4, dpi=100, max_points=MAX_TREND_POINTS):
+    """
+    Draws the 5-panel report for one series and returns the encoded image bytes:
     1. Mood Trend, 2. Temp Trend, 3. Sleep Trend, 4. Exercise Trend, 5. Mood vs. Temp Scatter.
+    Trend lines are downsampled to `max_points` each, so render time is bounded.
+    Uses a standalone Figure (no pyplot global state), so it is safe to call concurrently.
+    Raises ValueError if there are fewer than 2 data points.
     """
-    
+    if len(timestamps) < 2:
+        raise ValueError("Not enough data points (min 2 required)")
+    column = {key: values[:, i] for i, key in enumerate(METRIC_KEYS)}
+
+    # Determine the number of plots needed (5 panels total)
+    num_panels = len(TREND_PANELS) + 1
+    fig = Figure(figsize=(width, panel_height * num_panels)) # Dynamically adjust height
+    gs = fig.add_gridspec(num_panels, 1)
+
+    # --- Subplots 1-4: Trends over time (sharing the first panel's x-axis) ---
+    trend_axes = []
+    for row, (key, title, ylabel, marker, color) in enumerate(TREND_PANELS):
+        present = ~np.isnan(column[key])
+        x, y = timestamps[present], column[key][present]
+        index = lttb(x.astype(np.int64).astype(float), y, max_points)
+        ax = fig.add_subplot(gs[row, 0], sharex=trend_axes[0] if trend_axes else None)
+        ax.plot(x[index], y[index], marker=marker if len(index) <= MAX_MARKER_POINTS else None,
+                linestyle='-', color=color, label=TREND_LABELS[key])
+        ax.set_title(title, fontsize=14)
+        ax.set_ylabel(ylabel, fontsize=10)
+        if key == 'mood':
+            ax.set_yticks(range(1, 6))
+        ax.grid(True, linestyle='--', alpha=0.7)
+        ax.legend(loc='upper left')
+        trend_axes.append(ax)
+
+    # --- Subplot 5: Mood vs. Temperature Scatter Plot (Bottom) ---
+    ax5 = fig.add_subplot(gs[num_panels - 1, 0])
+    paired = ~np.isnan(column['temperature']) & ~np.isnan(column['mood'])
+    temperature, mood = column['temperature'][paired], column['mood'][paired]
+    step = max(1, len(temperature) // max_points)  # plot an even subsample; the fit below uses every pair
+    ax5.scatter(temperature[::step], mood[::step], color='gray', alpha=0.7, edgecolors='black')
+
+    if len(np.unique(temperature)) > 1 and len(np.unique(mood)) > 1:
+        corr = np.corrcoef(temperature, mood)[0, 1]
+        line_color = '#4CAF50' if corr >= 0.3 else ('#F44336' if corr <= -0.3 else 'lightgray')
+
+        m, b = np.polyfit(temperature, mood, 1)
+        span = np.array([temperature.min(), temperature.max()])
+        ax5.plot(span, m * span + b, color=line_color, linestyle='--', linewidth=2, label='Regression Line')
+
+    ax5.set_title('Mood Score vs. Temperature (Visual Correlation)', fontsize=14)
+    ax5.set_xlabel('Temperature (°C)', fontsize=10)
+    ax5.set_ylabel('Mood Score (1-5)', fontsize=10)
+    ax5.set_yticks(range(1, 6))
+    ax5.grid(True, linestyle='--', alpha=0.7)
+
+    # Remove tick labels from the shared x-axes except the last trend panel
+    for ax in trend_axes[:-1]:
+        ax.tick_params(labelbottom=False)
+    for label in trend_axes[-1].get_xticklabels():
+        label.set_rotation(45)
+        label.set_horizontalalignment('right')
+
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi)
+    return buffer.getvalue()
+
+
+def generate_wellbeing_charts(log_file=LOG_FILE_PATH, chart_file=CHART_FILE_NAME):
+    """
+    Reads the legacy CSV log and writes the composite 5-panel chart to `chart_file`.
+    The API renders per-user charts from the database instead (see charts.py).
+    """
+
     if not os.path.exists(log_file):
         print(f"[Chart] Skipping chart generation: Log file not found at {log_file}.")
         return None
 
     try:
-        # 1. Read the data
-        df = pd.read_csv(log_file)
-        df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-        
-        # Clean data: Drop rows that might be missing the required correlation columns
-        columns_to_check = ['SleepHours', 'ExerciseMinutes']
-        for col in columns_to_check:
-            if col in df.columns:
-                # Ensure values are float/numeric before dropping NaNs
-                df[col] = pd.to_numeric(df[col], errors='coerce') 
-                df = df.dropna(subset=[col])
-        
-        if df.empty or len(df) < 2:
+        timestamps, values = load_log_series(log_file)
+        if len(timestamps) < 2:
             print("[Chart] Skipping chart generation: Not enough data points (min 2 required).")
             return None
 
-        # Determine the number of plots needed (5 panels total)
-        num_panels = 5 
-        
-        # 2. Create the figure and subplots
-        fig = plt.figure(figsize=(12, 4 * num_panels)) # Dynamically adjust height
-        gs = fig.add_gridspec(num_panels, 1)
-        
-        # --- Subplot 1: Mood Score Trend ---
-        ax1 = fig.add_subplot(gs[0, 0])
-        ax1.plot(df['Timestamp'], df['MoodScore'], marker='o', linestyle='-', color='#5B9BD5', label='Mood Score')
-        ax1.set_title('Emotional Wellbeing Trend Over Time', fontsize=14)
-        ax1.set_ylabel('Mood Score (1-5)', fontsize=10)
-        ax1.set_yticks(range(1, 6))
-        ax1.grid(True, linestyle='--', alpha=0.7)
-        ax1.legend(loc='upper left')
-
-        # --- Subplot 2: Environmental Temperature Trend ---
-        ax2 = fig.add_subplot(gs[1, 0], sharex=ax1) 
-        ax2.plot(df['Timestamp'], df['Temperature'], marker='s', linestyle='-', color='#ED7D31', label='Temperature (°C)')
-        ax2.set_title('Environmental Temperature Trend Over Time', fontsize=14)
-        ax2.set_ylabel('Temperature (°C)', fontsize=10)
-        ax2.grid(True, linestyle='--', alpha=0.7)
-        ax2.legend(loc='upper left')
-        
-        # --- Subplot 3: Sleep Duration Trend ---
-        ax3 = fig.add_subplot(gs[2, 0], sharex=ax1) 
-        ax3.plot(df['Timestamp'], df['SleepHours'], marker='^', linestyle='-', color='#3CB371', label='Sleep Hours')
-        ax3.set_title('Sleep Duration Trend Over Time', fontsize=14)
-        ax3.set_ylabel('Sleep Hours', fontsize=10)
-        ax3.grid(True, linestyle='--', alpha=0.7)
-        ax3.legend(loc='upper left')
-        
-        # --- Subplot 4: Exercise Duration Trend ---
-        ax4 = fig.add_subplot(gs[3, 0], sharex=ax1) 
-        ax4.plot(df['Timestamp'], df['ExerciseMinutes'], marker='x', linestyle='-', color='#9467BD', label='Exercise Minutes')
-        ax4.set_title('Exercise Duration Trend Over Time', fontsize=14)
-        ax4.set_ylabel('Exercise Minutes', fontsize=10)
-        ax4.grid(True, linestyle='--', alpha=0.7)
-        ax4.legend(loc='upper left')
-        
-        # --- Subplot 5: Mood vs. Temperature Scatter Plot (Bottom) ---
-        ax5 = fig.add_subplot(gs[4, 0])
-        ax5.scatter(df['Temperature'], df['MoodScore'], color='gray', alpha=0.7, edgecolors='black')
-        
-        if len(df['Temperature'].unique()) > 1 and len(df['MoodScore'].unique()) > 1:
-            corr = df['Temperature'].corr(df['MoodScore']) 
-            line_color = '#4CAF50' if corr >= 0.3 else ('#F44336' if corr <= -0.3 else 'lightgray')
-            
-            m, b = np.polyfit(df['Temperature'], df['MoodScore'], 1)
-            ax5.plot(df['Temperature'], m * df['Temperature'] + b, color=line_color, linestyle='--', linewidth=2, label='Regression Line')
-            
-        ax5.set_title(f'Mood Score vs. Temperature (Visual Correlation)', fontsize=14)
-        ax5.set_xlabel('Temperature (°C)', fontsize=10)
-        ax5.set_ylabel('Mood Score (1-5)', fontsize=10)
-        ax5.set_yticks(range(1, 6))
-        ax5.grid(True, linestyle='--', alpha=0.7)
-        
-        # Remove tick labels from the shared x-axes
-        plt.setp(ax1.get_xticklabels(), visible=False)
-        plt.setp(ax2.get_xticklabels(), visible=False)
-        plt.setp(ax3.get_xticklabels(), visible=False)
-        plt.setp(ax4.get_xticklabels(), visible=False)
-
-        # 3. Save the figure
-        fig.autofmt_xdate(rotation=45)
-        plt.tight_layout()
-        plt.savefig(chart_file)
-        plt.close(fig)
+        fmt = os.path.splitext(chart_file)[1].lstrip('.') or 'png'
+        with open(chart_file, 'wb') as f:
+            f.write(render_wellbeing_figure(timestamps, values, fmt=fmt))
 
         print(f"\n[Chart] Wellbeing Full Report successfully generated: {chart_file}")
-        
+
         return chart_file
 
     except Exception as e:
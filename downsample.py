@@ -0,0 +1,99 @@
+# downsample.py
+# Bounded-size trend series for long histories. Both methods return at most
+# `n` points however many rows a user has, so JSON payloads and chart render
+# times stay flat as the history grows.
+
+from startup import lazy_import
+
+np = lazy_import("numpy")
+
+# --- Configuration ---
+DEFAULT_MAX_POINTS = 500
+MAX_POINTS_LIMIT = 5000
+METHODS = ('lttb', 'minmax')
+# --- End Configuration ---
+
+
+def lttb(x, y, n):
+    """
+    Largest-Triangle-Three-Buckets: picks `n` of the (x, y) points, always keeping the
+    first and last, so the line keeps its visual shape (peaks and troughs survive).
+    x must be increasing and y free of NaN. Returns the selected indices.
+    """
+    size = len(x)
+    if n >= size:
+        return np.arange(size)
+    if n < 3:
+        return np.array([0, size - 1], dtype=int)[:n]
+
+    # n - 2 buckets over the interior points
+    edges = np.linspace(1, size - 1, n - 1).astype(int)
+    starts, ends = edges[:-1], edges[1:]
+    # Mean of every bucket up front; bucket i is scored against the mean of bucket i + 1
+    sums_x = np.add.reduceat(x[1:size - 1], starts - 1)
+    sums_y = np.add.reduceat(y[1:size - 1], starts - 1)
+    counts = ends - starts
+    next_x = np.append(sums_x[1:] / counts[1:], x[-1])
+    next_y = np.append(sums_y[1:] / counts[1:], y[-1])
+
+    selected = np.empty(n, dtype=int)
+    selected[0], selected[-1] = 0, size - 1
+    a = 0
+    # The chosen point of each bucket depends on the previous choice, so this loop is over
+    # output points only; the work inside each bucket is vectorized
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - next_x[i]) * (by - y[a]) - (x[a] - bx) * (next_y[i] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_buckets(x, y, n):
+    """
+    Splits the x range into `n` equal-width buckets and returns per-bucket
+    (x_start, min, max, mean, count) arrays; empty buckets are omitted.
+    x must be increasing and y free of NaN.
+    """
+    if len(x) == 0:
+        empty = np.empty(0)
+        return empty, empty, empty, empty, np.empty(0, dtype=int)
+    bounds = np.linspace(x[0], x[-1], n + 1)
+    starts = np.unique(np.searchsorted(x, bounds[:-1], side='left'))
+    starts = starts[starts < len(x)]
+    counts = np.diff(np.append(starts, len(x)))
+    return (
+        x[starts],
+        np.minimum.reduceat(y, starts),
+        np.maximum.reduceat(y, starts),
+        np.add.reduceat(y, starts) / counts,
+        counts,
+    )
+
+
+def downsample_series(timestamps, values, n=DEFAULT_MAX_POINTS, method='lttb'):
+    """
+    Downsamples one metric column against datetime64 timestamps. NaN rows are dropped
+    first (each metric keeps its own x positions). Returns a dict of lists:
+    lttb -> {'t', 'v'}; minmax -> {'t', 'min', 'max', 'mean', 'count'}.
+    """
+    present = ~np.isnan(values)
+    timestamps, values = timestamps[present], values[present]
+    x = timestamps.astype('datetime64[us]').astype(np.int64).astype(float)
+
+    if method == 'lttb':
+        index = lttb(x, values, n)
+        return {'t': _iso(timestamps[index]), 'v': values[index].tolist()}
+
+    starts, low, high, mean, counts = minmax_buckets(x, values, n)
+    return {
+        't': _iso(starts.astype(np.int64).astype('datetime64[us]')),
+        'min': low.tolist(),
+        'max': high.tolist(),
+        'mean': mean.tolist(),
+        'count': counts.tolist(),
+    }
+
+
+def _iso(timestamps):
+    return np.datetime_as_string(timestamps, unit='s').tolist()
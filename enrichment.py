@@ -0,0 +1,224 @@
+# enrichment.py
+# Write-behind enrichment: check-ins are stored immediately and a background
+# worker fills in temperature/quote for everything still pending, batched by time bucket.
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from api_service import fetch_enrichment
+from aggregates import add_temperature, bump_data_version, get_or_create_aggregate, mark_rewritten
+from reference_data import attach_references, observation_hour, quote_day
+from rollups import add_temperatures_to_rollups
+from shards import each_shard, shard_ids, use_shard
+
+# --- Configuration ---
+# "sync" enriches inside the request (falling back to write-behind if an upstream fails),
+# "async" always stores first and returns 202.
+CHECKIN_MODE = os.environ.get("WELLBEING_CHECKIN_MODE", "sync")
+ENRICHMENT_BUCKET_SECONDS = 15 * 60     # pending rows in the same bucket share one lookup
+ENRICHMENT_BATCH_SIZE = 500
+ENRICHMENT_POLL_INTERVAL = 2.0
+# --- End Configuration ---
+
+_worker = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+worker_stats = {"batches": 0, "enriched": 0, "expired": 0, "failures": 0, "last_run": None}
+
+
+def time_bucket(timestamp):
+    """Truncates a (naive UTC) timestamp to the start of its enrichment bucket."""
+    seconds = (timestamp.hour * 3600 + timestamp.minute * 60 + timestamp.second) % ENRICHMENT_BUCKET_SECONDS
+    return timestamp - timedelta(seconds=seconds, microseconds=timestamp.microsecond)
+
+
+def enqueue(db, PendingEnrichment, log, location):
+    """Queues a (not yet flushed) WellbeingData row for background enrichment at `location`."""
+    now = datetime.utcnow()
+    db.session.add(PendingEnrichment(log=log, bucket=time_bucket(log.timestamp or now), enqueued_at=now, location=location))
+
+
+def queue_status(db, PendingEnrichment):
+    """Returns queue depth and the age of the oldest pending check-in (over every shard)."""
+    depth, oldest = 0, None
+    for _ in each_shard():
+        shard_depth, shard_oldest = db.session.execute(
+            db.select(db.func.count(PendingEnrichment.id), db.func.min(PendingEnrichment.enqueued_at))
+        ).one()
+        depth += shard_depth
+        if shard_oldest is not None and (oldest is None or shard_oldest < oldest):
+            oldest = shard_oldest
+    lag = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+    return {
+        "mode": CHECKIN_MODE,
+        "queue_depth": depth,
+        "lag_seconds": round(lag, 3),
+        "worker": dict(worker_stats, last_run=worker_stats["last_run"] and worker_stats["last_run"].isoformat()),
+    }
+
+
+def stored_enrichment(db, Quote, WeatherObservation, DailyWeather, city, timestamps):
+    """
+    (temperature, quote) for check-ins of an earlier bucket, from what is already stored:
+    the quote filed for their day, and the weather observed in their hour or else the mean
+    of their day (see weather_history.py). Either may be None. Only today's quote can still
+    come from the live API; returns None if that lookup fails.
+    """
+    days = {quote_day(timestamp) for timestamp in timestamps}
+    hours = {observation_hour(timestamp) for timestamp in timestamps}
+    quotes = {}
+    for day, text, author in db.session.execute(
+        db.select(Quote.day, Quote.text, Quote.author).where(Quote.day.in_(days)).order_by(Quote.id.desc())
+    ):
+        quotes[day] = {"quote": text, "author": author}   # the first one filed wins
+    observed = dict(db.session.execute(
+        db.select(WeatherObservation.hour, WeatherObservation.temperature)
+        .where(WeatherObservation.location == city, WeatherObservation.hour.in_(hours),
+               WeatherObservation.temperature.is_not(None))
+    ).all())
+    day_means = dict(db.session.execute(
+        db.select(DailyWeather.day, DailyWeather.temp_mean)
+        .where(DailyWeather.location == city, DailyWeather.day.in_(days), DailyWeather.temp_mean.is_not(None))
+    ).all())
+    db.session.rollback()
+
+    today = datetime.utcnow().date()
+    if today in days and today not in quotes:
+        quote_result, _ = fetch_enrichment(city, budget=None)
+        if not quote_result:
+            return None
+        quotes[today] = quote_result
+
+    return [
+        (observed.get(observation_hour(timestamp), day_means.get(quote_day(timestamp))), quotes.get(quote_day(timestamp)))
+        for timestamp in timestamps
+    ]
+
+
+def process_pending(db, WellbeingData, WellbeingAggregate, DailyRollup, PendingEnrichment, Quote, WeatherObservation,
+                    DailyWeather, batch_size=ENRICHMENT_BATCH_SIZE):
+    """
+    Enriches up to `batch_size` pending check-ins, oldest first, on the selected shard.
+    Each (bucket, location) group of the current bucket costs one quote/weather lookup.
+    The live weather only describes the current bucket, so rows from an earlier one (queued
+    through an upstream outage, say) are filled from stored data instead (stored_enrichment);
+    a row leaves the queue unenriched only when nothing is stored for it.
+    Returns the number of rows enriched.
+    """
+    current_bucket = time_bucket(datetime.utcnow())
+    pending = db.session.execute(
+        db.select(
+            PendingEnrichment.id,
+            PendingEnrichment.bucket,
+            WellbeingData.id,
+            WellbeingData.user_id,
+            PendingEnrichment.location,
+            WellbeingData.mood_score,
+            WellbeingData.timestamp,
+        )
+        .join(WellbeingData, PendingEnrichment.log_id == WellbeingData.id)
+        .order_by(PendingEnrichment.enqueued_at.asc())
+        .limit(batch_size)
+    ).all()
+    db.session.rollback()  # release the read snapshot before the upstream calls
+
+    groups = {}
+    for row in pending:
+        groups.setdefault((row[1], row[4]), []).append(row)
+
+    enriched = 0
+    for (bucket, city), rows in groups.items():
+        live = bucket == current_bucket
+        if live:
+            quote_result, weather_result = fetch_enrichment(city, budget=None)  # no caller waiting here
+            fills = [(weather_result['temp'], quote_result)] * len(rows) if quote_result and weather_result else None
+        else:
+            fills = stored_enrichment(db, Quote, WeatherObservation, DailyWeather, city, [row[6] for row in rows])
+        if fills is None:
+            worker_stats["failures"] += 1
+            continue  # leave them queued, the next poll retries
+
+        filled = [(row, temperature, quote) for row, (temperature, quote) in zip(rows, fills)
+                  if temperature is not None or quote]
+        # References (main database) before the claim (shard): the same lock order as a check-in
+        updates = attach_references(db, Quote, WeatherObservation, [
+            {
+                "id": row[2],
+                "timestamp": row[6],
+                "city": city,
+                "temperature": temperature if live else None,   # never file a day's mean as an hourly reading
+                "quote_text": quote and quote['quote'],
+                "quote_author": quote and quote['author'],
+            }
+            for row, temperature, quote in filled
+        ])
+        pending_ids = [row[0] for row in rows]
+        claimed = db.session.execute(
+            db.delete(PendingEnrichment).where(PendingEnrichment.id.in_(pending_ids))
+        ).rowcount
+        if claimed != len(pending_ids):
+            # Another worker got to (some of) these first
+            db.session.rollback()
+            continue
+
+        for update, (_, temperature, _) in zip(updates, filled):
+            del update["timestamp"]
+            update["temperature"] = temperature
+        if updates:
+            db.session.execute(db.update(WellbeingData), updates)
+        for row, temperature, _ in filled:
+            aggregate = get_or_create_aggregate(db, WellbeingAggregate, row[3])
+            if temperature is not None:
+                add_temperature(aggregate, row[5], temperature)
+            bump_data_version(aggregate)
+            mark_rewritten(aggregate)
+        add_temperatures_to_rollups(db, DailyRollup, [
+            (row[3], row[6], row[5], temperature) for row, temperature, _ in filled if temperature is not None
+        ])
+        db.session.commit()
+        enriched += len(filled)
+        worker_stats["expired"] += len(rows) - len(filled)
+
+    worker_stats["batches"] += 1
+    worker_stats["enriched"] += enriched
+    worker_stats["last_run"] = datetime.utcnow()
+    return enriched
+
+
+def run_worker(app, db, WellbeingData, WellbeingAggregate, DailyRollup, PendingEnrichment, Quote, WeatherObservation,
+               DailyWeather, poll_interval=ENRICHMENT_POLL_INTERVAL):
+    """Loops forever draining the queue of every shard; sleeps only when there was nothing to do."""
+    while True:
+        enriched = 0
+        for shard in shard_ids():
+            try:
+                with app.app_context(), use_shard(shard):
+                    enriched += process_pending(
+                        db, WellbeingData, WellbeingAggregate, DailyRollup, PendingEnrichment, Quote, WeatherObservation,
+                        DailyWeather
+                    )
+            except Exception as e:
+                print(f"[Enrichment] Worker iteration failed. Error: {e}")
+        if not enriched:
+            time.sleep(poll_interval)
+
+
+def ensure_worker(app, db, WellbeingData, WellbeingAggregate, DailyRollup, PendingEnrichment, Quote, WeatherObservation,
+                  DailyWeather):
+    """Starts the in-process enrichment thread once per worker process."""
+    global _worker, _worker_pid
+    if _worker is not None and _worker_pid == os.getpid() and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is not None and _worker_pid == os.getpid() and _worker.is_alive():
+            return
+        _worker = threading.Thread(
+            target=run_worker,
+            args=(app, db, WellbeingData, WellbeingAggregate, DailyRollup, PendingEnrichment, Quote, WeatherObservation,
+                  DailyWeather),
+            name="enrichment-worker",
+            daemon=True,
+        )
+        _worker_pid = os.getpid()
+        _worker.start()
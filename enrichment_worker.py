@@ -0,0 +1,12 @@
+# enrichment_worker.py
+# Runs the write-behind enrichment loop as a dedicated process instead of a thread in each API worker.
+# Usage: python enrichment_worker.py
+
+from app import (app, db, WellbeingData, WellbeingAggregate, DailyRollup, PendingEnrichment, Quote, WeatherObservation,
+                 DailyWeather)
+from enrichment import run_worker
+
+if __name__ == '__main__':
+    print("--- Starting enrichment worker ---")
+    run_worker(app, db, WellbeingData, WellbeingAggregate, DailyRollup, PendingEnrichment, Quote, WeatherObservation,
+               DailyWeather)
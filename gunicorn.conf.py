@@ -0,0 +1,40 @@
+# gunicorn.conf.py
+# Picked up automatically by `gunicorn app:app` from the project directory.
+# With preloading, the app and its scientific stack are imported once in the master
+# and shared copy-on-write by every forked worker; see startup.py.
+
+from startup import PRELOAD, WARM_UP
+
+preload_app = PRELOAD
+
+
+def when_ready(server):
+    # Master, after the (preloaded) app import and before any worker is forked
+    from metrics import reset_directory
+    reset_directory()  # /metrics sums worker snapshots, so start from none
+    if PRELOAD:
+        from app import app, db
+        if WARM_UP:
+            from startup import warm_up
+            warm_up()
+        # No pooled SQLite connection may cross the fork
+        from shards import dispose_engines
+        with app.app_context():
+            db.engine.dispose()
+        dispose_engines()
+
+
+def post_fork(server, worker):
+    if PRELOAD:
+        from app import app, db
+        from shards import dispose_engines
+        with app.app_context():
+            db.engine.dispose(close=False)
+        dispose_engines(close=False)
+
+
+def post_worker_init(worker):
+    # Without preloading each worker warms itself before accepting requests
+    if WARM_UP and not PRELOAD:
+        from startup import warm_up
+        warm_up()
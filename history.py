@@ -0,0 +1,102 @@
+# history.py
+# Reading raw check-ins back out: keyset-paginated pages and streamed CSV/NDJSON exports.
+
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+
+# --- Configuration ---
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_FETCH_SIZE = 1000    # rows buffered per round-trip while streaming
+EXPORT_FIELDS = ['id', 'timestamp', 'mood_score', 'sleep_hours', 'exercise_minutes',
+                 'city', 'temperature', 'quote_text', 'quote_author']
+# --- End Configuration ---
+
+
+def encode_cursor(timestamp, log_id):
+    """Opaque cursor for the (timestamp, id) position of the last row on a page."""
+    raw = f"{timestamp.isoformat()}|{log_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(); raises ValueError on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, log_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def _select_logs(db, WellbeingData, Quote, WeatherObservation, user_id):
+    # city and the quote live in interned reference tables; the exported fields keep their names
+    referenced = {
+        'city': WeatherObservation.location.label('city'),
+        'quote_text': Quote.text.label('quote_text'),
+        'quote_author': db.func.nullif(Quote.author, '').label('quote_author'),
+    }
+    columns = [referenced[field] if field in referenced else getattr(WellbeingData, field) for field in EXPORT_FIELDS]
+    return (
+        db.select(*columns)
+        .outerjoin(WeatherObservation, WellbeingData.weather_id == WeatherObservation.id)
+        .outerjoin(Quote, WellbeingData.quote_id == Quote.id)
+        .where(WellbeingData.user_id == user_id)
+        .order_by(WellbeingData.timestamp.asc(), WellbeingData.id.asc())
+    )
+
+
+def _row_to_dict(row):
+    record = dict(zip(EXPORT_FIELDS, row))
+    record['timestamp'] = record['timestamp'].isoformat()
+    return record
+
+
+def fetch_page(db, WellbeingData, Quote, WeatherObservation, user_id, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Returns (rows, next_cursor) for one page in (timestamp, id) order.
+    Seeks straight past the cursor position, so deep pages cost the same as the first.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    query = _select_logs(db, WellbeingData, Quote, WeatherObservation, user_id)
+    if after:
+        timestamp, log_id = decode_cursor(after)
+        query = query.where(db.tuple_(WellbeingData.timestamp, WellbeingData.id) > db.tuple_(timestamp, log_id))
+
+    # Fetch one extra row to know whether another page exists
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.timestamp, last.id)
+    return [_row_to_dict(row) for row in rows], next_cursor
+
+
+def iter_export(db, WellbeingData, Quote, WeatherObservation, user_id, fmt='csv'):
+    """
+    Yields the user's full history as CSV or NDJSON text chunks.
+    Rows come off the cursor EXPORT_FETCH_SIZE at a time as plain tuples, so memory
+    stays flat regardless of history length.
+    """
+    result = db.session.execute(
+        _select_logs(db, WellbeingData, Quote, WeatherObservation, user_id).execution_options(yield_per=EXPORT_FETCH_SIZE)
+    )
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        for partition in result.partitions():
+            for row in partition:
+                writer.writerow(_row_to_dict(row).values())
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        for partition in result.partitions():
+            yield ''.join(json.dumps(_row_to_dict(row)) + '\n' for row in partition)
@@ -0,0 +1,145 @@
+# identity.py
+# Request-scoped identity: the caller is resolved once per request (from a signed bearer
+# token) onto flask.g, through a small TTL cache of (id, tier) per username.
+# Usage: WELLBEING_AUTH_SECRET=... python identity.py <username>   (prints a token)
+
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+from flask import g, jsonify, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+import metrics
+
+# --- Configuration ---
+DEFAULT_USERNAME = "test_user"     # used when a request carries no identity
+DEFAULT_TIER = "free"
+AUTH_SECRET = os.environ.get("WELLBEING_AUTH_SECRET")      # signs bearer tokens; unset = none are accepted
+TOKEN_MAX_AGE = 30 * 24 * 60 * 60  # seconds a token stays valid
+# Local development and benchmarks only: take `X-User: <name>` / `Bearer <name>` at their word
+TRUST_IDENTITY_HEADERS = os.environ.get("WELLBEING_TRUST_IDENTITY_HEADERS", "0") == "1"
+IDENTITY_CACHE_TTL = 60            # seconds; bounds how long another worker can see a stale tier
+IDENTITY_CACHE_SIZE = 10000
+PUBLIC_ENDPOINTS = {"health_check", "static", "prometheus_metrics"}
+# --- End Configuration ---
+
+CurrentUser = namedtuple("CurrentUser", ["id", "username", "tier"])
+
+_cache = {}
+_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0}
+
+
+def _serializer():
+    return URLSafeTimedSerializer(AUTH_SECRET, salt="wellbeing-identity")
+
+
+def issue_token(username):
+    """A bearer token for `username`, valid for TOKEN_MAX_AGE."""
+    if not AUTH_SECRET:
+        raise RuntimeError("Set WELLBEING_AUTH_SECRET to issue tokens")
+    return _serializer().dumps(username)
+
+
+def username_from_request(req):
+    """
+    The caller's username from `Authorization: Bearer <token>` (see issue_token), or
+    DEFAULT_USERNAME when the request carries no credentials. Returns None for credentials
+    that do not verify. With TRUST_IDENTITY_HEADERS, `X-User: <name>` and a bearer token
+    that is just a username are accepted as well.
+    """
+    if TRUST_IDENTITY_HEADERS and req.headers.get("X-User"):
+        return req.headers["X-User"]
+    scheme, _, token = req.headers.get("Authorization", "").partition(" ")
+    token = token.strip()
+    if scheme.lower() != "bearer" or not token:
+        return DEFAULT_USERNAME
+    if AUTH_SECRET:
+        try:
+            return _serializer().loads(token, max_age=TOKEN_MAX_AGE)
+        except BadSignature:
+            pass  # includes expired tokens
+    return token if TRUST_IDENTITY_HEADERS else None
+
+
+def lookup_user(db, User, username):
+    """Returns the CurrentUser for `username` (cached for IDENTITY_CACHE_TTL), or None if unknown."""
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(username)
+    if entry is not None and entry[0] > now:
+        stats["hits"] += 1
+        return entry[1]
+
+    stats["misses"] += 1
+    row = db.session.execute(
+        db.select(User.id, User.username, User.tier).filter_by(username=username)
+    ).first()
+    if row is None:
+        return None  # unknown users are not cached, so creating one takes effect immediately
+    user = CurrentUser(*row)
+    with _lock:
+        if len(_cache) >= IDENTITY_CACHE_SIZE:
+            _cache.clear()
+        _cache[username] = (now + IDENTITY_CACHE_TTL, user)
+    return user
+
+
+def invalidate(username=None):
+    """Drops one cached identity, or all of them."""
+    with _lock:
+        if username is None:
+            _cache.clear()
+        else:
+            _cache.pop(username, None)
+
+
+def set_user_tier(db, User, user_id, tier):
+    """Changes a user's tier and drops their cached identity in this process."""
+    user = db.session.get(User, user_id)
+    if user is None:
+        raise ValueError(f"Unknown user id: {user_id}")
+    user.tier = tier
+    db.session.commit()
+    invalidate(user.username)
+    return user
+
+
+def ensure_default_user(db, User, tier=DEFAULT_TIER):
+    """Creates the default user if missing (run at startup, never in the request path)."""
+    user = db.session.execute(db.select(User).filter_by(username=DEFAULT_USERNAME)).scalar_one_or_none()
+    if user is None:
+        user = User(username=DEFAULT_USERNAME, tier=tier)
+        db.session.add(user)
+        db.session.commit()
+        print(f"[Identity] Default '{DEFAULT_USERNAME}' ({tier} tier) created.")
+    return user
+
+
+def init_identity(app, db, User):
+    """Registers the before_request hook that puts the caller on `g.current_user`."""
+
+    @app.before_request
+    def resolve_current_user():
+        if request.endpoint in PUBLIC_ENDPOINTS:
+            return None
+        username = username_from_request(request)
+        if username is None:
+            return jsonify({"status": "error", "message": "Invalid or expired token"}), 401
+        with metrics.timer("identity_lookup_duration_seconds"):
+            user = lookup_user(db, User, username)
+        if user is None:
+            return jsonify({"status": "error", "message": f"Unknown user: {username}"}), 401
+        g.current_user = user
+        return None
+
+
+def current_user():
+    return g.current_user
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        raise SystemExit("Usage: WELLBEING_AUTH_SECRET=... python identity.py <username>")
+    print(issue_token(sys.argv[1]))
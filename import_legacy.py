@@ -0,0 +1,239 @@
+# import_legacy.py
+# Streams legacy CSV logs (both header versions written by api_service.log_wellbeing_data
+# over time) into WellbeingData in fixed-size batched transactions. Memory stays flat
+# whatever the file size, duplicates by (user, timestamp) are skipped, and a byte-offset
+# checkpoint makes interrupted imports resumable.
+# Usage: python import_legacy.py FILE [FILE ...] [--user NAME] [--chunk-rows N] [--timezone TZ]
+
+import argparse
+import codecs
+import csv
+import json
+import os
+import time
+from datetime import datetime, timezone
+from ingest import write_checkins
+
+# --- Configuration ---
+IMPORT_CHUNK_ROWS = 5000
+MAX_REPORTED_SKIPS = 20
+# Known headers, oldest first. v1 (the root wellbeing_log.csv) predates the check-in fields.
+HEADER_VERSIONS = {
+    "v1": ["Timestamp", "City", "Temperature", "Quote", "Author"],
+    "v2": ["Timestamp", "City", "Temperature", "MoodScore", "SleepHours", "ExerciseDone", "ExerciseMinutes", "Quote", "Author"],
+}
+# --- End Configuration ---
+
+TRUE_VALUES = {"true", "1", "yes", "y", "t"}
+FALSE_VALUES = {"false", "0", "no", "n", "f", ""}
+
+
+def detect_version(header):
+    for version, columns in HEADER_VERSIONS.items():
+        if header == columns:
+            return version
+    raise ValueError(f"Unrecognised CSV header: {','.join(header)}")
+
+
+def _optional(value, convert):
+    value = value.strip()
+    return convert(value) if value else None
+
+
+def parse_legacy_row(record, tz=None):
+    """
+    Converts one CSV record (dict by header name) into WellbeingData column values (plus the
+    city and quote, which write_checkins interns into references).
+    Timestamps are local wall-clock times; with `tz` they are converted to naive UTC like
+    the API stores them. Raises ValueError with the skip reason for unusable rows.
+    """
+    if "MoodScore" not in record:
+        raise ValueError("no check-in fields (v1 log)")
+    try:
+        timestamp = datetime.fromisoformat(record["Timestamp"].strip())  # much faster than strptime
+    except ValueError:
+        raise ValueError("bad timestamp")
+    if tz is not None:
+        timestamp = timestamp.replace(tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+
+    exercise_done = record["ExerciseDone"].strip().lower()
+    if exercise_done not in TRUE_VALUES | FALSE_VALUES:
+        raise ValueError("bad ExerciseDone")
+    try:
+        exercise_minutes = _optional(record["ExerciseMinutes"], lambda v: int(float(v)))
+        row = {
+            "timestamp": timestamp,
+            "mood_score": int(record["MoodScore"]),
+            "sleep_hours": float(record["SleepHours"]),
+            "city": record["City"].strip() or None,
+            "temperature": _optional(record["Temperature"], float),
+            "quote_text": record["Quote"] or None,
+            "quote_author": record["Author"] or None,
+        }
+    except (TypeError, ValueError):
+        raise ValueError("bad numeric field")
+    if exercise_minutes is None:
+        if exercise_done in TRUE_VALUES:
+            raise ValueError("ExerciseDone without ExerciseMinutes")
+        exercise_minutes = 0  # older rows left the minutes blank when no exercise was done
+    row["exercise_minutes"] = exercise_minutes
+    return row
+
+
+def iter_records(path, offset=0):
+    """
+    Yields (next_offset, header, record) for every CSV record from byte `offset` on, where
+    next_offset is where the following record starts. Reads line by line, so memory stays
+    constant; quoted fields spanning lines are handled by the csv reader.
+    """
+    with open(path, "rb") as f:
+        header_line = f.readline()
+        header = next(csv.reader([header_line.decode("utf-8-sig")]))
+        position = max(offset, len(header_line))
+        f.seek(position)
+        decoder = codecs.getincrementaldecoder("utf-8")()
+
+        def lines():
+            nonlocal position
+            for raw in f:
+                position += len(raw)
+                yield decoder.decode(raw)
+
+        for values in csv.reader(lines()):
+            if values:
+                yield position, header, dict(zip(header, values))
+
+
+def existing_timestamps(db, WellbeingData, user_id, rows):
+    """Timestamps of `rows` already stored for the user, found with one indexed range query."""
+    if not rows:
+        return set()
+    first = min(row["timestamp"] for row in rows)
+    last = max(row["timestamp"] for row in rows)
+    return set(db.session.execute(
+        db.select(WellbeingData.timestamp)
+        .where(WellbeingData.user_id == user_id, WellbeingData.timestamp.between(first, last))
+    ).scalars())
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_checkpoint(path, state):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(temp_path, path)  # never leave a half-written checkpoint
+
+
+def import_file(db, WellbeingData, WellbeingAggregate, DailyRollup, Quote, WeatherObservation, user_id, path,
+                chunk_rows=IMPORT_CHUNK_ROWS, checkpoint_path=None, tz=None):
+    """
+    Imports one CSV file for `user_id`. Each chunk is one transaction, and the checkpoint
+    records the byte offset after it, so a rerun continues where the last commit ended
+    (the duplicate check makes the overlap after a crash harmless). Returns a summary dict.
+    """
+    checkpoint_path = checkpoint_path or f"{path}.import-checkpoint.json"
+    state = load_checkpoint(checkpoint_path)
+    size = os.path.getsize(path)
+    if state.get("user_id") != user_id or state.get("offset", 0) > size:
+        state = {}  # different user, or the file was replaced by a shorter one
+    state = {"user_id": user_id, "offset": state.get("offset", 0), "inserted": state.get("inserted", 0),
+             "duplicates": state.get("duplicates", 0), "skipped": state.get("skipped", {})}
+    resumed_from = state["offset"]
+    started = time.perf_counter()
+    reported = 0
+    version = None
+    chunk, seen = [], set()
+
+    def flush(offset):
+        existing = existing_timestamps(db, WellbeingData, user_id, chunk)
+        rows = [row for row in chunk if row["timestamp"] not in existing]
+        state["duplicates"] += len(chunk) - len(rows)
+        if rows:
+            for row in rows:
+                row["user_id"] = user_id
+            write_checkins(db, WellbeingData, WellbeingAggregate, DailyRollup, Quote, WeatherObservation, user_id, rows)
+        state["inserted"] += len(rows)
+        state["offset"] = offset
+        save_checkpoint(checkpoint_path, state)
+        chunk.clear()
+        seen.clear()
+
+    offset = resumed_from
+    for offset, header, record in iter_records(path, resumed_from):
+        if version is None:
+            version = detect_version(header)
+            print(f"[Import] {path}: {version} header, {size} bytes, starting at byte {resumed_from}")
+        try:
+            row = parse_legacy_row(record, tz)
+        except ValueError as e:
+            reason = str(e)
+            state["skipped"][reason] = state["skipped"].get(reason, 0) + 1
+            if reported < MAX_REPORTED_SKIPS:
+                print(f"[Import] Skipped row ending at byte {offset}: {reason}")
+                reported += 1
+            continue
+        if row["timestamp"] in seen:
+            state["duplicates"] += 1
+            continue
+        seen.add(row["timestamp"])
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            flush(offset)
+            rate = state["inserted"] / max(time.perf_counter() - started, 1e-9)
+            print(f"[Import] {offset}/{size} bytes, {state['inserted']} rows inserted ({rate:.0f} rows/s)")
+
+    flush(offset)
+    return {
+        "file": path,
+        "header": version,
+        "resumed_from": resumed_from,
+        "inserted": state["inserted"],
+        "duplicates": state["duplicates"],
+        "skipped": state["skipped"],
+        "seconds": round(time.perf_counter() - started, 2),
+        "checkpoint": checkpoint_path,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import legacy wellbeing CSV logs into the database.")
+    parser.add_argument("files", nargs="+", help="CSV files to import")
+    parser.add_argument("--user", help="username to import as (default: the default user)")
+    parser.add_argument("--chunk-rows", type=int, default=IMPORT_CHUNK_ROWS, help="rows per transaction")
+    parser.add_argument("--timezone", help="zone the CSV timestamps were written in, e.g. Europe/London (default: store as-is)")
+    parser.add_argument("--restart", action="store_true", help="ignore existing checkpoints and start from the top")
+    args = parser.parse_args()
+
+    from app import app, db, User, WellbeingData, WellbeingAggregate, DailyRollup, Quote, WeatherObservation
+    from identity import DEFAULT_USERNAME
+    from migrations import migrate
+    from shards import user_shard
+
+    tz = None
+    if args.timezone:
+        from zoneinfo import ZoneInfo
+        tz = ZoneInfo(args.timezone)
+
+    with app.app_context():
+        migrate(db.engine)
+        username = args.user or DEFAULT_USERNAME
+        user = db.session.execute(db.select(User).filter_by(username=username)).scalar_one_or_none()
+        if user is None:
+            raise SystemExit(f"[Import] Unknown user '{username}'; create it first (see init_db.py).")
+        user_id = user.id
+
+        for path in args.files:
+            checkpoint_path = f"{path}.import-checkpoint.json"
+            if args.restart and os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+            with user_shard(db, user_id):
+                summary = import_file(db, WellbeingData, WellbeingAggregate, DailyRollup, Quote, WeatherObservation, user_id, path,
+                                      chunk_rows=args.chunk_rows, checkpoint_path=checkpoint_path, tz=tz)
+            print(json.dumps(summary, indent=2))
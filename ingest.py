@@ -0,0 +1,168 @@
+# ingest.py
+# Bulk check-in ingestion: validation, per-bucket enrichment and chunked executemany inserts.
+
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from api_service import fetch_enrichment
+from aggregates import add_checkin, bump_data_version, get_or_create_aggregate, init_moments, merge_moments
+from enrichment import time_bucket
+from reference_data import attach_references
+from rollups import add_checkins_to_rollups
+
+# --- Configuration ---
+REQUIRED_FIELDS = ['mood', 'sleep_hours', 'exercise_done', 'exercise_minutes']
+MOOD_SCORES = range(1, 6)
+BATCH_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+DEFAULT_CITY = "Waltham Forest"
+# --- End Configuration ---
+
+
+def parse_timestamp(value):
+    """Parses an ISO-8601 timestamp into a naive UTC datetime."""
+    timestamp = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def parse_checkin(data, now=None):
+    """
+    Validates one check-in payload against REQUIRED_FIELDS and converts its types.
+    Raises ValueError with a client-facing message if the row is unusable.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Row must be a JSON object")
+    missing = [field for field in REQUIRED_FIELDS if field not in data]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    try:
+        row = {
+            'mood_score': int(data['mood']),
+            'sleep_hours': float(data['sleep_hours']),
+            'exercise_minutes': int(data['exercise_minutes']),
+        }
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid value: {e}")
+    if 'timestamp' in data and data['timestamp'] is not None:
+        try:
+            row['timestamp'] = parse_timestamp(data['timestamp'])
+        except ValueError:
+            raise ValueError(f"Invalid timestamp: {data['timestamp']!r}")
+    else:
+        row['timestamp'] = now or datetime.utcnow()
+    return row
+
+
+def iter_request_rows(request):
+    """
+    Yields decoded rows from a JSON array body or a streamed NDJSON body.
+    Undecodable NDJSON lines are yielded as ValueError instances so they can be reported per row.
+    """
+    if 'ndjson' in (request.mimetype or '') or 'jsonlines' in (request.mimetype or ''):
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield ValueError(f"Invalid JSON: {e}")
+        return
+
+    data = request.get_json()
+    if not isinstance(data, list):
+        raise ValueError("Body must be a JSON array of check-ins (or NDJSON)")
+    yield from data
+
+
+def enrichment_for_bucket(bucket, city, current_bucket):
+    """
+    Returns (temperature, quote_text, quote_author) for a timestamp bucket.
+    Only the current bucket can be enriched from the live APIs; historical rows stay NULL
+    rather than being stamped with today's weather.
+    """
+    if bucket != current_bucket:
+        return None, None, None
+    quote_result, weather_result = fetch_enrichment(city)
+    if not quote_result or not weather_result:
+        return None, None, None
+    return weather_result['temp'], quote_result['quote'], quote_result['author']
+
+
+def write_checkins(db, WellbeingData, WellbeingAggregate, DailyRollup, Quote, WeatherObservation, user_id, rows):
+    """
+    Inserts fully-populated WellbeingData rows (dicts of column values, with city/quote_text/
+    quote_author interned into references) for one user with one executemany, folds them into
+    the user's aggregate and daily rollups, and commits.
+    """
+    moments = init_moments(SimpleNamespace())
+    for row in rows:
+        add_checkin(moments, row['mood_score'], row['sleep_hours'], row['exercise_minutes'], row['temperature'])
+
+    attach_references(db, Quote, WeatherObservation, rows)
+    db.session.execute(WellbeingData.__table__.insert(), rows)
+    aggregate = get_or_create_aggregate(db, WellbeingAggregate, user_id)
+    merge_moments(aggregate, moments)
+    bump_data_version(aggregate)
+    add_checkins_to_rollups(db, DailyRollup, user_id, [
+        (row['timestamp'], row['mood_score'], row['sleep_hours'], row['exercise_minutes'], row['temperature'])
+        for row in rows
+    ])
+    db.session.commit()
+
+
+def _flush_chunk(db, WellbeingData, WellbeingAggregate, DailyRollup, Quote, WeatherObservation, user_id, chunk, enrichments, current_bucket, city):
+    # Resolve one enrichment per bucket present in the chunk (cached across chunks)
+    for row in chunk:
+        bucket = time_bucket(row['timestamp'])
+        if bucket not in enrichments:
+            enrichments[bucket] = enrichment_for_bucket(bucket, city, current_bucket)
+        temperature, quote_text, quote_author = enrichments[bucket]
+        row.update(
+            user_id=user_id,
+            city=city if temperature is not None else None,  # no observation for an hour nobody looked up
+            temperature=temperature,
+            quote_text=quote_text,
+            quote_author=quote_author,
+        )
+    write_checkins(db, WellbeingData, WellbeingAggregate, DailyRollup, Quote, WeatherObservation, user_id, chunk)
+
+
+def insert_checkins(db, WellbeingData, WellbeingAggregate, DailyRollup, Quote, WeatherObservation, user_id, rows,
+                    chunk_size=BATCH_CHUNK_SIZE, city=DEFAULT_CITY):
+    """
+    Validates and inserts an iterable of raw check-in payloads for one user.
+    Rows are written in chunked executemany transactions, each also folding the chunk
+    into the user's running aggregates and daily rollups. Returns (inserted, error_count, errors).
+    """
+    now = datetime.utcnow()
+    current_bucket = time_bucket(now)
+    enrichments = {}
+    inserted = 0
+    error_count = 0
+    errors = []
+    chunk = []
+
+    for index, raw in enumerate(rows):
+        try:
+            if isinstance(raw, Exception):
+                raise raw
+            chunk.append(parse_checkin(raw, now=now))
+        except ValueError as e:
+            error_count += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"row": index, "message": str(e)})
+            continue
+
+        if len(chunk) >= chunk_size:
+            _flush_chunk(db, WellbeingData, WellbeingAggregate, DailyRollup, Quote, WeatherObservation, user_id, chunk, enrichments, current_bucket, city)
+            inserted += len(chunk)
+            chunk = []
+
+    if chunk:
+        _flush_chunk(db, WellbeingData, WellbeingAggregate, DailyRollup, Quote, WeatherObservation, user_id, chunk, enrichments, current_bucket, city)
+        inserted += len(chunk)
+
+    return inserted, error_count, errors
@@ -1,9 +1,12 @@
 # In main.py
 
 # Removed old CSV-related imports as they are now handled by the database
+import json
 import os
-import statistics
-from scipy.stats import pearsonr
+from aggregates import aggregate_stats
+from analysis_engine import FACTOR_KEYS, compute_stats
+from rollups import window_analysis
+from series_cache import get_series
 
 # --- ANALYSIS HELPERS (Keep these functions unchanged) ---
 
@@ -29,37 +32,60 @@ def get_correlation_feedback(r_value, factor_name):
         return f"A **{strength}** correlation (r={r_value:.3f}). Mood tends to change **{sign}** with {factor_name.lower()}."
 
 
+# Label used in the feedback text and the message shown when a factor has no variation yet.
+# Metrics added to analysis_engine.METRICS without an entry here get a generic wording.
+FACTOR_FEEDBACK = {
+    'temperature': ("Temperature", "Not enough data variation yet to calculate."),
+    'sleep': ("Sleep Hours", "Not enough sleep data variation yet to calculate."),
+    'exercise': ("Exercise Minutes", "Not enough exercise data variation yet to calculate."),
+    'day_temperature': ("Daily Mean Temperature", "Not enough daily weather history yet to calculate."),
+}
+
+
+def get_user_stats(user_id, db, WellbeingData, WellbeingAggregate, AnalysisReport=None):
+    """
+    Returns the stats dict for a user from the cheapest up-to-date source:
+    a precomputed report (cohort_job.py), then the running aggregate, then the raw rows.
+    """
+    agg = db.session.get(WellbeingAggregate, user_id)
+
+    # A precomputed report is only served while no check-in was added or changed since:
+    # enrichment and rebuilds rewrite rows without changing the count, but bump the version
+    if AnalysisReport is not None and agg is not None:
+        precomputed = db.session.get(AnalysisReport, user_id)
+        if precomputed is not None and precomputed.data_version == agg.data_version:
+            return json.loads(precomputed.stats)
+
+    stats = aggregate_stats(agg) if agg is not None else None
+
+    # Metrics the aggregate table does not track (yet) are answered by the engine
+    if stats is None or not set(FACTOR_KEYS) <= stats['correlations'].keys():
+        _, values = get_series(db, WellbeingData, WellbeingAggregate, user_id)
+        stats = compute_stats(values)
+    return stats
+
+
 # --- MODIFIED ANALYSIS FUNCTION ---
-# NOTE: Function now accepts db, WellbeingData, and user_id from app.py
-def analyze_wellbeing_log(current_mood, user_tier, user_id, db, WellbeingData):
+# NOTE: Function now accepts db, the models and user_id from app.py
+def analyze_wellbeing_log(current_mood, user_tier, user_id, db, WellbeingData, WellbeingAggregate, AnalysisReport=None,
+                          day_weather=None):
     """
-    MODIFIED: Reads the log file from the database for a specific user, 
-    calculates stats, and returns a dictionary for the API.
+    MODIFIED: Builds the report from precomputed or incrementally maintained stats,
+    falling back to the vectorized engine over the raw rows (see get_user_stats).
+    `day_weather` is weather_history.day_weather_stats() for the user, if available.
     """
-    # 💡 DATA LOADING LOGIC IS NOW A DATABASE QUERY
-    logs = db.session.execute(
-        db.select(WellbeingData).filter_by(user_id=user_id)
-        .order_by(WellbeingData.timestamp.asc())
-    ).scalars().all()
-    
-    # Extract data points from the list of database objects
-    temperatures = [log.temperature for log in logs if log.temperature is not None]
-    moods = [log.mood_score for log in logs]
-    sleep_hours = [log.sleep_hours for log in logs]
-    exercise_minutes = [log.exercise_minutes for log in logs]
+    stats = get_user_stats(user_id, db, WellbeingData, WellbeingAggregate, AnalysisReport)
 
-    data_entries = len(moods)
+    data_entries = stats['entries']
 
     if data_entries < 3:
         return {"error": f"Only {data_entries} entries logged. Need a minimum of 3 for analysis."}
 
     # Calculations
-    avg_mood = sum(moods) / data_entries
+    avg_mood = stats['mean']['mood']
     today_mood_desc = get_mood_description(current_mood)
-    
-    # Ensure statistics.stdev can be calculated (requires 2+ entries)
-    temp_stdev = statistics.stdev(temperatures) if len(temperatures) > 1 else 0.0
-    avg_temp = sum(temperatures) / len(temperatures) if temperatures else 0.0
+    temp_stdev = stats['stdev']['temperature']
+    avg_temp = stats['mean']['temperature']
     
     # --- Analysis Data Structure (Dictionary) ---
     report = {}
@@ -89,28 +115,50 @@ def analyze_wellbeing_log(current_mood, user_tier, user_id, db, WellbeingData):
     report['correlations'] = {}
     
     if user_tier == 'premium':
-        # Correlation 1: Mood vs. Temperature
-        if len(set(temperatures)) > 1 and len(set(moods)) > 1:
-            r_temp, _ = pearsonr(temperatures, moods)
-            report['correlations']['temperature'] = get_correlation_feedback(r_temp, "Temperature")
-        else:
-            report['correlations']['temperature'] = "Not enough data variation yet to calculate."
-
-        # Correlation 2: Mood vs. Sleep Hours
-        if len(sleep_hours) >= 3 and len(set(sleep_hours)) > 1 and len(set(moods[-len(sleep_hours):])) > 1:
-            r_sleep, _ = pearsonr(sleep_hours, moods[-len(sleep_hours):]) 
-            report['correlations']['sleep'] = get_correlation_feedback(r_sleep, "Sleep Hours")
-        else:
-            report['correlations']['sleep'] = "Not enough sleep data variation yet to calculate."
-            
-        # Correlation 3: Mood vs. Exercise Minutes
-        if len(exercise_minutes) >= 3 and len(set(exercise_minutes)) > 1 and len(set(moods[-len(exercise_minutes):])) > 1:
-            r_exercise, _ = pearsonr(exercise_minutes, moods[-len(exercise_minutes):]) 
-            report['correlations']['exercise'] = get_correlation_feedback(r_exercise, "Exercise Minutes")
-        else:
-            report['correlations']['exercise'] = "Not enough exercise data variation yet to calculate."
+        # One mood-vs-factor correlation per metric in analysis_engine.METRICS
+        for factor in FACTOR_KEYS:
+            label, no_variation_message = FACTOR_FEEDBACK.get(
+                factor, (factor.replace('_', ' ').title(), f"Not enough {factor} data variation yet to calculate.")
+            )
+            r_value = stats['correlations'][factor]
+            if r_value is not None:
+                report['correlations'][factor] = get_correlation_feedback(r_value, label)
+            else:
+                report['correlations'][factor] = no_variation_message
+
+        # The weather of the whole day, not just the reading taken at check-in time
+        if day_weather is not None:
+            label, no_history_message = FACTOR_FEEDBACK['day_temperature']
+            r_value = day_weather['correlations']['day_mean_temp']
+            if r_value is not None:
+                report['correlations']['day_temperature'] = get_correlation_feedback(r_value, label)
+            else:
+                report['correlations']['day_temperature'] = no_history_message
 
     else:
         report['correlations']['gating_message'] = "Upgrade to Premium to unlock personalized insights!"
         
     return report
+
+
+def get_latest_mood(user_id, db, WellbeingData, default=4):
+    """Mood score of the user's most recent check-in (one index seek), or `default` if none."""
+    mood = db.session.execute(
+        db.select(WellbeingData.mood_score).filter_by(user_id=user_id)
+        .order_by(WellbeingData.timestamp.desc(), WellbeingData.id.desc()).limit(1)
+    ).scalar()
+    return default if mood is None else mood
+
+
+def analyze_windows(user_tier, user_id, db, DailyRollup, windows, bucket='day'):
+    """
+    Rolling-window stats and a trend series from the daily rollups (see rollups.window_analysis).
+    Correlations are gated to the premium tier like the all-time report.
+    """
+    result = window_analysis(db, DailyRollup, user_id, windows=windows, bucket=bucket)
+    if user_tier != 'premium':
+        for stats in result['windows'].values():
+            stats['correlations'] = {'gating_message': "Upgrade to Premium to unlock personalized insights!"}
+        for point in result['trend']['points']:
+            point['rolling'].pop('correlations')
+    return result
@@ -0,0 +1,359 @@
+# metrics.py
+# Hot-path instrumentation exposed in the Prometheus text format on /metrics.
+# Every process records into its own registry and writes a snapshot to
+# METRICS_DIR/<pid>-<start>.json at most once per METRICS_FLUSH_INTERVAL; a scrape merges
+# all the snapshots, so the totals cover every gunicorn worker whichever one answers.
+# Opt-in (WELLBEING_PROFILE_SLOW_MS): a sampling profiler that writes folded stacks,
+# ready for flamegraph.pl or speedscope, for requests slower than the threshold.
+
+import atexit
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# --- Configuration ---
+METRICS_ENABLED = os.environ.get("WELLBEING_METRICS", "1") == "1"
+METRICS_DIR = os.environ.get("WELLBEING_METRICS_DIR", os.path.join("data_logs", "metrics"))
+METRICS_FLUSH_INTERVAL = 1.0        # seconds between snapshot writes per process
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILE_SLOW_MS = float(os.environ.get("WELLBEING_PROFILE_SLOW_MS", "0"))   # 0 = profiler off
+PROFILE_INTERVAL = 0.005            # seconds between stack samples
+PROFILE_DIR = os.path.join(METRICS_DIR, "profiles")
+PROFILE_MAX_FILES = 200
+# --- End Configuration ---
+
+# name -> (type, help)
+DEFINITIONS = {
+    "http_request_duration_seconds": ("histogram", "Request latency by endpoint, method and status."),
+    "identity_lookup_duration_seconds": ("histogram", "Time spent resolving the caller before each request."),
+    "upstream_request_duration_seconds": ("histogram", "Upstream API call latency (retries included) by upstream."),
+    "upstream_requests_total": ("counter", "Upstream API calls by upstream and outcome (ok, error, timeout, short_circuit)."),
+    "circuit_breaker_transitions_total": ("counter", "Circuit breaker state changes by upstream and new state."),
+    "enrichment_budget_exceeded_total": ("counter", "Enrichment calls cut off by the request latency budget, by upstream."),
+    "enrichment_shed_total": ("counter", "Enrichment calls not started because the upstream executor was full, by upstream."),
+    "db_query_duration_seconds": ("histogram", "SQL statement execution time by statement type."),
+    "db_commit_duration_seconds": ("histogram", "Session commit time (flush and COMMIT)."),
+    "analysis_compute_duration_seconds": ("histogram", "Analysis report computation on cache misses, by tier."),
+    "cache_events_total": ("counter", "Cache events (hits, misses, ...) by cache."),
+    "cache_hit_ratio": ("gauge", "Hits over hits plus misses, by cache, across all workers."),
+    "slow_request_profiles_total": ("counter", "Slow-request stack profiles written, by endpoint."),
+}
+# Cache events counted as hits and as misses for cache_hit_ratio
+HIT_EVENTS = ("hits", "stale_hits", "not_modified")
+MISS_EVENTS = ("misses", "renders")
+
+_lock = threading.Lock()
+_values = {}            # (name, labels) -> float, or a histogram list: bucket counts, count, sum
+_stat_sources = {}      # cache name -> live stats dict of that module
+_process = {"token": None, "flushed_at": 0.0}
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _values[key] = _values.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        histogram = _values.get(key)
+        if histogram is None:
+            histogram = _values[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+                break
+        histogram[-2] += 1
+        histogram[-1] += seconds
+
+
+@contextmanager
+def timer(name, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def register_stats(cache, stats):
+    """Exports a module's cumulative stats dict (e.g. report_cache.stats) as cache_events_total."""
+    _stat_sources[cache] = stats
+
+
+def _reset_after_fork():
+    # A forked worker starts from zero; the parent's numbers stay in the parent's file
+    global _lock
+    _lock = threading.Lock()
+    _values.clear()
+    _process.update(token=None, flushed_at=0.0)
+    for stats in _stat_sources.values():
+        for event in stats:
+            stats[event] = 0
+    _profiler["sampler"] = None
+
+
+# --- Per-process snapshots and the merged view ---
+
+def _snapshot_path():
+    if _process["token"] is None:
+        _process["token"] = f"{os.getpid()}-{time.time_ns()}"
+    return os.path.join(METRICS_DIR, f"{_process['token']}.json")
+
+
+def snapshot():
+    """This process's samples as [name, labels, value] lists."""
+    with _lock:
+        samples = [[name, list(labels), value if isinstance(value, (int, float)) else list(value)]
+                   for (name, labels), value in _values.items()]
+    for cache, stats in _stat_sources.items():
+        for event, value in list(stats.items()):
+            samples.append(["cache_events_total", [["cache", cache], ["event", event]], value])
+    return samples
+
+
+def flush(force=False):
+    """Writes this process's snapshot, at most once per METRICS_FLUSH_INTERVAL unless forced."""
+    now = time.monotonic()
+    if not force and now - _process["flushed_at"] < METRICS_FLUSH_INTERVAL:
+        return
+    _process["flushed_at"] = now
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = _snapshot_path()
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"pid": os.getpid(), "samples": snapshot()}, f)
+        os.replace(temp_path, path)  # a scrape never reads half a file
+    except OSError as e:
+        print(f"[Metrics] Could not write snapshot. Error: {e}")
+
+
+def reset_directory():
+    """Drops every snapshot (run once at server start, before workers exist)."""
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def collect():
+    """Sums the samples of every process snapshot (exited workers included, so counters never go back)."""
+    flush(force=True)
+    merged = {}
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        try:
+            with open(path) as f:
+                samples = json.load(f)["samples"]
+        except (OSError, ValueError, KeyError):
+            continue
+        for name, labels, value in samples:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            if isinstance(value, list):
+                total = merged.setdefault(key, [0] * len(value))
+                merged[key] = [a + b for a, b in zip(total, value)]
+            else:
+                merged[key] = merged.get(key, 0) + value
+
+    events = {}
+    for (name, labels), value in merged.items():
+        if name == "cache_events_total":
+            labels = dict(labels)
+            events.setdefault(labels["cache"], Counter())[labels["event"]] += value
+    for cache, counts in events.items():
+        hits = sum(counts[event] for event in HIT_EVENTS)
+        lookups = hits + sum(counts[event] for event in MISS_EVENTS)
+        if lookups:
+            merged[("cache_hit_ratio", (("cache", cache),))] = hits / lookups
+    return merged
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for key, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def render(merged=None):
+    """The merged samples in the Prometheus text exposition format (version 0.0.4)."""
+    merged = collect() if merged is None else merged
+    by_name = {}
+    for (name, labels), value in merged.items():
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, help_text = DEFINITIONS.get(name, ("untyped", ""))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(by_name[name]):
+            if kind != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, value):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {value[-2]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {value[-1]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value[-2]}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Slow-request sampling profiler ---
+
+_profiler = {"sampler": None, "active": {}, "lock": threading.Lock()}
+
+
+def _fold(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+def _sample_forever():
+    me = threading.get_ident()
+    while True:
+        time.sleep(PROFILE_INTERVAL)
+        with _profiler["lock"]:
+            if not _profiler["active"]:
+                continue
+            frames = sys._current_frames()
+            for ident, stacks in _profiler["active"].items():
+                frame = frames.get(ident)
+                if frame is not None and ident != me:
+                    stacks[_fold(frame)] += 1
+
+
+def profile_start():
+    """Starts sampling the calling thread (a no-op unless WELLBEING_PROFILE_SLOW_MS is set)."""
+    if PROFILE_SLOW_MS <= 0:
+        return
+    if _profiler["sampler"] is None:
+        with _profiler["lock"]:
+            if _profiler["sampler"] is None:
+                _profiler["sampler"] = threading.Thread(target=_sample_forever, name="metrics-profiler", daemon=True)
+                _profiler["sampler"].start()
+    with _profiler["lock"]:
+        _profiler["active"][threading.get_ident()] = Counter()
+
+
+def profile_stop(endpoint, elapsed):
+    """Stops sampling the calling thread and writes its folded stacks if the request was slow."""
+    if PROFILE_SLOW_MS <= 0:
+        return None
+    with _profiler["lock"]:
+        stacks = _profiler["active"].pop(threading.get_ident(), None)
+    if not stacks or elapsed * 1000 < PROFILE_SLOW_MS:
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    path = os.path.join(PROFILE_DIR, f"{stamp}-{endpoint}-{os.getpid()}-{elapsed * 1000:.0f}ms.folded")
+    with open(path, "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    inc("slow_request_profiles_total", endpoint=endpoint)
+    _prune_profiles()
+    return path
+
+
+def _prune_profiles():
+    entries = sorted(glob.glob(os.path.join(PROFILE_DIR, "*.folded")))
+    for path in entries[:max(len(entries) - PROFILE_MAX_FILES, 0)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# --- Flask and SQLAlchemy hooks ---
+
+def statement_kind(statement):
+    word = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ""
+    return word if word in ("select", "insert", "update", "delete", "pragma") else "other"
+
+
+def instrument_engine(engine):
+    """Times every statement the engine executes, by statement type."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_started"].pop()
+        observe("db_query_duration_seconds", time.perf_counter() - started, statement=statement_kind(statement))
+
+
+def instrument_sessions():
+    """Times session commits (the flush plus the COMMIT itself)."""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    @event.listens_for(Session, "before_commit")
+    def _before_commit(session):
+        session.info["metrics_commit_started"] = time.perf_counter()
+
+    @event.listens_for(Session, "after_commit")
+    def _after_commit(session):
+        started = session.info.pop("metrics_commit_started", None)
+        if started is not None:
+            observe("db_commit_duration_seconds", time.perf_counter() - started)
+
+
+def init_metrics(app, db):
+    """Registers the request timing hooks and the database event hooks (unless WELLBEING_METRICS=0)."""
+    if not METRICS_ENABLED:
+        return
+    from flask import g, request
+
+    with app.app_context():
+        instrument_engine(db.engine)
+    instrument_sessions()
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        profile_start()
+
+    @app.after_request
+    def record_request(response):
+        started = g.get("metrics_started")
+        if started is not None:
+            observe("http_request_duration_seconds", time.perf_counter() - started,
+                    endpoint=request.endpoint or "unmatched", method=request.method, status=response.status_code)
+        flush()
+        return response
+
+    @app.teardown_request
+    def stop_profiler(error):
+        # Runs after an unhandled exception too, which skips after_request
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            profile_stop(request.endpoint or "unmatched", time.perf_counter() - started)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(lambda: _values and flush(force=True))
@@ -0,0 +1,427 @@
+# migrations.py
+# Versioned schema migrations for the SQLite database, replacing ad hoc db.create_all().
+# The applied version is stored in SQLite's own PRAGMA user_version.
+# Each step is frozen SQL, so it keeps producing the same schema after the models change.
+# Usage: python migrations.py
+
+# 1: Tables that existed before migrations were introduced (IF NOT EXISTS adopts old databases)
+BASELINE = [
+    """
+    CREATE TABLE IF NOT EXISTS user (
+        id INTEGER NOT NULL,
+        username VARCHAR(80) NOT NULL,
+        tier VARCHAR(10) NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (username)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS wellbeing_data (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        timestamp DATETIME NOT NULL,
+        mood_score INTEGER NOT NULL,
+        sleep_hours FLOAT NOT NULL,
+        exercise_minutes INTEGER NOT NULL,
+        city VARCHAR(50),
+        temperature FLOAT,
+        quote_text VARCHAR(500),
+        quote_author VARCHAR(100),
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES user (id)
+    )
+    """,
+]
+
+# 2: Per-user running aggregates (aggregates.py)
+AGGREGATES = [
+    """
+    CREATE TABLE IF NOT EXISTS wellbeing_aggregate (
+        user_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        mood_mean FLOAT NOT NULL,
+        mood_m2 FLOAT NOT NULL,
+        sleep_mean FLOAT NOT NULL,
+        sleep_m2 FLOAT NOT NULL,
+        exercise_mean FLOAT NOT NULL,
+        exercise_m2 FLOAT NOT NULL,
+        mood_sleep_cm FLOAT NOT NULL,
+        mood_exercise_cm FLOAT NOT NULL,
+        temp_count INTEGER NOT NULL,
+        temp_mean FLOAT NOT NULL,
+        temp_m2 FLOAT NOT NULL,
+        temp_mood_mean FLOAT NOT NULL,
+        temp_mood_m2 FLOAT NOT NULL,
+        mood_temp_cm FLOAT NOT NULL,
+        PRIMARY KEY (user_id),
+        FOREIGN KEY(user_id) REFERENCES user (id)
+    )
+    """,
+]
+
+# 3: Write-behind enrichment queue (enrichment.py)
+PENDING_ENRICHMENT = [
+    """
+    CREATE TABLE IF NOT EXISTS pending_enrichment (
+        id INTEGER NOT NULL,
+        log_id INTEGER NOT NULL,
+        bucket DATETIME NOT NULL,
+        enqueued_at DATETIME NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (log_id),
+        FOREIGN KEY(log_id) REFERENCES wellbeing_data (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_pending_enrichment_bucket ON pending_enrichment (bucket)",
+    "CREATE INDEX IF NOT EXISTS ix_pending_enrichment_enqueued_at ON pending_enrichment (enqueued_at)",
+]
+
+# 4: Every per-user query filters on user_id and orders by timestamp (the rowid id is implicitly appended)
+USER_TIMESTAMP_INDEX = [
+    "CREATE INDEX IF NOT EXISTS ix_wellbeing_data_user_timestamp ON wellbeing_data (user_id, timestamp)",
+    "ANALYZE wellbeing_data",
+]
+
+# 5: Precomputed per-user and cohort reports written by cohort_job.py
+REPORTS = [
+    """
+    CREATE TABLE IF NOT EXISTS analysis_report (
+        user_id INTEGER NOT NULL,
+        entries INTEGER NOT NULL,
+        stats TEXT NOT NULL,
+        computed_at DATETIME NOT NULL,
+        PRIMARY KEY (user_id),
+        FOREIGN KEY(user_id) REFERENCES user (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cohort_report (
+        id INTEGER NOT NULL,
+        users INTEGER NOT NULL,
+        entries INTEGER NOT NULL,
+        stats TEXT NOT NULL,
+        computed_at DATETIME NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+]
+
+# 6: Per-user daily sums for rolling-window analysis (rollups.py), backfilled from existing rows
+DAILY_ROLLUPS = [
+    """
+    CREATE TABLE IF NOT EXISTS daily_rollup (
+        user_id INTEGER NOT NULL,
+        day DATE NOT NULL,
+        count INTEGER NOT NULL,
+        mood_sum FLOAT NOT NULL,
+        mood_sq FLOAT NOT NULL,
+        sleep_sum FLOAT NOT NULL,
+        sleep_sq FLOAT NOT NULL,
+        exercise_sum FLOAT NOT NULL,
+        exercise_sq FLOAT NOT NULL,
+        mood_sleep_sum FLOAT NOT NULL,
+        mood_exercise_sum FLOAT NOT NULL,
+        temp_count INTEGER NOT NULL,
+        temp_sum FLOAT NOT NULL,
+        temp_sq FLOAT NOT NULL,
+        temp_mood_sum FLOAT NOT NULL,
+        temp_mood_sq FLOAT NOT NULL,
+        mood_temp_sum FLOAT NOT NULL,
+        PRIMARY KEY (user_id, day),
+        FOREIGN KEY(user_id) REFERENCES user (id)
+    )
+    """,
+    """
+    INSERT OR IGNORE INTO daily_rollup
+    SELECT user_id, date(timestamp),
+        COUNT(*),
+        SUM(mood_score), SUM(mood_score * mood_score),
+        SUM(sleep_hours), SUM(sleep_hours * sleep_hours),
+        SUM(exercise_minutes), SUM(exercise_minutes * exercise_minutes),
+        SUM(mood_score * sleep_hours), SUM(mood_score * exercise_minutes),
+        SUM(temperature IS NOT NULL), TOTAL(temperature), TOTAL(temperature * temperature),
+        SUM(CASE WHEN temperature IS NOT NULL THEN mood_score ELSE 0 END),
+        SUM(CASE WHEN temperature IS NOT NULL THEN mood_score * mood_score ELSE 0 END),
+        TOTAL(mood_score * temperature)
+    FROM wellbeing_data
+    GROUP BY user_id, date(timestamp)
+    """,
+]
+
+# 7: Per-user data version for response caching (report_cache.py), bumped on every write
+DATA_VERSION = [
+    "ALTER TABLE wellbeing_aggregate ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE wellbeing_aggregate ADD COLUMN updated_at DATETIME",
+    "UPDATE wellbeing_aggregate SET data_version = 1, updated_at = CURRENT_TIMESTAMP",
+]
+
+# 8: Quotes and hourly weather observations interned in their own tables (reference_data.py).
+# Check-ins reference them by id; the repeated strings are dropped from wellbeing_data.
+# The numeric temperature stays on the check-in so analysis reads never need a join.
+HOUR_SQL = "strftime('%Y-%m-%d %H:00:00.000000', wellbeing_data.timestamp)"  # SQLAlchemy's DateTime text format
+NORMALISED_REFERENCES = [
+    """
+    CREATE TABLE IF NOT EXISTS quote (
+        id INTEGER NOT NULL,
+        day DATE NOT NULL,
+        text VARCHAR(500) NOT NULL,
+        author VARCHAR(100) NOT NULL DEFAULT '',
+        PRIMARY KEY (id),
+        UNIQUE (day, text, author)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS weather_observation (
+        id INTEGER NOT NULL,
+        location VARCHAR(50) NOT NULL,
+        hour DATETIME NOT NULL,
+        temperature FLOAT,
+        PRIMARY KEY (id),
+        UNIQUE (location, hour)
+    )
+    """,
+    """
+    INSERT OR IGNORE INTO quote (day, text, author)
+    SELECT DISTINCT date(timestamp), quote_text, COALESCE(quote_author, '')
+    FROM wellbeing_data WHERE quote_text IS NOT NULL
+    """,
+    f"""
+    INSERT INTO weather_observation (location, hour, temperature)
+    SELECT city, {HOUR_SQL}, temperature
+    FROM wellbeing_data WHERE city IS NOT NULL ORDER BY timestamp
+    ON CONFLICT (location, hour) DO UPDATE
+    SET temperature = COALESCE(weather_observation.temperature, excluded.temperature)
+    """,
+    "ALTER TABLE wellbeing_data ADD COLUMN quote_id INTEGER REFERENCES quote (id)",
+    "ALTER TABLE wellbeing_data ADD COLUMN weather_id INTEGER REFERENCES weather_observation (id)",
+    """
+    UPDATE wellbeing_data SET quote_id = quote.id FROM quote
+    WHERE quote.day = date(wellbeing_data.timestamp)
+      AND quote.text = wellbeing_data.quote_text
+      AND quote.author = COALESCE(wellbeing_data.quote_author, '')
+    """,
+    f"""
+    UPDATE wellbeing_data SET weather_id = weather_observation.id FROM weather_observation
+    WHERE weather_observation.location = wellbeing_data.city AND weather_observation.hour = {HOUR_SQL}
+    """,
+    # Queued check-ins keep their location until the worker enriches them
+    "ALTER TABLE pending_enrichment ADD COLUMN location VARCHAR(50)",
+    """
+    UPDATE pending_enrichment SET location = wellbeing_data.city FROM wellbeing_data
+    WHERE wellbeing_data.id = pending_enrichment.log_id
+    """,
+    "ALTER TABLE wellbeing_data DROP COLUMN quote_text",
+    "ALTER TABLE wellbeing_data DROP COLUMN quote_author",
+    "ALTER TABLE wellbeing_data DROP COLUMN city",
+]
+
+# 9: Daily weather history per location (weather_history.py); the unique index is the analysis lookup
+DAILY_WEATHER = [
+    """
+    CREATE TABLE IF NOT EXISTS daily_weather (
+        id INTEGER NOT NULL,
+        location VARCHAR(50) NOT NULL,
+        day DATE NOT NULL,
+        temp_min FLOAT,
+        temp_max FLOAT,
+        temp_mean FLOAT,
+        precipitation FLOAT,
+        fetched_at DATETIME NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (location, day)
+    )
+    """,
+]
+
+# 10: data_version of the last change to existing check-ins, not just new ones (series_cache.py)
+SERIES_VERSION = [
+    "ALTER TABLE wellbeing_aggregate ADD COLUMN series_version INTEGER NOT NULL DEFAULT 0",
+]
+
+# 11: Which shard file holds each user's check-ins when sharding is on (shards.py)
+SHARD_MAP = [
+    """
+    CREATE TABLE IF NOT EXISTS shard_map (
+        user_id INTEGER NOT NULL,
+        shard INTEGER NOT NULL,
+        assigned_at DATETIME NOT NULL,
+        PRIMARY KEY (user_id)
+    )
+    """,
+]
+
+# 12: The data version a precomputed report was computed at; it is only served while current (main.py)
+REPORT_VERSION = [
+    "ALTER TABLE analysis_report ADD COLUMN data_version INTEGER",
+]
+
+# 13: Users whose check-ins a rebalance has copied into this file from another one (rebalance_shards.py)
+SHARD_MOVES = [
+    """
+    CREATE TABLE IF NOT EXISTS shard_move (
+        user_id INTEGER NOT NULL,
+        source VARCHAR(20) NOT NULL,
+        copied_at DATETIME NOT NULL,
+        PRIMARY KEY (user_id, source)
+    )
+    """,
+]
+
+# Versions that free enough space to be worth a VACUUM once applied
+VACUUM_AFTER = {8}
+
+# With sharding on, the per-user tables (shards.SHARDED_TABLES) also exist in every shard
+# file. A migration that alters one goes into SHARD_MIGRATIONS too, under the same version.
+MIGRATIONS = [
+    (1, "baseline user and wellbeing_data tables", BASELINE),
+    (2, "wellbeing_aggregate table", AGGREGATES),
+    (3, "pending_enrichment queue table", PENDING_ENRICHMENT),
+    (4, "composite (user_id, timestamp) index on wellbeing_data", USER_TIMESTAMP_INDEX),
+    (5, "analysis_report and cohort_report tables", REPORTS),
+    (6, "daily_rollup table, backfilled from wellbeing_data", DAILY_ROLLUPS),
+    (7, "data_version and updated_at on wellbeing_aggregate", DATA_VERSION),
+    (8, "quote and weather_observation tables referenced from wellbeing_data", NORMALISED_REFERENCES),
+    (9, "daily_weather history table", DAILY_WEATHER),
+    (10, "series_version on wellbeing_aggregate", SERIES_VERSION),
+    (11, "shard_map table", SHARD_MAP),
+    (12, "data_version on analysis_report", REPORT_VERSION),
+    (13, "shard_move table", SHARD_MOVES),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Shard files: the per-user tables as they stood when sharding was introduced (version 11;
+# IF NOT EXISTS adopts shard files created before they were migrated), then each later step
+# that touches them. Global tables are never created here: on shard connections they would
+# shadow the main database's.
+SHARD_BASELINE = [
+    """
+    CREATE TABLE IF NOT EXISTS wellbeing_data (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        timestamp DATETIME NOT NULL,
+        mood_score INTEGER NOT NULL,
+        sleep_hours FLOAT NOT NULL,
+        exercise_minutes INTEGER NOT NULL,
+        temperature FLOAT,
+        weather_id INTEGER,
+        quote_id INTEGER,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES user (id),
+        FOREIGN KEY(weather_id) REFERENCES weather_observation (id),
+        FOREIGN KEY(quote_id) REFERENCES quote (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_wellbeing_data_user_timestamp ON wellbeing_data (user_id, timestamp)",
+    """
+    CREATE TABLE IF NOT EXISTS wellbeing_aggregate (
+        user_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        mood_mean FLOAT NOT NULL,
+        mood_m2 FLOAT NOT NULL,
+        sleep_mean FLOAT NOT NULL,
+        sleep_m2 FLOAT NOT NULL,
+        exercise_mean FLOAT NOT NULL,
+        exercise_m2 FLOAT NOT NULL,
+        mood_sleep_cm FLOAT NOT NULL,
+        mood_exercise_cm FLOAT NOT NULL,
+        temp_count INTEGER NOT NULL,
+        temp_mean FLOAT NOT NULL,
+        temp_m2 FLOAT NOT NULL,
+        temp_mood_mean FLOAT NOT NULL,
+        temp_mood_m2 FLOAT NOT NULL,
+        mood_temp_cm FLOAT NOT NULL,
+        data_version INTEGER NOT NULL DEFAULT 0,
+        updated_at DATETIME,
+        series_version INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id),
+        FOREIGN KEY(user_id) REFERENCES user (id)
+    )
+    """,
+    DAILY_ROLLUPS[0],
+    """
+    CREATE TABLE IF NOT EXISTS analysis_report (
+        user_id INTEGER NOT NULL,
+        entries INTEGER NOT NULL,
+        stats TEXT NOT NULL,
+        computed_at DATETIME NOT NULL,
+        PRIMARY KEY (user_id),
+        FOREIGN KEY(user_id) REFERENCES user (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS pending_enrichment (
+        id INTEGER NOT NULL,
+        log_id INTEGER NOT NULL,
+        bucket DATETIME NOT NULL,
+        enqueued_at DATETIME NOT NULL,
+        location VARCHAR(50),
+        PRIMARY KEY (id),
+        UNIQUE (log_id),
+        FOREIGN KEY(log_id) REFERENCES wellbeing_data (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_pending_enrichment_bucket ON pending_enrichment (bucket)",
+    "CREATE INDEX IF NOT EXISTS ix_pending_enrichment_enqueued_at ON pending_enrichment (enqueued_at)",
+]
+
+SHARD_MIGRATIONS = [
+    (11, "per-user tables in a shard file", SHARD_BASELINE),
+    (12, "data_version on analysis_report", REPORT_VERSION),
+    (13, "shard_move table", SHARD_MOVES),
+]
+
+
+def current_version(conn):
+    """Returns the schema version recorded in the database (0 for a new or pre-migration file)."""
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def migrate(engine, target=LATEST_VERSION, migrations=MIGRATIONS):
+    """
+    Applies every migration newer than the database's version, up to `target`
+    (`migrations=SHARD_MIGRATIONS` for a shard file).
+    Each step runs in one explicit transaction with its version bump: pysqlite would
+    otherwise commit every ALTER TABLE on its own, and a step interrupted between two
+    of them could not be re-run ("duplicate column name").
+    Returns the list of versions applied.
+    """
+    applied = []
+    for version, description, statements in migrations:
+        if version > target:
+            break
+        with engine.connect() as conn:
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")   # BEGIN/COMMIT are issued here
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                if current_version(conn) >= version:
+                    conn.exec_driver_sql("ROLLBACK")
+                    continue
+                for statement in statements:
+                    if callable(statement):
+                        statement(conn)
+                    else:
+                        conn.exec_driver_sql(statement)
+                conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+            except BaseException:
+                conn.exec_driver_sql("ROLLBACK")
+                raise
+            conn.exec_driver_sql("COMMIT")
+        print(f"[Migrations] Applied {version}: {description}")
+        applied.append(version)
+
+    if VACUUM_AFTER.intersection(applied):
+        # Dropped columns only shrink the file once it is rebuilt (cannot run inside a transaction)
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").exec_driver_sql("VACUUM")
+        print("[Migrations] Vacuumed the database file.")
+    return applied
+
+
+if __name__ == '__main__':
+    from app import app, db
+
+    with app.app_context():
+        applied = migrate(db.engine)
+        with db.engine.connect() as conn:
+            print(f"Database at schema version {current_version(conn)} ({len(applied)} migration(s) applied).")
@@ -0,0 +1,193 @@
+# rebalance_shards.py
+# Moves every user's check-ins onto the shard their id hashes to under the current
+# WELLBEING_SHARDS and records it in shard_map: shards an existing database (its rows move
+# out of the main file), grows or shrinks the shard count, or with WELLBEING_SHARDS=0 moves
+# everything back into the main database. Check-ins (and queued enrichments) are copied,
+# aggregates and rollups rebuilt there, and precomputed reports dropped until the next
+# cohort_job.py run. Each copy commits together with a shard_move row in the destination
+# file, which stays until the source's rows are deleted: a run interrupted between copy
+# and delete can simply be re-run, and copies nothing twice.
+# Run it with the API servers and workers stopped: they cache shard assignments.
+# Usage: WELLBEING_SHARDS=4 python rebalance_shards.py [--dry-run]
+
+import argparse
+import json
+import time
+from datetime import datetime
+from sqlalchemy import delete, func, insert, select, text, update
+
+from app import app, db, WellbeingData, WellbeingAggregate, DailyRollup, AnalysisReport
+from aggregates import rebuild_aggregates
+from migrations import migrate
+from rollups import rebuild_rollups
+from shards import SHARD_COUNT, SHARDED_TABLES, existing_shards, get_engine, placement, use_shard
+
+# --- Configuration ---
+COPY_BATCH_ROWS = 20_000
+# --- End Configuration ---
+
+
+def store_name(store):
+    return "main" if store is None else f"shard {store}"
+
+
+def users_in(engine):
+    """Every user id with rows in the per-user tables of one database file."""
+    query = " UNION ".join(f"SELECT user_id FROM {name}" for name in SHARDED_TABLES if name != "pending_enrichment")
+    with engine.connect() as conn:
+        return {row[0] for row in conn.exec_driver_sql(query)}
+
+
+def moves_in(engine):
+    """{(user_id, source store name)} copied into one database file and not yet deleted at the source."""
+    with engine.connect() as conn:
+        return set(conn.exec_driver_sql("SELECT user_id, source FROM shard_move").all())
+
+
+def merge_user(source, target, user_id, source_name):
+    """
+    Copies the user's check-ins and queued enrichments from `source` into `target` (with new
+    ids there), recording the copy in target's shard_move in the same transaction.
+    Returns the number of rows copied.
+    """
+    data, pending = db.metadata.tables["wellbeing_data"], db.metadata.tables["pending_enrichment"]
+    logs = select(data.c.id).where(data.c.user_id == user_id)
+    with source.connect() as src, target.begin() as dst:
+        queued = {row["log_id"]: row for row in src.execute(select(pending).where(pending.c.log_id.in_(logs))).mappings()}
+        next_id = (dst.execute(select(func.max(data.c.id))).scalar() or 0) + 1
+        copied = 0
+        stream = src.execution_options(yield_per=COPY_BATCH_ROWS).execute(
+            select(data).where(data.c.user_id == user_id).order_by(data.c.id)
+        )
+        for partition in stream.mappings().partitions():
+            rows, requeued = [], []
+            for row in partition:
+                if row["id"] in queued:
+                    entry = {key: value for key, value in queued[row["id"]].items() if key != "id"}
+                    requeued.append(dict(entry, log_id=next_id))
+                rows.append(dict(row, id=next_id))
+                next_id += 1
+            if rows:
+                dst.execute(insert(data), rows)
+            if requeued:
+                dst.execute(insert(pending), requeued)
+            copied += len(rows)
+        dst.execute(text(
+            "INSERT INTO shard_move (user_id, source, copied_at) VALUES (:user_id, :source, :copied_at) "
+            "ON CONFLICT (user_id, source) DO UPDATE SET copied_at = excluded.copied_at"
+        ), {"user_id": user_id, "source": source_name, "copied_at": datetime.utcnow()})
+    return copied
+
+
+def remove_user(engine, user_id):
+    """Deletes the user's rows from every per-user table of one database file."""
+    data, pending = db.metadata.tables["wellbeing_data"], db.metadata.tables["pending_enrichment"]
+    with engine.begin() as conn:
+        conn.execute(delete(pending).where(pending.c.log_id.in_(select(data.c.id).where(data.c.user_id == user_id))))
+        for name in SHARDED_TABLES:
+            if name != "pending_enrichment":
+                table = db.metadata.tables[name]
+                conn.execute(delete(table).where(table.c.user_id == user_id))
+
+
+def clear_moves(engine, user_id):
+    """Forgets the user's finished copies into one database file."""
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM shard_move WHERE user_id = :user_id"), {"user_id": user_id})
+
+
+def data_version(engine, user_id):
+    aggregate = db.metadata.tables["wellbeing_aggregate"]
+    with engine.connect() as conn:
+        return conn.execute(select(aggregate.c.data_version).where(aggregate.c.user_id == user_id)).scalar() or 0
+
+
+def rebuild_user(store, user_id, after_version):
+    """Recomputes the user's derived rows where their check-ins now live."""
+    with use_shard(store):
+        rebuild_aggregates(db, WellbeingData, WellbeingAggregate, user_id=user_id)
+        rebuild_rollups(db, WellbeingData, DailyRollup, user_id=user_id)
+        db.session.execute(delete(AnalysisReport).where(AnalysisReport.user_id == user_id))
+        # Past every version the user had anywhere, so no cached report or chart is reused
+        db.session.execute(
+            update(WellbeingAggregate).where(WellbeingAggregate.user_id == user_id)
+            .values(data_version=after_version + 1, series_version=after_version + 1)
+        )
+        db.session.commit()
+
+
+def set_assignment(user_id, shard):
+    with db.engine.begin() as conn:
+        if shard is None:
+            conn.execute(text("DELETE FROM shard_map WHERE user_id = :user_id"), {"user_id": user_id})
+        else:
+            conn.execute(text(
+                "INSERT INTO shard_map (user_id, shard, assigned_at) VALUES (:user_id, :shard, :assigned_at) "
+                "ON CONFLICT (user_id) DO UPDATE SET shard = excluded.shard, assigned_at = excluded.assigned_at"
+            ), {"user_id": user_id, "shard": shard, "assigned_at": datetime.utcnow()})
+
+
+def rebalance(dry_run=False):
+    """Brings every user onto their target store. Returns a summary dict."""
+    started = time.perf_counter()
+    main_url = db.engine.url
+    stores = {None: db.engine}
+    wanted = set() if dry_run else set(range(SHARD_COUNT))   # a dry run creates no shard files
+    for shard in sorted(set(existing_shards(main_url)) | wanted):
+        stores[shard] = get_engine(db, shard)
+
+    holders = {}
+    for store, engine in stores.items():
+        for user_id in users_in(engine):
+            holders.setdefault(user_id, set()).add(store)
+    with db.engine.connect() as conn:
+        assignments = dict(conn.execute(text("SELECT user_id, shard FROM shard_map")).all())
+    moves = {store: moves_in(engine) for store, engine in stores.items()}
+
+    summary = {"shards": SHARD_COUNT, "users": len(set(holders) | set(assignments)), "users_moved": 0,
+               "checkins_copied": 0, "moves": {}}
+    for user_id in sorted(set(holders) | set(assignments)):
+        target = placement(user_id) if SHARD_COUNT else None
+        sources = sorted(holders.get(user_id, set()) - {target}, key=lambda store: -1 if store is None else store)
+        if sources:
+            for source in sources:
+                move = f"{store_name(source)} -> {store_name(target)}"
+                summary["moves"][move] = summary["moves"].get(move, 0) + 1
+            summary["users_moved"] += 1
+            if dry_run:
+                continue
+            after_version = max(data_version(engine, user_id) for engine in stores.values())
+            for source in sources:
+                # Already copied by an interrupted run, into a store that still holds the user
+                if any((user_id, store_name(source)) in moves[store] for store in holders[user_id] - {source}):
+                    continue
+                summary["checkins_copied"] += merge_user(stores[source], stores[target], user_id, store_name(source))
+            rebuild_user(target, user_id, after_version)
+        if dry_run:
+            continue
+        # The map switches once the target holds everything; then the copies left behind go
+        if assignments.get(user_id) != target:
+            set_assignment(user_id, target)
+        for source in sources:
+            remove_user(stores[source], user_id)
+        # Sources emptied: their copies are now the only ones, so forget them
+        for store, engine in stores.items():
+            if (sources and store == target) or any(moved == user_id for moved, _ in moves[store]):
+                clear_moves(engine, user_id)
+
+    retired = [shard for shard in stores if shard is not None and shard >= SHARD_COUNT]
+    if retired and not dry_run:
+        print(f"[Rebalance] Shard files {', '.join(map(str, retired))} are now empty and can be deleted.")
+    summary["dry_run"] = dry_run
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Move users onto the shards WELLBEING_SHARDS places them on.")
+    parser.add_argument("--dry-run", action="store_true", help="only report which users would move where")
+    args = parser.parse_args()
+
+    with app.app_context():
+        migrate(db.engine)
+        print(json.dumps(rebalance(dry_run=args.dry_run), indent=2))
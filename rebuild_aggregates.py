@@ -0,0 +1,21 @@
+# rebuild_aggregates.py
+# Recomputes the per-user running aggregates and daily rollups from the raw WellbeingData rows.
+# Usage: python rebuild_aggregates.py [user_id]
+
+import sys
+from app import app, db, WellbeingData, WellbeingAggregate, DailyRollup
+from aggregates import rebuild_aggregates
+from rollups import rebuild_rollups
+from migrations import migrate
+from shards import shard_ids, shard_of, use_shard
+
+with app.app_context():
+    migrate(db.engine)
+    user_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    rebuilt = 0
+    for shard in [shard_of(db, user_id)] if user_id is not None else shard_ids():
+        with use_shard(shard):
+            rebuilt += rebuild_aggregates(db, WellbeingData, WellbeingAggregate, user_id=user_id)
+            rebuild_rollups(db, WellbeingData, DailyRollup, user_id=user_id)
+            db.session.commit()
+    print(f"Rebuilt aggregates and daily rollups for {rebuilt} user(s).")
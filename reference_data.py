@@ -0,0 +1,120 @@
+# reference_data.py
+# Interned reference rows. Every check-in in the same day shares one quote, and every
+# check-in in the same hour and place shares one weather observation, so wellbeing_data
+# stores two integer ids instead of repeating the city and the quote text on each row.
+
+from datetime import datetime
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+
+def observation_hour(timestamp):
+    """Truncates a timestamp to the hour its weather observation is filed under."""
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def quote_day(timestamp):
+    return timestamp.date() if isinstance(timestamp, datetime) else timestamp
+
+
+def intern_quotes(db, Quote, keys):
+    """
+    Returns {(day, text, author): quote id} for the given keys, inserting the missing ones.
+    Authors are stored as '' rather than NULL so the unique constraint matches them.
+    """
+    keys = {(day, text, author or '') for day, text, author in keys}
+    if not keys:
+        return {}
+    days = {day for day, _, _ in keys}
+
+    def lookup():
+        found = db.session.execute(
+            db.select(Quote.id, Quote.day, Quote.text, Quote.author).where(Quote.day.in_(days))
+        ).all()
+        return {(day, text, author): quote_id for quote_id, day, text, author in found if (day, text, author) in keys}
+
+    # Look up first: most check-ins reuse today's quote and then write nothing here
+    quote_ids = lookup()
+    missing = keys - quote_ids.keys()
+    if missing:
+        db.session.execute(
+            sqlite_insert(Quote.__table__).on_conflict_do_nothing(),
+            [{"day": day, "text": text, "author": author} for day, text, author in missing],
+        )
+        quote_ids = lookup()
+    return quote_ids
+
+
+def intern_observations(db, WeatherObservation, readings):
+    """
+    Returns {(location, hour): observation id} for (location, hour, temperature) readings.
+    An existing observation keeps its temperature; a NULL one is filled in by the first reading.
+    """
+    values = {}
+    for location, hour, temperature in readings:
+        if values.get((location, hour)) is None:
+            values[(location, hour)] = temperature
+    if not values:
+        return {}
+    hours = {hour for _, hour in values}
+
+    def lookup():
+        return {
+            (location, hour): (observation_id, temperature)
+            for observation_id, location, hour, temperature in db.session.execute(
+                db.select(WeatherObservation.id, WeatherObservation.location, WeatherObservation.hour,
+                          WeatherObservation.temperature)
+                .where(WeatherObservation.hour.in_(hours))
+            )
+            if (location, hour) in values
+        }
+
+    # Look up first: only new observations, or NULL ones a reading can fill, are written
+    found = lookup()
+    writes = {
+        key: temperature for key, temperature in values.items()
+        if key not in found or (found[key][1] is None and temperature is not None)
+    }
+    if writes:
+        statement = sqlite_insert(WeatherObservation.__table__)
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["location", "hour"],
+                set_={"temperature": db.func.coalesce(WeatherObservation.__table__.c.temperature, statement.excluded.temperature)},
+            ),
+            [{"location": location, "hour": hour, "temperature": temperature} for (location, hour), temperature in writes.items()],
+        )
+        found = lookup()
+    return {key: observation_id for key, (observation_id, _) in found.items()}
+
+
+def attach_references(db, Quote, WeatherObservation, rows):
+    """
+    Replaces the transient 'city', 'quote_text' and 'quote_author' keys of WellbeingData row
+    dicts with quote_id / weather_id, interning the referenced rows in two statements each.
+    Rows without a city (or a quote) get a NULL reference.
+    """
+    quote_keys, readings = set(), []
+    for row in rows:
+        city, text, author = row.pop('city', None), row.pop('quote_text', None), row.pop('quote_author', None)
+        row['_quote'] = (quote_day(row['timestamp']), text, author or '') if text else None
+        row['_weather'] = (city, observation_hour(row['timestamp'])) if city else None
+        if row['_quote']:
+            quote_keys.add(row['_quote'])
+        if row['_weather']:
+            readings.append(row['_weather'] + (row.get('temperature'),))
+
+    quote_ids = intern_quotes(db, Quote, quote_keys)
+    weather_ids = intern_observations(db, WeatherObservation, readings)
+    for row in rows:
+        quote, weather = row.pop('_quote'), row.pop('_weather')
+        row['quote_id'] = quote_ids.get(quote) if quote else None
+        row['weather_id'] = weather_ids.get(weather) if weather else None
+    return rows
+
+
+def reference_ids(db, Quote, WeatherObservation, timestamp, city, temperature, quote_text, quote_author):
+    """quote_id / weather_id for a single check-in (see attach_references)."""
+    row = {'timestamp': timestamp, 'city': city, 'temperature': temperature,
+           'quote_text': quote_text, 'quote_author': quote_author}
+    attach_references(db, Quote, WeatherObservation, [row])
+    return row['quote_id'], row['weather_id']
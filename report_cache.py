@@ -0,0 +1,115 @@
+# report_cache.py
+# Cached /api/analysis (and /api/trends) responses with ETag / Last-Modified and conditional GET.
+# Entries are keyed by (user, tier, query) and tagged with the user's data version, which
+# every check-in write bumps, so a new check-in makes the old entry unreachable.
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timezone
+from flask import Response, json
+from cache import CACHE_BACKEND, get_backend
+
+# --- Configuration ---
+REPORT_CACHE_SIZE = 1024          # in-memory LRU entries per worker
+SHARE_REPORTS = CACHE_BACKEND == "sqlite"   # also keep rendered reports in the shared cache file
+SHARED_REPORT_TTL = 24 * 60 * 60     # shared entries older than this are ignored and pruned
+SHARED_PRUNE_INTERVAL = 10 * 60      # seconds between prunes, per worker
+SHARED_PREFIX = "report-cache/"      # namespaces the shared entries among the upstream ones
+# --- End Configuration ---
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_last_prune = {"at": time.monotonic()}
+stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+
+def make_key(user_id, tier, args, kind="report"):
+    """Cache key for one endpoint/user/tier/query combination (query parameters in a stable order)."""
+    query = "&".join(f"{name}={value}" for name, value in sorted(args.items(multi=True)))
+    return f"{kind}:{user_id}:{tier}:{query}"
+
+
+def make_etag(key, version):
+    return hashlib.sha1(f"{key}:{version}".encode()).hexdigest()
+
+
+def _get(key, version):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+    if entry is None and SHARE_REPORTS:
+        shared = get_backend().get(SHARED_PREFIX + key)
+        entry = shared[1] if shared and time.time() - shared[0] < SHARED_REPORT_TTL else None
+        if entry is not None:
+            _put(key, entry, share=False)
+    if entry is None or entry["version"] != version:
+        return None
+    return entry
+
+
+def _put(key, entry, share=None):
+    with _lock:
+        _entries[key] = entry
+        _entries.move_to_end(key)
+        while len(_entries) > REPORT_CACHE_SIZE:
+            _entries.popitem(last=False)
+    if SHARE_REPORTS if share is None else share:
+        backend = get_backend()
+        backend.set(SHARED_PREFIX + key, entry, time.time())
+        # Superseded versions are never read again; age them out of the shared file
+        if time.monotonic() - _last_prune["at"] > SHARED_PRUNE_INTERVAL:
+            _last_prune["at"] = time.monotonic()
+            backend.prune(SHARED_PREFIX, time.time() - SHARED_REPORT_TTL)
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def _finish(response, etag, last_modified):
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True   # clients must revalidate, which is a cheap 304
+    return response
+
+
+def _not_modified(request, etag, last_modified):
+    # If-None-Match wins over If-Modified-Since when both are sent (RFC 7232 section 6)
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    return request.if_modified_since is not None and last_modified <= request.if_modified_since
+
+
+def conditional_report(request, key, version, updated_at, compute, not_before=None):
+    """
+    Serves a report for `key` at data `version`.
+    Answers 304 from the validators alone when the client is current, serves a cached
+    body when one exists for this version, and otherwise calls `compute()` -> (payload, status).
+    Only 200 responses are cached. Reports that also change with time (trailing windows)
+    pass `not_before`, the start of the period they were computed for, so Last-Modified
+    moves on with it.
+    """
+    etag = make_etag(key, version)
+    last_modified = max(updated_at, not_before or updated_at).replace(microsecond=0, tzinfo=timezone.utc)
+
+    if _not_modified(request, etag, last_modified):
+        stats["not_modified"] += 1
+        return _finish(Response(status=304), etag, last_modified)
+
+    entry = _get(key, version)
+    if entry is not None:
+        stats["hits"] += 1
+        return _finish(Response(entry["body"], mimetype="application/json"), etag, last_modified)
+
+    stats["misses"] += 1
+    payload, status = compute()
+    body = json.dumps(payload)
+    if status != 200:
+        return Response(body, status=status, mimetype="application/json")
+    _put(key, {"version": version, "body": body})
+    return _finish(Response(body, mimetype="application/json"), etag, last_modified)
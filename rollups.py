@@ -0,0 +1,236 @@
+# rollups.py
+# Per-user daily rollups (additive sums) for rolling-window and time-bucketed analysis.
+# Sums rather than Welford moments here: windows are formed by adding and removing whole
+# days, which is exact with sums, and the upsert can be a single atomic "x = x + excluded.x".
+
+from datetime import datetime, timedelta
+from startup import lazy_import
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from analysis_engine import MIN_VARIANCE
+
+np = lazy_import("numpy")
+
+# --- Configuration ---
+MAX_WINDOW_DAYS = 366
+DEFAULT_WINDOWS = [7, 30, 90]
+BUCKETS = {'day': 1, 'week': 7}
+# --- End Configuration ---
+
+# Pair-complete sums: the core block covers every row, the temp_* block only rows with a temperature
+ROLLUP_FIELDS = (
+    'count',
+    'mood_sum', 'mood_sq', 'sleep_sum', 'sleep_sq', 'exercise_sum', 'exercise_sq',
+    'mood_sleep_sum', 'mood_exercise_sum',
+    'temp_count', 'temp_sum', 'temp_sq', 'temp_mood_sum', 'temp_mood_sq', 'mood_temp_sum',
+)
+FIELD_INDEX = {field: i for i, field in enumerate(ROLLUP_FIELDS)}
+
+
+def checkin_sums(mood, sleep_hours, exercise_minutes, temperature=None):
+    """The rollup increments contributed by one check-in, as a list aligned with ROLLUP_FIELDS."""
+    sums = [1, mood, mood * mood, sleep_hours, sleep_hours ** 2, exercise_minutes, exercise_minutes ** 2,
+            mood * sleep_hours, mood * exercise_minutes] + [0] * 6
+    if temperature is not None:
+        sums[9:] = temperature_sums(mood, temperature)
+    return sums
+
+
+def temperature_sums(mood, temperature):
+    """Increments of the temp_* block only (for check-ins enriched after the fact)."""
+    return [1, temperature, temperature * temperature, mood, mood * mood, mood * temperature]
+
+
+def upsert_rollups(db, DailyRollup, increments):
+    """
+    Adds {(user_id, day): [sums...]} onto the stored rollups with one
+    INSERT .. ON CONFLICT DO UPDATE, so concurrent writers never lose an update.
+    `increments` values may cover all ROLLUP_FIELDS or be keyed dicts of a subset.
+    """
+    if not increments:
+        return
+    rows = []
+    for (user_id, day), sums in increments.items():
+        values = dict(zip(ROLLUP_FIELDS, sums)) if isinstance(sums, list) else dict.fromkeys(ROLLUP_FIELDS, 0) | sums
+        rows.append(dict(values, user_id=user_id, day=day))
+
+    table = DailyRollup.__table__
+    statement = sqlite_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.day],
+        set_={field: table.c[field] + statement.excluded[field] for field in ROLLUP_FIELDS},
+    )
+    db.session.execute(statement, rows)
+
+
+def add_checkins_to_rollups(db, DailyRollup, user_id, checkins):
+    """Folds (timestamp, mood, sleep, exercise, temperature) tuples into the user's daily rollups."""
+    increments = {}
+    for timestamp, mood, sleep_hours, exercise_minutes, temperature in checkins:
+        key = (user_id, timestamp.date())
+        sums = checkin_sums(mood, sleep_hours, exercise_minutes, temperature)
+        if key in increments:
+            increments[key] = [a + b for a, b in zip(increments[key], sums)]
+        else:
+            increments[key] = sums
+    upsert_rollups(db, DailyRollup, increments)
+
+
+def add_temperatures_to_rollups(db, DailyRollup, items):
+    """Folds late temperatures, given as (user_id, timestamp, mood, temperature), into the rollups."""
+    increments = {}
+    temp_fields = ROLLUP_FIELDS[9:]
+    for user_id, timestamp, mood, temperature in items:
+        key = (user_id, timestamp.date())
+        sums = dict(zip(temp_fields, temperature_sums(mood, temperature)))
+        if key in increments:
+            sums = {field: increments[key][field] + sums[field] for field in temp_fields}
+        increments[key] = sums
+    upsert_rollups(db, DailyRollup, increments)
+
+
+def rebuild_rollups(db, WellbeingData, DailyRollup, user_id=None):
+    """Recomputes rollups from the raw rows with one INSERT .. SELECT .. GROUP BY per call."""
+    delete = db.delete(DailyRollup)
+    where = ""
+    params = {}
+    if user_id is not None:
+        delete = delete.where(DailyRollup.user_id == user_id)
+        where = "WHERE user_id = :user_id"
+        params = {"user_id": user_id}
+    db.session.execute(delete)
+    has_temp = "(temperature IS NOT NULL)"
+    db.session.execute(db.text(f"""
+        INSERT INTO daily_rollup (user_id, day, {', '.join(ROLLUP_FIELDS)})
+        SELECT user_id, date(timestamp),
+            COUNT(*),
+            SUM(mood_score), SUM(mood_score * mood_score),
+            SUM(sleep_hours), SUM(sleep_hours * sleep_hours),
+            SUM(exercise_minutes), SUM(exercise_minutes * exercise_minutes),
+            SUM(mood_score * sleep_hours), SUM(mood_score * exercise_minutes),
+            SUM({has_temp}), TOTAL(temperature), TOTAL(temperature * temperature),
+            SUM(CASE WHEN {has_temp} THEN mood_score ELSE 0 END),
+            SUM(CASE WHEN {has_temp} THEN mood_score * mood_score ELSE 0 END),
+            TOTAL(mood_score * temperature)
+        FROM wellbeing_data {where}
+        GROUP BY user_id, date(timestamp)
+    """), params)
+
+
+def parse_windows(value):
+    """Parses "7d,30d" / "7,30" into sorted day counts; raises ValueError on bad input."""
+    windows = set()
+    for part in value.split(','):
+        part = part.strip().lower().rstrip('d')
+        if not part.isdigit() or not 1 <= int(part) <= MAX_WINDOW_DAYS:
+            raise ValueError(f"window must be a list of day counts between 1d and {MAX_WINDOW_DAYS}d")
+        windows.add(int(part))
+    return sorted(windows)
+
+
+def load_daily_sums(db, DailyRollup, user_id, days, end=None):
+    """
+    Returns (first_day, matrix): one row per calendar day for the `days` days ending at
+    `end` (default today, UTC) and one column per ROLLUP_FIELDS entry. Missing days are zero.
+    """
+    end = end or datetime.utcnow().date()
+    first_day = end - timedelta(days=days - 1)
+    rows = db.session.execute(
+        db.select(DailyRollup.day, *[getattr(DailyRollup, field) for field in ROLLUP_FIELDS])
+        .where(DailyRollup.user_id == user_id, DailyRollup.day >= first_day, DailyRollup.day <= end)
+    ).all()
+    matrix = np.zeros((days, len(ROLLUP_FIELDS)))
+    for row in rows:
+        matrix[(row[0] - first_day).days] = row[1:]
+    return first_day, matrix
+
+
+def stats_from_sums(sums):
+    """
+    Vectorized means, stdevs and mood-vs-factor r from rollup sums.
+    `sums` is (..., len(ROLLUP_FIELDS)); returns a list of stats dicts shaped like
+    analysis_engine.compute_stats(), one per leading row.
+    """
+    sums = np.atleast_2d(np.asarray(sums, dtype=float))
+    f = {field: sums[:, i] for field, i in FIELD_INDEX.items()}
+    n, n_t = f['count'], f['temp_count']
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        def centred(sq, s, count):
+            return np.maximum(sq - s * s / count, 0.0)
+
+        m2 = {
+            'mood': centred(f['mood_sq'], f['mood_sum'], n),
+            'sleep': centred(f['sleep_sq'], f['sleep_sum'], n),
+            'exercise': centred(f['exercise_sq'], f['exercise_sum'], n),
+            'temperature': centred(f['temp_sq'], f['temp_sum'], n_t),
+        }
+        means = {
+            'mood': f['mood_sum'] / n,
+            'sleep': f['sleep_sum'] / n,
+            'exercise': f['exercise_sum'] / n,
+            'temperature': f['temp_sum'] / n_t,
+        }
+        counts = {'mood': n, 'sleep': n, 'exercise': n, 'temperature': n_t}
+        stdevs = {key: np.sqrt(m2[key] / (counts[key] - 1)) for key in m2}
+
+        temp_mood_m2 = centred(f['temp_mood_sq'], f['temp_mood_sum'], n_t)
+        cm = {
+            'sleep': (f['mood_sleep_sum'] - f['mood_sum'] * f['sleep_sum'] / n, m2['mood'], m2['sleep'], n),
+            'exercise': (f['mood_exercise_sum'] - f['mood_sum'] * f['exercise_sum'] / n, m2['mood'], m2['exercise'], n),
+            'temperature': (f['mood_temp_sum'] - f['temp_mood_sum'] * f['temp_sum'] / n_t, temp_mood_m2, m2['temperature'], n_t),
+        }
+        correlations = {}
+        for key, (co, m2_x, m2_y, count) in cm.items():
+            valid = (count >= 2) & (m2_x > MIN_VARIANCE) & (m2_y > MIN_VARIANCE)
+            correlations[key] = (np.clip(co / np.sqrt(m2_x * m2_y), -1.0, 1.0), valid)
+
+    results = []
+    for row in range(sums.shape[0]):
+        results.append({
+            'entries': int(n[row]),
+            'mean': {key: float(means[key][row]) if counts[key][row] > 0 else 0.0 for key in means},
+            'stdev': {key: float(stdevs[key][row]) if counts[key][row] > 1 else 0.0 for key in stdevs},
+            'correlations': {
+                key: float(value[row]) if valid[row] else None
+                for key, (value, valid) in correlations.items()
+            },
+        })
+    return results
+
+
+def window_analysis(db, DailyRollup, user_id, windows=DEFAULT_WINDOWS, bucket='day', end=None):
+    """
+    Stats for every trailing window plus a trend series, from one read of the daily rollups.
+    Windows are differences of a prefix sum over days, so asking for several windows costs the
+    same as one. The trend has one point per bucket across the longest window, each carrying
+    the bucket's own stats and the rolling stats of the shortest window ending with it.
+    """
+    days = max(windows)
+    first_day, daily = load_daily_sums(db, DailyRollup, user_id, days, end)
+    prefix = np.vstack([np.zeros(len(ROLLUP_FIELDS)), np.cumsum(daily, axis=0)])
+
+    window_stats = stats_from_sums([prefix[days] - prefix[days - w] for w in windows])
+    result = {'windows': {f"{w}d": stats for w, stats in zip(windows, window_stats)}}
+
+    # Buckets aligned so the last one ends today
+    step = BUCKETS[bucket]
+    ends = np.arange(days, 0, -step)[::-1]
+    starts = np.maximum(ends - step, 0)
+    bucket_stats = stats_from_sums(prefix[ends] - prefix[starts])
+    rolling_span = min(windows)
+    rolling_stats = stats_from_sums(prefix[ends] - prefix[np.maximum(ends - rolling_span, 0)])
+    result['trend'] = {
+        'bucket': bucket,
+        'rolling_window': f"{rolling_span}d",
+        'points': [
+            {
+                'start': (first_day + timedelta(days=int(start))).isoformat(),
+                'entries': current['entries'],
+                'mean': current['mean'],
+                'stdev': current['stdev'],
+                'rolling': {'mean': rolling['mean'], 'stdev': rolling['stdev'], 'correlations': rolling['correlations']},
+            }
+            for start, current, rolling in zip(starts, bucket_stats, rolling_stats)
+        ],
+    }
+    return result
@@ -0,0 +1,229 @@
+# series_cache.py
+# Per-worker cache of each active user's numeric series in columnar form: timestamps as
+# int64 microseconds and one float64 column per analysis_engine.METRICS entry (NaN = NULL),
+# in NumPy arrays with spare capacity, so there is no Python object per row.
+#
+# Entries are tagged with the user's data version. A check-in stored by this worker is
+# appended in place. Any other change is seen on the next read as a version mismatch:
+# if only new check-ins were added since (the aggregate's series_version is not newer than
+# the entry), just the rows past the cached max id are fetched; otherwise the series is
+# reloaded. Entries are evicted least recently used under a byte budget.
+
+import os
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+from startup import lazy_import
+from analysis_engine import METRICS
+
+np = lazy_import("numpy")
+
+# --- Configuration ---
+SERIES_CACHE_BYTES = int(float(os.environ.get("WELLBEING_SERIES_CACHE_MB", "64")) * 1024 * 1024)
+SERIES_FETCH_ROWS = 50_000      # rows converted to arrays at a time while loading
+SERIES_HEADROOM = 64            # spare rows allocated for appends
+# --- End Configuration ---
+
+# Microseconds since the epoch, straight from SQLite's 'YYYY-MM-DD HH:MM:SS[.ffffff]' text
+TIMESTAMP_US = (
+    "CAST(strftime('%s', timestamp) AS INTEGER) * 1000000 "
+    "+ CAST(substr(timestamp || '000000', 21, 6) AS INTEGER)"
+)
+SERIES_COLUMNS = "id, " + TIMESTAMP_US + ", " + ", ".join(column for _, column in METRICS)
+
+_entries = OrderedDict()     # user_id -> SeriesEntry, least recently used first
+_lock = threading.Lock()
+_size = {"bytes": 0}
+stats = {"hits": 0, "misses": 0, "tail_refreshes": 0, "appends": 0, "evictions": 0, "uncacheable": 0}
+
+
+class SeriesEntry:
+    def __init__(self, version, updated_at, count, max_id, timestamps, values, rows):
+        self.version = version
+        self.updated_at = updated_at
+        self.count = count          # the aggregate's check-in count at `version`
+        self.max_id = max_id
+        self.timestamps = timestamps
+        self.values = values
+        self.rows = rows            # filled prefix of the arrays
+
+    @property
+    def nbytes(self):
+        return self.timestamps.nbytes + self.values.nbytes
+
+    def view(self):
+        """Read-only views of the filled rows; later appends never touch them."""
+        timestamps = self.timestamps[:self.rows].view('datetime64[us]')
+        values = self.values[:self.rows]
+        timestamps.flags.writeable = False
+        values.flags.writeable = False
+        return timestamps, values
+
+
+def query_series(db, WellbeingData, user_id, after_id=None):
+    """
+    Column-only load of a user's rows ordered by timestamp: (ids, timestamps in us, values).
+    Reads through the DB-API cursor, so rows are converted to arrays a chunk at a time
+    without ORM rows or datetime objects. With `after_id`, only rows with a larger id.
+    """
+    table = WellbeingData.__table__.name
+    if after_id is None:
+        sql = f"SELECT {SERIES_COLUMNS} FROM {table} WHERE user_id = ? ORDER BY timestamp"
+        params = (user_id,)
+    else:
+        # The unary + keeps SQLite on the rowid range (only the new rows) rather than the user index
+        sql = f"SELECT {SERIES_COLUMNS} FROM {table} WHERE id > ? AND +user_id = ? ORDER BY timestamp"
+        params = (after_id, user_id)
+
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.execute(sql, params)
+        chunks = []
+        while True:
+            rows = cursor.fetchmany(SERIES_FETCH_ROWS)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=float))  # None -> NaN
+    finally:
+        cursor.close()
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty((0, len(METRICS)))
+    matrix = np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+    # int64 microseconds are exact in float64 up to 2^53 (about the year 2255)
+    return matrix[:, 0].astype(np.int64), matrix[:, 1].astype(np.int64), np.ascontiguousarray(matrix[:, 2:])
+
+
+def _series_state(db, WellbeingAggregate, user_id):
+    return db.session.execute(
+        db.select(WellbeingAggregate.data_version, WellbeingAggregate.updated_at,
+                  WellbeingAggregate.count, WellbeingAggregate.series_version)
+        .filter_by(user_id=user_id)
+    ).first()
+
+
+def _allocate(rows):
+    capacity = rows + max(SERIES_HEADROOM, rows // 16)
+    return np.empty(capacity, dtype=np.int64), np.empty((capacity, len(METRICS)))
+
+
+def _build_entry(state, ids, timestamps, values):
+    rows = len(timestamps)
+    entry_timestamps, entry_values = _allocate(rows)
+    entry_timestamps[:rows] = timestamps
+    entry_values[:rows] = values
+    max_id = int(ids.max()) if rows else 0
+    return SeriesEntry(state.data_version, state.updated_at, state.count, max_id, entry_timestamps, entry_values, rows)
+
+
+def _store(user_id, entry):
+    """Caches `entry` (caller holds _lock), evicting least recently used entries to fit the budget."""
+    old = _entries.pop(user_id, None)
+    if old is not None:
+        _size["bytes"] -= old.nbytes
+    if entry.nbytes > SERIES_CACHE_BYTES:
+        stats["uncacheable"] += 1
+        return
+    while _entries and _size["bytes"] + entry.nbytes > SERIES_CACHE_BYTES:
+        _, evicted = _entries.popitem(last=False)
+        _size["bytes"] -= evicted.nbytes
+        stats["evictions"] += 1
+    _entries[user_id] = entry
+    _size["bytes"] += entry.nbytes
+
+
+def _merge_tail(entry, state, ids, timestamps, values):
+    """The entry extended by rows fetched past its max id (kept in timestamp order)."""
+    new_rows = entry.rows + len(timestamps)
+    if len(timestamps) and entry.rows and timestamps[0] < entry.timestamps[entry.rows - 1]:
+        # Back-dated rows (a batch or an import): re-sort a copy; readers keep the old arrays
+        order = np.argsort(np.concatenate([entry.timestamps[:entry.rows], timestamps]), kind='stable')
+        merged_timestamps, merged_values = _allocate(new_rows)
+        merged_timestamps[:new_rows] = np.concatenate([entry.timestamps[:entry.rows], timestamps])[order]
+        merged_values[:new_rows] = np.concatenate([entry.values[:entry.rows], values])[order]
+        entry = SeriesEntry(entry.version, entry.updated_at, entry.count, entry.max_id, merged_timestamps, merged_values, new_rows)
+    elif new_rows > len(entry.timestamps):
+        grown_timestamps, grown_values = _allocate(new_rows)
+        grown_timestamps[:entry.rows] = entry.timestamps[:entry.rows]
+        grown_values[:entry.rows] = entry.values[:entry.rows]
+        entry = SeriesEntry(entry.version, entry.updated_at, entry.count, entry.max_id, grown_timestamps, grown_values, entry.rows)
+    if len(timestamps) and entry.rows < new_rows:
+        entry.timestamps[entry.rows:new_rows] = timestamps
+        entry.values[entry.rows:new_rows] = values
+        entry.rows = new_rows
+    entry.version, entry.updated_at, entry.count = state.data_version, state.updated_at, state.count
+    if len(ids):
+        entry.max_id = max(entry.max_id, int(ids.max()))
+    return entry
+
+
+def get_series(db, WellbeingData, WellbeingAggregate, user_id):
+    """
+    The user's series as analysis_engine.load_series() returns it: (datetime64[us] vector,
+    (n_rows, len(METRICS)) float matrix), both read-only, served from this worker's cache.
+    """
+    state = _series_state(db, WellbeingAggregate, user_id)
+    if state is None:
+        # No aggregate row yet, so nothing to key an entry on
+        _, timestamps, values = query_series(db, WellbeingData, user_id)
+        return timestamps.view('datetime64[us]'), values
+
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is not None and (entry.version, entry.updated_at) == (state.data_version, state.updated_at):
+            _entries.move_to_end(user_id)
+            stats["hits"] += 1
+            return entry.view()
+        cached = entry and (entry.version, entry.count, entry.max_id)
+
+    if cached and cached[0] < state.data_version and (state.series_version or 0) <= cached[0]:
+        ids, timestamps, values = query_series(db, WellbeingData, user_id, after_id=cached[2])
+        if cached[1] + len(ids) == state.count:
+            with _lock:
+                # Unless another thread moved the entry on while the tail was being read
+                if _entries.get(user_id) is entry and (entry.version, entry.count, entry.max_id) == cached:
+                    entry = _merge_tail(entry, state, ids, timestamps, values)
+                    _store(user_id, entry)
+                    stats["tail_refreshes"] += 1
+                    return entry.view()
+
+    ids, timestamps, values = query_series(db, WellbeingData, user_id)
+    entry = _build_entry(state, ids, timestamps, values)
+    with _lock:
+        _store(user_id, entry)
+        stats["misses"] += 1
+    return entry.view()
+
+
+def append_checkin(user_id, previous_version, version, updated_at, count, log_id, timestamp, row):
+    """
+    Appends one check-in this worker just committed, if the cached entry is exactly the
+    version before it; otherwise the next read refreshes. `row` is in METRICS order.
+    """
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is None or entry.version != previous_version or entry.count + 1 != count:
+            return
+        if entry.rows and np.datetime64(timestamp, 'us').astype(np.int64) < entry.timestamps[entry.rows - 1]:
+            return  # out of order; leave it to the refresh path
+        state = SimpleNamespace(data_version=version, updated_at=updated_at, count=count)
+        entry = _merge_tail(entry, state, np.array([log_id]), np.array([np.datetime64(timestamp, 'us').astype(np.int64)]),
+                            np.array([row], dtype=float))
+        _store(user_id, entry)
+        stats["appends"] += 1
+
+
+def invalidate(user_id=None):
+    """Drops one user's entry, or all of them."""
+    with _lock:
+        if user_id is None:
+            _entries.clear()
+            _size["bytes"] = 0
+        else:
+            entry = _entries.pop(user_id, None)
+            if entry is not None:
+                _size["bytes"] -= entry.nbytes
+
+
+def cache_info():
+    with _lock:
+        return {"entries": len(_entries), "bytes": _size["bytes"], "budget_bytes": SERIES_CACHE_BYTES, **stats}
@@ -0,0 +1,233 @@
+# shards.py
+# Optional sharded storage. With WELLBEING_SHARDS=N the per-user tables (SHARDED_TABLES)
+# live in N SQLite files next to the main database (wellbeing.shard0.db, ...), so check-ins
+# for users on different shards commit in parallel instead of queueing for one file's
+# write lock. The user table, the interned quotes/weather and the other global tables stay
+# in the main database, which every shard connection ATTACHes: queries that join the two
+# run unchanged, and unqualified names resolve to the shard's tables first.
+#
+# Each user lives on one shard, recorded in shard_map (placed by a hash of the user id on
+# first use). A request works on its caller's shard (init_sharding); jobs spanning users
+# visit every shard with each_shard() or query them all at once with fan_out().
+# rebalance_shards.py moves users onto the shard their hash now gives, e.g. after
+# changing WELLBEING_SHARDS or to shard an existing database.
+
+import glob
+import os
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+import metrics
+from migrations import SHARD_MIGRATIONS, migrate
+from sqlite_profile import install_sqlite_profile
+
+# --- Configuration ---
+SHARD_COUNT = int(os.environ.get("WELLBEING_SHARDS", "0"))   # 0 = everything in the main database
+MAIN_SCHEMA = "main_db"     # name the main database is ATTACHed under on shard connections
+# --- End Configuration ---
+
+# Tables keyed by user; everything else is global
+SHARDED_TABLES = ("wellbeing_data", "wellbeing_aggregate", "daily_rollup", "analysis_report", "pending_enrichment")
+
+_current = ContextVar("wellbeing_shard", default=None)
+_engines = {}        # shard -> Engine, per process
+_assignments = {}    # user_id -> shard, per process (rebalancing runs with the servers stopped)
+_lock = threading.Lock()
+
+
+class ShardingError(RuntimeError):
+    """A per-user table was used with sharding on but no shard selected."""
+
+
+def placement(user_id, shard_count=None):
+    """The shard a user's id hashes to (stable across processes and restarts)."""
+    return zlib.crc32(str(user_id).encode()) % (shard_count or SHARD_COUNT)
+
+
+def shard_ids():
+    """Every shard, or [None] (the main database) when sharding is off."""
+    return list(range(SHARD_COUNT)) if SHARD_COUNT else [None]
+
+
+def shard_url(main_url, shard):
+    """sqlite:///dir/wellbeing.db -> sqlite:///dir/wellbeing.shard<N>.db"""
+    if main_url.get_backend_name() != "sqlite" or main_url.database in (None, "", ":memory:"):
+        raise ValueError("Sharding needs a file-backed SQLite database")
+    root, ext = os.path.splitext(main_url.database)
+    return main_url.set(database=f"{root}.shard{shard}{ext}")
+
+
+def existing_shards(main_url):
+    """Shard numbers that have a file on disk, including ones beyond the current SHARD_COUNT."""
+    root, ext = os.path.splitext(main_url.database)
+    pattern = re.compile(re.escape(os.path.basename(root)) + r"\.shard(\d+)" + re.escape(ext))
+    found = []
+    for path in glob.glob(f"{glob.escape(root)}.shard*{ext}"):
+        match = pattern.fullmatch(os.path.basename(path))
+        if match:
+            found.append(int(match.group(1)))
+    return sorted(found)
+
+
+def create_shard_schema(url):
+    """Creates or migrates the per-user tables in a shard file (migrations.SHARD_MIGRATIONS; safe to race)."""
+    # A plain connection: with the main database attached, IF NOT EXISTS would see its tables
+    engine = create_engine(url)
+    try:
+        migrate(engine, migrations=SHARD_MIGRATIONS)
+    except OperationalError:
+        # Another process migrated it at the same time (SQLite refused one writer); its steps are now recorded
+        migrate(engine, migrations=SHARD_MIGRATIONS)
+    finally:
+        engine.dispose()
+
+
+def open_shard(main_url, shard):
+    """An engine on one shard file (created if new), with the main database ATTACHed."""
+    url = shard_url(main_url, shard)
+    create_shard_schema(url)
+    engine = create_engine(url)
+    install_sqlite_profile(engine)
+
+    @event.listens_for(engine, "connect")
+    def attach_main(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"ATTACH DATABASE ? AS {MAIN_SCHEMA}", (main_url.database,))
+        cursor.close()
+
+    if metrics.METRICS_ENABLED:
+        metrics.instrument_engine(engine)
+    return engine
+
+
+def get_engine(db, shard):
+    """This process's engine for `shard`, opened on first use."""
+    engine = _engines.get(shard)
+    if engine is None:
+        with _lock:
+            engine = _engines.get(shard)
+            if engine is None:
+                engine = _engines[shard] = open_shard(db.engine.url, shard)
+    return engine
+
+
+def shard_database_urls(db):
+    """Connection strings of every shard file (created if new), for jobs that open their own engines."""
+    return [get_engine(db, shard).url.render_as_string(hide_password=False) for shard in range(SHARD_COUNT)]
+
+
+def dispose_engines(close=True):
+    """Drops pooled shard connections (close=False after a fork: the parent still owns them)."""
+    for engine in list(_engines.values()):
+        engine.dispose(close=close)
+
+
+class ShardedSession(Session):
+    """Sends all of a session's work to the selected shard's engine while one is selected."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        shard = current_shard()
+        if bind is None and shard is not None:
+            return get_engine(self._db, shard)
+        if bind is None and SHARD_COUNT and getattr(getattr(mapper, "local_table", None), "name", None) in SHARDED_TABLES:
+            raise ShardingError(f"{mapper.local_table.name} is sharded; select a shard first (see shards.py)")
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def shard_of(db, user_id):
+    """The user's shard (placed by hash and recorded on first use), or None when sharding is off."""
+    if not SHARD_COUNT:
+        return None
+    shard = _assignments.get(user_id)
+    if shard is None:
+        params = {"user_id": user_id, "shard": placement(user_id), "assigned_at": datetime.utcnow()}
+        with db.engine.begin() as conn:
+            shard = conn.execute(text("SELECT shard FROM shard_map WHERE user_id = :user_id"), params).scalar()
+            if shard is None:
+                conn.execute(text(
+                    "INSERT OR IGNORE INTO shard_map (user_id, shard, assigned_at) VALUES (:user_id, :shard, :assigned_at)"
+                ), params)
+                shard = conn.execute(text("SELECT shard FROM shard_map WHERE user_id = :user_id"), params).scalar()
+        _assignments[user_id] = shard
+    return shard
+
+
+def current_shard():
+    """The shard selected with use_shard(), else the one init_sharding() picked for the request."""
+    shard = _current.get()
+    if shard is None and has_app_context():
+        shard = g.get("shard")
+    return shard
+
+
+@contextmanager
+def use_shard(shard):
+    """Routes the session's work in this block to `shard` (None: the main database)."""
+    token = _current.set(shard)
+    try:
+        yield shard
+    finally:
+        _current.reset(token)
+
+
+def user_shard(db, user_id):
+    """use_shard() for the shard `user_id` lives on."""
+    return use_shard(shard_of(db, user_id))
+
+
+def each_shard():
+    """Yields every shard id in turn with that shard selected (just None when sharding is off)."""
+    for shard in shard_ids():
+        with use_shard(shard):
+            yield shard
+
+
+def fan_out(func, *args):
+    """
+    Runs func(*args) against every shard at once, each in its own thread with its own app
+    context and session, and returns the results in shard order.
+    """
+    shards = shard_ids()
+    if len(shards) == 1:
+        with use_shard(shards[0]):
+            return [func(*args)]
+    app = current_app._get_current_object()
+
+    def run(shard):
+        with app.app_context(), use_shard(shard):
+            return func(*args)
+
+    with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="shard") as pool:
+        return list(pool.map(run, shards))
+
+
+def init_sharding(app, db):
+    """Registers the hook that selects the caller's shard for the request (after identity.py's)."""
+    if not SHARD_COUNT:
+        return
+
+    # Kept on g rather than in the context variable so streamed responses still see it
+    @app.before_request
+    def select_user_shard():
+        user = g.get("current_user")
+        if user is not None:
+            g.shard = shard_of(db, user.id)
+
+    with app.app_context():
+        try:
+            with db.engine.connect() as conn:
+                leftover = conn.exec_driver_sql("SELECT 1 FROM wellbeing_data LIMIT 1").first()
+        except OperationalError:
+            leftover = None  # not migrated yet
+    if leftover:
+        print("[Shards] The main database still holds check-ins; run python rebalance_shards.py to move them onto the shards.")
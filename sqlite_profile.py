@@ -0,0 +1,64 @@
+# sqlite_profile.py
+# Connection-level PRAGMA profiles for the SQLite engine.
+
+import os
+from sqlalchemy import event
+
+# --- Configuration ---
+# Pick a profile with WELLBEING_SQLITE_PROFILE and override single pragmas with
+# WELLBEING_SQLITE_<PRAGMA>, e.g. WELLBEING_SQLITE_MMAP_SIZE=0.
+SQLITE_PROFILES = {
+    # SQLite's own defaults: rollback journal, one writer blocks all readers
+    "default": {},
+    # WAL lets readers run alongside the single writer; NORMAL sync is safe in WAL mode
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,           # ms to wait for the writer lock instead of failing
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,       # negative = KiB, i.e. 64 MiB page cache
+        "temp_store": "MEMORY",
+    },
+    # Same concurrency, but fsync on every commit
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+}
+SQLITE_PROFILE = os.environ.get("WELLBEING_SQLITE_PROFILE", "performance")
+# --- End Configuration ---
+
+PRAGMA_ORDER = ("busy_timeout", "journal_mode", "synchronous", "mmap_size", "cache_size", "temp_store")
+
+
+def sqlite_pragmas(profile=None):
+    """Returns the PRAGMA settings for a profile, with any environment overrides applied."""
+    profile = profile or SQLITE_PROFILE
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLite profile {profile!r}; choose from {', '.join(SQLITE_PROFILES)}")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    for name in PRAGMA_ORDER:
+        override = os.environ.get(f"WELLBEING_SQLITE_{name.upper()}")
+        if override is not None:
+            pragmas[name] = override
+    return pragmas
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    """Runs the PRAGMA statements on a raw sqlite3 connection."""
+    cursor = dbapi_connection.cursor()
+    for name in sorted(pragmas, key=lambda n: PRAGMA_ORDER.index(n) if n in PRAGMA_ORDER else len(PRAGMA_ORDER)):
+        cursor.execute(f"PRAGMA {name} = {pragmas[name]}")
+    cursor.close()
+
+
+def install_sqlite_profile(engine, pragmas=None):
+    """Applies the profile to every new connection the engine opens (no-op for other databases)."""
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
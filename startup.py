@@ -0,0 +1,226 @@
+# startup.py
+# Cold-start helpers: lazy imports for the heavy scientific stack, a warm-up that
+# loads it ahead of the first request (in the gunicorn master when preloading, so
+# forked workers share it copy-on-write), and an import-time/memory profile.
+# Usage: python startup.py --profile-startup [--warm] [--top N] [--json]
+#        (or: python app.py --profile-startup)
+
+import argparse
+import importlib
+import importlib.abc
+import json
+import os
+import sys
+import threading
+import time
+
+# --- Configuration ---
+PRELOAD = os.environ.get("WELLBEING_PRELOAD", "1") == "1"     # gunicorn preload_app
+WARM_UP = os.environ.get("WELLBEING_WARM_UP", "1") == "1"     # load the heavy stack before serving
+PROFILE_TARGET = "app"
+# --- End Configuration ---
+
+_lazy_lock = threading.Lock()
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access (thread-safe)."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            with _lazy_lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+                module = self._module
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    """Returns the module if it is already imported, otherwise a LazyModule for it."""
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def warm_up():
+    """
+    Imports the lazily-loaded stack and runs each numeric path once on a tiny input, so
+    neither the import nor NumPy's first-call setup lands on a user's request.
+    """
+    started = time.perf_counter()
+    import numpy as np
+    from analysis_engine import compute_stats
+    from downsample import lttb, minmax_buckets
+    from rollups import ROLLUP_FIELDS, stats_from_sums
+
+    sample = np.arange(12, dtype=float).reshape(3, 4)
+    compute_stats(sample)
+    stats_from_sums(np.ones((1, len(ROLLUP_FIELDS))))
+    lttb(sample[:, 0], sample[:, 1], 3)
+    minmax_buckets(sample[:, 0], sample[:, 1], 2)
+    print(f"[Startup] Warmed up in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+# --- Startup profile ---
+
+def _rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # peak, not current
+
+
+class _TimedLoader(importlib.abc.Loader):
+    def __init__(self, loader, profiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._profiler.enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler.leave(module.__name__)
+
+
+class ImportProfiler(importlib.abc.MetaPathFinder):
+    """Records self/cumulative import time and resident memory growth for every module imported."""
+
+    def __init__(self):
+        self.records = []
+        self._stack = []
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+    def enter(self):
+        self._stack.append([time.perf_counter(), _rss_kb(), 0.0, 0])
+
+    def leave(self, name):
+        started, rss_before, child_seconds, child_kb = self._stack.pop()
+        cumulative = time.perf_counter() - started
+        grown = max(_rss_kb() - rss_before, 0)
+        self.records.append({
+            "module": name,
+            "self_ms": round((cumulative - child_seconds) * 1000, 2),
+            "cumulative_ms": round(cumulative * 1000, 2),
+            "self_kb": max(grown - child_kb, 0),
+            "cumulative_kb": grown,
+        })
+        if self._stack:
+            self._stack[-1][2] += cumulative
+            self._stack[-1][3] += grown
+
+    def __enter__(self):
+        sys.meta_path.insert(0, self)
+        return self
+
+    def __exit__(self, *exc):
+        sys.meta_path.remove(self)
+
+
+def profile_startup(target=PROFILE_TARGET, warm=False):
+    """
+    Imports `target` in this (fresh) interpreter under the profiler. Returns a report with
+    per-module and per-package totals; with `warm`, warm_up() is included and timed too.
+    """
+    rss_start = _rss_kb()
+    started = time.perf_counter()
+    with ImportProfiler() as profiler:
+        importlib.import_module(target)
+        import_seconds = time.perf_counter() - started
+        if warm:
+            warm_started = time.perf_counter()
+            warm_up()
+            warm_seconds = time.perf_counter() - warm_started
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    first_party = {
+        name for name, module in sys.modules.items()
+        if os.path.dirname(os.path.abspath(getattr(module, "__file__", None) or "/")) == root
+    }
+    packages = {}
+    for record in profiler.records:
+        package = record["module"].split(".")[0]
+        totals = packages.setdefault(package, {"package": package, "modules": 0, "self_ms": 0.0, "self_kb": 0})
+        totals["modules"] += 1
+        totals["self_ms"] = round(totals["self_ms"] + record["self_ms"], 2)
+        totals["self_kb"] += record["self_kb"]
+
+    report = {
+        "target": target,
+        "import_ms": round(import_seconds * 1000, 1),
+        "rss_start_kb": rss_start,
+        "rss_end_kb": _rss_kb(),
+        "modules_imported": len(profiler.records),
+        "heavy_loaded": sorted(name for name in ("numpy", "pandas", "matplotlib") if name in sys.modules),
+        "first_party": sorted(
+            (record for record in profiler.records if record["module"] in first_party),
+            key=lambda record: -record["cumulative_ms"],
+        ),
+        "packages": sorted(packages.values(), key=lambda totals: -totals["self_ms"]),
+    }
+    if warm:
+        report["warm_up_ms"] = round(warm_seconds * 1000, 1)
+    return report
+
+
+def print_report(report, top=15):
+    print(f"[Startup] import {report['target']}: {report['import_ms']} ms, "
+          f"{report['modules_imported']} modules, RSS {report['rss_start_kb'] // 1024} -> {report['rss_end_kb'] // 1024} MiB")
+    if "warm_up_ms" in report:
+        print(f"[Startup] warm_up(): {report['warm_up_ms']} ms")
+    print(f"[Startup] heavy packages loaded: {', '.join(report['heavy_loaded']) or 'none'}")
+    print(f"\n{'package':<28}{'modules':>8}{'self ms':>10}{'self KiB':>10}")
+    for totals in report["packages"][:top]:
+        print(f"{totals['package']:<28}{totals['modules']:>8}{totals['self_ms']:>10.1f}{totals['self_kb']:>10}")
+    print(f"\n{'first-party module':<28}{'cum ms':>8}{'self ms':>10}{'cum KiB':>10}")
+    for record in report["first_party"]:
+        print(f"{record['module']:<28}{record['cumulative_ms']:>8.1f}{record['self_ms']:>10.1f}{record['cumulative_kb']:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the API's cold start.")
+    parser.add_argument("--profile-startup", action="store_true", help="import the app and report per-module time and memory")
+    parser.add_argument("--target", default=PROFILE_TARGET, help="module to import (default: app)")
+    parser.add_argument("--warm", action="store_true", help="also run and time warm_up()")
+    parser.add_argument("--top", type=int, default=15, help="packages to list")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    if not args.profile_startup:
+        parser.print_help()
+        return 2
+
+    report = profile_startup(args.target, warm=args.warm)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, top=args.top)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+# tests/conftest.py
+# The app runs against a throwaway SQLite file, migrated once per session and emptied
+# between tests. Upstream URLs point at a closed local port; tests that need upstream data
+# stub the fetch functions (or start benchmarks/stub_apis.py).
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+WORKDIR = tempfile.mkdtemp(prefix="wellbeing-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(WORKDIR, 'wellbeing.db')}",
+    "WELLBEING_SHARDS": "0",
+    "WELLBEING_AUTH_SECRET": "test-secret",
+    "WELLBEING_METRICS": "0",
+    "WELLBEING_CACHE_BACKEND": "memory",
+    "WELLBEING_CHART_DIR": os.path.join(WORKDIR, "charts"),
+    "WELLBEING_QUOTE_API_URL": "http://127.0.0.1:9/quote",
+    "WELLBEING_WEATHER_API_URL": "http://127.0.0.1:9/weather",
+    "WELLBEING_WEATHER_HISTORY_URL": "http://127.0.0.1:9/archive",
+})
+
+import app as app_module  # noqa: E402
+from app import app, db, User  # noqa: E402
+from migrations import migrate  # noqa: E402
+
+with app.app_context():
+    migrate(db.engine)
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    """Empties every table, in-process cache and circuit breaker, and keeps the enrichment thread from starting."""
+    import breaker
+    import cache
+    import identity
+    import report_cache
+    import series_cache
+    import weather_history
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            tables = conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+            ).scalars().all()
+            for table in tables:
+                conn.exec_driver_sql(f'DELETE FROM "{table}"')
+    cache.get_backend().clear()
+    identity.invalidate()
+    report_cache.clear()
+    series_cache.invalidate()
+    weather_history.invalidate()
+    monkeypatch.setattr(breaker, "_breakers", {})
+    monkeypatch.setattr(app_module, "ensure_worker", lambda *args: None)
+    yield
+
+
+@pytest.fixture
+def app_context():
+    with app.app_context():
+        yield
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user():
+    def make(username="alice", tier="free"):
+        with app.app_context():
+            user = User(username=username, tier=tier)
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make
+
+
+@pytest.fixture
+def auth():
+    """Headers that identify `username` with a signed bearer token."""
+    from identity import issue_token
+
+    def headers(username="alice", **extra):
+        return dict(extra, Authorization=f"Bearer {issue_token(username)}")
+    return headers
@@ -0,0 +1,99 @@
+import json
+
+import cohort_job
+from aggregates import bump_data_version, mark_rewritten, rebuild_aggregates
+from app import app, db, store_checkin, AnalysisReport, WellbeingAggregate, WellbeingData
+from main import get_user_stats
+
+QUOTE = {"quote": "Happiness depends upon ourselves.", "author": "Aristotle"}
+
+
+def seed_checkins(user_id, moods=(2, 3, 4, 5)):
+    for mood in moods:
+        store_checkin(user_id, {"mood": mood, "sleep_hours": 4.0 + mood, "exercise_minutes": 10 * mood},
+                      QUOTE, {"temp": 10.0 + mood})
+
+
+def stats(user_id):
+    return get_user_stats(user_id, db, WellbeingData, WellbeingAggregate, AnalysisReport)
+
+
+def store_report(user_id, marker, data_version):
+    db.session.merge(AnalysisReport(user_id=user_id, entries=4, data_version=data_version,
+                                    stats=json.dumps({"entries": 4, "marker": marker})))
+    db.session.commit()
+
+
+def test_current_report_is_served(app_context, make_user):
+    user_id = make_user()
+    seed_checkins(user_id)
+    store_report(user_id, "precomputed", db.session.get(WellbeingAggregate, user_id).data_version)
+
+    assert stats(user_id)["marker"] == "precomputed"
+
+
+def test_report_is_stale_after_a_new_checkin(app_context, make_user):
+    user_id = make_user()
+    seed_checkins(user_id)
+    store_report(user_id, "precomputed", db.session.get(WellbeingAggregate, user_id).data_version)
+    seed_checkins(user_id, moods=(1,))
+
+    result = stats(user_id)
+    assert "marker" not in result and result["entries"] == 5
+
+
+def test_report_is_stale_after_rows_are_rewritten_in_place(app_context, make_user):
+    user_id = make_user()
+    seed_checkins(user_id)
+    store_report(user_id, "precomputed", db.session.get(WellbeingAggregate, user_id).data_version)
+
+    # What write-behind enrichment does: same count, new values
+    db.session.execute(db.update(WellbeingData).values(temperature=30.0))
+    aggregate = db.session.get(WellbeingAggregate, user_id)
+    bump_data_version(aggregate)
+    mark_rewritten(aggregate)
+    db.session.commit()
+
+    result = stats(user_id)
+    assert "marker" not in result
+    assert result["entries"] == 4
+
+
+def test_report_is_stale_after_a_rebuild(app_context, make_user):
+    user_id = make_user()
+    seed_checkins(user_id)
+    store_report(user_id, "precomputed", db.session.get(WellbeingAggregate, user_id).data_version)
+
+    rebuild_aggregates(db, WellbeingData, WellbeingAggregate, user_id=user_id)
+
+    assert "marker" not in stats(user_id)
+
+
+def test_cohort_job_reports_carry_the_data_version(app_context, make_user):
+    user_id = make_user()
+    seed_checkins(user_id)
+    version = db.session.get(WellbeingAggregate, user_id).data_version
+
+    summary = cohort_job.run_job(app.config["SQLALCHEMY_DATABASE_URI"], workers=1)
+
+    assert summary["users"] == 1
+    db.session.expire_all()
+    report = db.session.get(AnalysisReport, user_id)
+    assert (report.entries, report.data_version) == (4, version)
+    assert stats(user_id) == json.loads(report.stats)
+
+
+def test_current_mood_parameter_is_validated(client, make_user, auth):
+    user_id = make_user("alice")
+    with app.app_context():
+        seed_checkins(user_id, moods=(2, 3, 4))
+
+    def today_mood(query):
+        response = client.get(f"/api/analysis{query}", headers=auth())
+        report = response.get_json().get("report", {})
+        return response.status_code, report.get("mood_summary", {}).get("today_mood")
+
+    assert today_mood("") == (200, 4)   # the latest check-in
+    assert today_mood("?current_mood=1") == (200, 1)
+    for value in ("0", "6", "abc"):
+        assert today_mood(f"?current_mood={value}") == (400, None)
@@ -0,0 +1,77 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+import charts
+
+OPTIONS = {"width": 12, "panel_height": 4, "dpi": 100, "max_points": 1000}
+
+
+class FakePool:
+    """Records submissions; renders finish when the test resolves their futures."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.submitted.append(future)
+        return future
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(charts, "CHART_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(charts, "_get_pool", lambda: pool)
+    monkeypatch.setattr(charts, "_jobs", {})
+    monkeypatch.setattr(charts, "_failures", {})
+    return pool
+
+
+def test_slow_load_does_not_block_other_requests(pool):
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_load():
+        loading.set()
+        release.wait(5)
+        return [], []
+
+    slow = threading.Thread(target=charts.request_chart, args=(1, 1, "png", OPTIONS, slow_load))
+    slow.start()
+    try:
+        assert loading.wait(5)
+        # Another user's chart is queued while the first load is still running
+        assert charts.request_chart(2, 1, "png", OPTIONS, lambda: ([], []))[0] == "pending"
+        assert len(pool.submitted) == 1
+    finally:
+        release.set()
+        slow.join(5)
+    assert len(pool.submitted) == 2
+
+
+def test_one_render_per_key(pool):
+    loads = []
+
+    def load():
+        loads.append(True)
+        return [], []
+
+    first = charts.request_chart(1, 1, "png", OPTIONS, load)
+    second = charts.request_chart(1, 1, "png", OPTIONS, load)
+
+    assert first == second == ("pending", charts.chart_key(1, 1, "png", OPTIONS))
+    assert len(pool.submitted) == 1 and len(loads) == 1
+
+    pool.submitted[0].set_result(b"image")
+    assert charts.request_chart(1, 1, "png", OPTIONS, load)[0] == "ready"
+
+
+def test_render_queued_during_a_load_is_not_submitted_twice(pool):
+    def load_while_another_caller_queues():
+        charts.request_chart(1, 1, "png", OPTIONS, lambda: ([], []))
+        return [], []
+
+    assert charts.request_chart(1, 1, "png", OPTIONS, load_while_another_caller_queues)[0] == "pending"
+    assert len(pool.submitted) == 1
@@ -0,0 +1,154 @@
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import enrichment
+from app import (db, store_checkin, DailyRollup, DailyWeather, PendingEnrichment, Quote, WeatherObservation,
+                 WellbeingAggregate, WellbeingData)
+from ingest import DEFAULT_CITY
+from reference_data import reference_ids
+
+CHECKIN = {"mood": 4, "sleep_hours": 7.0, "exercise_done": True, "exercise_minutes": 30}
+QUOTE = {"quote": "The best way out is always through.", "author": "Robert Frost"}
+WEATHER = {"temp": 14.5, "description": "Overcast"}
+
+
+def process():
+    return enrichment.process_pending(db, WellbeingData, WellbeingAggregate, DailyRollup, PendingEnrichment,
+                                      Quote, WeatherObservation, DailyWeather)
+
+
+def stub_upstreams(monkeypatch, result):
+    calls = []
+
+    def fetch(city, budget=None):
+        calls.append(city)
+        return result
+    monkeypatch.setattr(enrichment, "fetch_enrichment", fetch)
+    return calls
+
+
+def test_failed_lookup_queues_checkin(app_context, make_user):
+    user_id = make_user()
+    payload, status = store_checkin(user_id, CHECKIN, None, None)
+    assert status == 202
+    assert db.session.execute(db.select(db.func.count(PendingEnrichment.id))).scalar() == 1
+
+
+def test_current_bucket_is_enriched(app_context, make_user, monkeypatch):
+    user_id = make_user()
+    store_checkin(user_id, CHECKIN, None, None)
+    version = db.session.get(WellbeingAggregate, user_id).data_version
+    stub_upstreams(monkeypatch, (QUOTE, WEATHER))
+
+    assert process() == 1
+
+    row = db.session.execute(db.select(WellbeingData)).scalar_one()
+    assert row.temperature == 14.5
+    assert row.quote_id is not None and row.weather_id is not None
+    aggregate = db.session.get(WellbeingAggregate, user_id)
+    assert aggregate.temp_count == 1
+    assert aggregate.data_version > version
+    assert db.session.execute(db.select(db.func.count(PendingEnrichment.id))).scalar() == 0
+
+
+def test_upstream_failure_leaves_rows_queued(app_context, make_user, monkeypatch):
+    user_id = make_user()
+    store_checkin(user_id, CHECKIN, None, None)
+    stub_upstreams(monkeypatch, (QUOTE, None))
+
+    assert process() == 0
+    assert db.session.execute(db.select(db.func.count(PendingEnrichment.id))).scalar() == 1
+
+
+def checkin_at(user_id, timestamp):
+    """A queued check-in moved back to `timestamp` (and its bucket)."""
+    store_checkin(user_id, CHECKIN, None, None)
+    row = db.session.execute(db.select(WellbeingData)).scalars().all()[-1]
+    pending = db.session.execute(db.select(PendingEnrichment).where(PendingEnrichment.log_id == row.id)).scalar_one()
+    row.timestamp, pending.bucket = timestamp, enrichment.time_bucket(timestamp)
+    db.session.commit()
+    return row.id
+
+
+def queued():
+    return db.session.execute(db.select(db.func.count(PendingEnrichment.id))).scalar()
+
+
+def test_earlier_bucket_is_enriched_from_stored_weather(app_context, make_user, monkeypatch):
+    user_id = make_user()
+    quote_id, _ = reference_ids(db, Quote, WeatherObservation, datetime(2026, 1, 10, 8, 0), DEFAULT_CITY, 6.0,
+                                "Stored quote.", "Someone")
+    observation = db.session.execute(db.select(WeatherObservation)).scalar_one()
+    db.session.commit()
+    log_id = checkin_at(user_id, datetime(2026, 1, 10, 8, 50))
+    calls = stub_upstreams(monkeypatch, (QUOTE, WEATHER))
+
+    assert process() == 1
+
+    assert calls == []   # today's weather is never stamped on an earlier bucket
+    row = db.session.get(WellbeingData, log_id)
+    assert (row.temperature, row.quote_id, row.weather_id) == (6.0, quote_id, observation.id)
+    assert db.session.get(WellbeingAggregate, user_id).temp_count == 1
+    assert queued() == 0
+
+
+def test_earlier_bucket_falls_back_to_the_day_history(app_context, make_user, monkeypatch):
+    user_id = make_user()
+    db.session.add(DailyWeather(location=DEFAULT_CITY, day=date(2026, 1, 10), temp_min=2.0, temp_max=8.0, temp_mean=5.0))
+    db.session.commit()
+    log_id = checkin_at(user_id, datetime(2026, 1, 10, 8, 50))
+    stub_upstreams(monkeypatch, (QUOTE, WEATHER))
+
+    assert process() == 1
+
+    row = db.session.get(WellbeingData, log_id)
+    assert row.temperature == 5.0 and row.quote_id is None
+    observation = db.session.get(WeatherObservation, row.weather_id)
+    assert observation.location == DEFAULT_CITY and observation.temperature is None   # not filed as an hourly reading
+    assert queued() == 0
+
+
+def test_earlier_bucket_of_today_takes_the_live_quote_only(app_context, make_user, monkeypatch):
+    user_id = make_user()
+    earlier = enrichment.time_bucket(datetime.utcnow()) - timedelta(seconds=1)
+    if earlier.date() != datetime.utcnow().date():
+        pytest.skip("the first bucket of the day has no earlier bucket on the same day")
+    log_id = checkin_at(user_id, earlier)
+    stub_upstreams(monkeypatch, (None, None))
+
+    assert process() == 0
+    assert queued() == 1   # the quote lookup failed: retried on the next poll
+
+    stub_upstreams(monkeypatch, (QUOTE, WEATHER))
+    assert process() == 1
+
+    row = db.session.get(WellbeingData, log_id)
+    assert row.temperature is None and db.session.get(Quote, row.quote_id).text == QUOTE["quote"]
+    assert queued() == 0
+
+
+def test_earlier_bucket_with_nothing_stored_leaves_the_queue(app_context, make_user, monkeypatch):
+    user_id = make_user()
+    log_id = checkin_at(user_id, datetime(2026, 1, 10, 8, 50))
+    expired = enrichment.worker_stats["expired"]
+    stub_upstreams(monkeypatch, (QUOTE, WEATHER))
+
+    assert process() == 0
+
+    row = db.session.get(WellbeingData, log_id)
+    assert row.temperature is None and row.quote_id is None and row.weather_id is None
+    assert queued() == 0 and enrichment.worker_stats["expired"] == expired + 1
+
+
+def test_time_bucket_floors_the_naive_timestamp(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    try:
+        # 02:20 does not exist in New York that night, but is an ordinary UTC time
+        assert enrichment.time_bucket(datetime(2026, 3, 8, 2, 20, 59, 999)) == datetime(2026, 3, 8, 2, 15)
+        assert enrichment.time_bucket(datetime(2026, 3, 8, 2, 30)) == datetime(2026, 3, 8, 2, 30)
+    finally:
+        monkeypatch.delenv("TZ")
+        time.tzset()
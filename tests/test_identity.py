@@ -0,0 +1,58 @@
+import pytest
+
+import identity
+from app import app, store_checkin
+
+QUOTE = {"quote": "Happiness depends upon ourselves.", "author": "Aristotle"}
+
+
+@pytest.fixture
+def users(make_user):
+    """alice has one check-in; the default user has none."""
+    alice = make_user("alice", tier="premium")
+    make_user(identity.DEFAULT_USERNAME)
+    with app.app_context():
+        store_checkin(alice, {"mood": 4, "sleep_hours": 7.0, "exercise_minutes": 20}, QUOTE, {"temp": 11.0})
+    return alice
+
+
+def logged_entries(client, headers):
+    response = client.get("/api/logs", headers=headers)
+    return response.status_code, len(response.get_json().get("data", []))
+
+
+def test_signed_token_identifies_the_user(client, users, auth):
+    assert logged_entries(client, auth("alice")) == (200, 1)
+
+
+def test_no_credentials_act_as_the_default_user(client, users):
+    assert logged_entries(client, {}) == (200, 0)
+
+
+def test_identity_headers_are_ignored_by_default(client, users, monkeypatch):
+    monkeypatch.setattr(identity, "TRUST_IDENTITY_HEADERS", False)
+
+    assert logged_entries(client, {"X-User": "alice"}) == (200, 0)
+    assert logged_entries(client, {"Authorization": "Bearer alice"})[0] == 401
+
+
+def test_tampered_and_expired_tokens_are_rejected(client, users, auth, monkeypatch):
+    token = auth("alice")["Authorization"]
+    assert logged_entries(client, {"Authorization": token[:-2] + "xx"})[0] == 401
+
+    monkeypatch.setattr(identity, "TOKEN_MAX_AGE", -1)
+    assert logged_entries(client, {"Authorization": token})[0] == 401
+
+
+def test_token_signed_with_another_secret_is_rejected(client, users, auth, monkeypatch):
+    token = auth("alice")["Authorization"]
+    monkeypatch.setattr(identity, "AUTH_SECRET", "rotated")
+
+    assert logged_entries(client, {"Authorization": token})[0] == 401
+
+
+def test_trusted_identity_headers_for_local_development(client, users, monkeypatch):
+    monkeypatch.setattr(identity, "TRUST_IDENTITY_HEADERS", True)
+
+    assert logged_entries(client, {"X-User": "alice"}) == (200, 1)
+    assert logged_entries(client, {"Authorization": "Bearer alice"}) == (200, 1)
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import ingest
+from app import db, WeatherObservation, WellbeingAggregate, WellbeingData
+
+QUOTE = {"quote": "Happiness depends upon ourselves.", "author": "Aristotle"}
+WEATHER = {"temp": 9.5, "description": "Rain"}
+
+
+def checkin(timestamp=None, mood=3):
+    row = {"mood": mood, "sleep_hours": 6.5, "exercise_done": False, "exercise_minutes": 0}
+    if timestamp is not None:
+        row["timestamp"] = timestamp.isoformat()
+    return row
+
+
+def test_batch_enriches_current_rows_and_leaves_backdated_rows_unreferenced(client, make_user, auth, monkeypatch):
+    user_id = make_user("alice")
+    monkeypatch.setattr(ingest, "fetch_enrichment", lambda city, budget=None: (QUOTE, WEATHER))
+    backdated = datetime.utcnow() - timedelta(days=3)
+
+    response = client.post("/api/checkin/batch", json=[checkin(), checkin(backdated, mood=5)],
+                           headers=auth())
+
+    assert response.status_code == 201
+    assert response.get_json()["inserted"] == 2
+    with client.application.app_context():
+        rows = db.session.execute(db.select(WellbeingData).order_by(WellbeingData.timestamp)).scalars().all()
+        assert [row.temperature for row in rows] == [None, 9.5]
+        assert rows[0].weather_id is None and rows[0].quote_id is None
+        observations = db.session.execute(db.select(WeatherObservation)).scalars().all()
+        assert [observation.temperature for observation in observations] == [9.5]
+        assert db.session.get(WellbeingAggregate, user_id).count == 2
+
+
+def test_batch_reports_invalid_rows(client, make_user, auth, monkeypatch):
+    make_user("alice")
+    monkeypatch.setattr(ingest, "fetch_enrichment", lambda city, budget=None: (None, None))
+
+    response = client.post("/api/checkin/batch", json=[checkin(), {"mood": 2}], headers=auth())
+
+    assert response.status_code == 207
+    body = response.get_json()
+    assert body["inserted"] == 1 and body["errors"][0]["row"] == 1
+
+
+def test_batch_with_malformed_json_is_a_bad_request(client, make_user, auth):
+    make_user("alice")
+
+    response = client.post("/api/checkin/batch", data="[{\"mood\": 3,", content_type="application/json",
+                           headers=auth())
+
+    assert response.status_code == 400
+    assert response.get_json()["status"] == "error"
@@ -0,0 +1,30 @@
+import pytest
+from flask import Flask
+
+import metrics
+
+
+def test_profiler_entry_is_cleared_when_the_request_raises(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "PROFILE_DIR", str(tmp_path / "profiles"))
+    monkeypatch.setattr(metrics, "PROFILE_SLOW_MS", 60000.0)
+    monkeypatch.setattr(metrics, "instrument_engine", lambda engine: None)
+    monkeypatch.setattr(metrics, "instrument_sessions", lambda: None)
+
+    class NoDatabase:
+        engine = None
+
+    app = Flask(__name__)
+    app.config["PROPAGATE_EXCEPTIONS"] = True   # as in debug mode: no error response, so no after_request
+
+    @app.route("/fails")
+    def fails():
+        assert metrics._profiler["active"]
+        raise RuntimeError("unhandled")
+
+    metrics.init_metrics(app, NoDatabase())
+
+    with pytest.raises(RuntimeError):
+        app.test_client().get("/fails")
+    assert metrics._profiler["active"] == {}
@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+import migrations
+
+STEPS = [
+    (1, "table", ["CREATE TABLE IF NOT EXISTS item (id INTEGER NOT NULL, PRIMARY KEY (id))"]),
+    (2, "two columns", [
+        "ALTER TABLE item ADD COLUMN first INTEGER",
+        "ALTER TABLE item ADD COLUMN second INTEGER",
+    ]),
+]
+
+
+def columns(engine):
+    with engine.connect() as conn:
+        return [row[1] for row in conn.exec_driver_sql("PRAGMA table_info(item)")], migrations.current_version(conn)
+
+
+def test_interrupted_step_is_rolled_back_and_can_be_rerun(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'steps.db'}")
+    broken = STEPS[:1] + [(2, "two columns", STEPS[1][2][:1] + ["ALTER TABLE item ADD COLUMN broken NOPE("])]
+
+    with pytest.raises(OperationalError):
+        migrations.migrate(engine, migrations=broken)
+    assert columns(engine) == (["id"], 1)   # the first ALTER went with the failed step
+
+    assert migrations.migrate(engine, migrations=STEPS) == [2]
+    assert columns(engine) == (["id", "first", "second"], 2)
+    assert migrations.migrate(engine, migrations=STEPS) == []
+    engine.dispose()
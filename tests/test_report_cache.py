@@ -0,0 +1,107 @@
+import time
+from datetime import datetime, timedelta
+
+import cache
+import report_cache
+from app import app, store_checkin
+
+QUOTE = {"quote": "Happiness depends upon ourselves.", "author": "Aristotle"}
+
+
+def seed(user_id, moods=(2, 3, 4)):
+    with app.app_context():
+        for mood in moods:
+            store_checkin(user_id, {"mood": mood, "sleep_hours": 7.0, "exercise_minutes": 20}, QUOTE, {"temp": 11.0})
+
+
+def test_analysis_revalidates_with_etag_until_the_next_checkin(client, make_user, auth):
+    user_id = make_user("alice")
+    seed(user_id)
+    headers = auth()
+
+    first = client.get("/api/analysis", headers=headers)
+    assert first.status_code == 200 and first.headers["ETag"]
+
+    repeat = client.get("/api/analysis", headers=auth(**{"If-None-Match": first.headers["ETag"]}))
+    assert repeat.status_code == 304
+
+    seed(user_id, moods=(5,))
+    changed = client.get("/api/analysis", headers=auth(**{"If-None-Match": first.headers["ETag"]}))
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != first.headers["ETag"]
+
+
+def test_analysis_revalidates_with_if_modified_since(client, make_user, auth):
+    user_id = make_user("alice")
+    seed(user_id)
+    first = client.get("/api/analysis", headers=auth())
+
+    repeat = client.get("/api/analysis", headers=auth(**{"If-Modified-Since": first.headers["Last-Modified"]}))
+    assert repeat.status_code == 304
+
+
+def test_cached_body_is_served_for_the_same_version(client, make_user, auth):
+    user_id = make_user("alice")
+    seed(user_id)
+    client.get("/api/trends?points=10", headers=auth())
+    hits = report_cache.stats["hits"]
+
+    response = client.get("/api/trends?points=10", headers=auth())
+
+    assert response.status_code == 200 and response.get_json()["entries"] == 3
+    assert report_cache.stats["hits"] == hits + 1
+
+
+def test_windowed_report_is_not_modified_only_within_its_day():
+    updated_at = datetime(2026, 3, 1, 9, 30)
+    computed = []
+
+    def compute():
+        computed.append(True)
+        return {"status": "success"}, 200
+
+    yesterday = "Sun, 01 Mar 2026 23:00:00 GMT"   # after the last check-in, before today
+    with app.test_request_context(headers={"If-Modified-Since": yesterday}):
+        from flask import request
+        same_day = report_cache.conditional_report(request, "report:1:free:window=7d:2026-03-01", 1, updated_at,
+                                                   compute, not_before=datetime(2026, 3, 1))
+        next_day = report_cache.conditional_report(request, "report:1:free:window=7d:2026-03-02", 1, updated_at,
+                                                   compute, not_before=datetime(2026, 3, 2))
+
+    assert same_day.status_code == 304
+    assert next_day.status_code == 200 and computed == [True]
+    assert next_day.last_modified.replace(tzinfo=None) == datetime(2026, 3, 2)
+
+
+def test_shared_entries_expire_and_are_pruned(tmp_path, monkeypatch):
+    backend = cache.SQLiteBackend(str(tmp_path / "cache.db"))
+    monkeypatch.setattr(report_cache, "SHARE_REPORTS", True)
+    monkeypatch.setattr(report_cache, "get_backend", lambda: backend)
+    backend.set("weather:[\"London\"]", {"temp": 3}, 0)   # an upstream entry, never pruned here
+    backend.set(report_cache.SHARED_PREFIX + "report:old", {"version": 1, "body": "{}"},
+                time.time() - report_cache.SHARED_REPORT_TTL - 1)
+
+    # Expired entries are not served
+    assert report_cache._get("report:old", 1) is None
+
+    monkeypatch.setitem(report_cache._last_prune, "at", time.monotonic() - report_cache.SHARED_PRUNE_INTERVAL - 1)
+    report_cache._put("report:new", {"version": 2, "body": "{}"})
+
+    assert backend.get(report_cache.SHARED_PREFIX + "report:old") is None
+    assert backend.get(report_cache.SHARED_PREFIX + "report:new")[1]["version"] == 2
+    assert backend.get("weather:[\"London\"]") is not None
+    report_cache.clear()
+    assert report_cache._get("report:new", 2)["version"] == 2   # read back from the shared file
+
+
+def test_memory_backend_prunes_by_prefix_and_age():
+    backend = cache.MemoryBackend()
+    backend.set("report-cache/a", 1, 10)
+    backend.set("report-cache/b", 2, 30)
+    backend.set("quote:[]", 3, 10)
+
+    backend.prune("report-cache/", 20)
+
+    assert backend.get("report-cache/a") is None
+    assert backend.get("report-cache/b") == (30, 2)
+    assert backend.get("quote:[]") == (10, 3)
@@ -0,0 +1,134 @@
+import os
+from datetime import datetime
+
+import pytest
+from flask import g
+from sqlalchemy import create_engine, select
+
+import migrations
+import rebalance_shards
+import shards
+from app import app, db, store_checkin, User, WellbeingData
+from shards import SHARDED_TABLES, ShardingError, use_shard
+
+QUOTE = {"quote": "Happiness depends upon ourselves.", "author": "Aristotle"}
+
+
+@pytest.fixture
+def sharding(monkeypatch):
+    """Call it to turn on two shards next to the test database; they are removed afterwards."""
+    monkeypatch.setattr(shards, "_engines", {})
+    monkeypatch.setattr(shards, "_assignments", {})
+
+    def enable():
+        monkeypatch.setattr(shards, "SHARD_COUNT", 2)
+        monkeypatch.setattr(rebalance_shards, "SHARD_COUNT", 2)
+    yield enable
+    shards.dispose_engines()
+    with app.app_context():
+        main_url = db.engine.url
+    for shard in shards.existing_shards(main_url):
+        os.remove(shards.shard_url(main_url, shard).database)
+
+
+def schema(engine):
+    """{table: column names} and index names of the per-user tables in one file."""
+    with engine.connect() as conn:
+        tables = {name: {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({name})")} for name in SHARDED_TABLES}
+        indexes = set(conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name NOT LIKE 'sqlite_%' "
+            f"AND tbl_name IN ({', '.join(repr(name) for name in SHARDED_TABLES)})"
+        ).scalars())
+        version = migrations.current_version(conn)
+    return tables, indexes, version
+
+
+def test_new_shard_files_match_the_migrated_main_schema(app_context, tmp_path):
+    url = db.engine.url.set(database=str(tmp_path / "new.shard0.db"))
+    shards.create_shard_schema(url)
+
+    shard_engine = create_engine(url)
+    assert schema(shard_engine) == schema(db.engine)
+    with shard_engine.connect() as conn:
+        tables = set(conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").scalars())
+    assert "user" not in tables and "daily_weather" not in tables   # never shadow the main database's
+    shard_engine.dispose()
+
+
+def test_older_shard_files_are_migrated_forward(app_context, tmp_path):
+    url = db.engine.url.set(database=str(tmp_path / "old.shard0.db"))
+    old = create_engine(url)
+    migrations.migrate(old, target=11, migrations=migrations.SHARD_MIGRATIONS)
+    old.dispose()
+
+    shards.create_shard_schema(url)
+
+    tables, _, version = schema(create_engine(url))
+    assert "data_version" in tables["analysis_report"]
+    assert version == migrations.LATEST_VERSION
+
+
+def test_per_user_tables_are_routed_to_the_selected_shard(app_context, sharding):
+    sharding()
+    wellbeing_mapper = db.inspect(WellbeingData).mapper
+    user_mapper = db.inspect(User).mapper
+
+    with pytest.raises(ShardingError):
+        db.session.get_bind(mapper=wellbeing_mapper)
+    assert db.session.get_bind(mapper=user_mapper) is db.engine
+
+    with use_shard(1):
+        assert db.session.get_bind(mapper=wellbeing_mapper).url.database.endswith(".shard1.db")
+    with app.test_request_context():
+        g.shard = 0   # what init_sharding's hook sets for the caller
+        assert db.session.get_bind(mapper=wellbeing_mapper).url.database.endswith(".shard0.db")
+        with use_shard(1):
+            assert db.session.get_bind(mapper=wellbeing_mapper).url.database.endswith(".shard1.db")
+
+
+def checkins_where(store, user_id):
+    engine = db.engine if store is None else shards.get_engine(db, store)
+    with engine.connect() as conn:
+        return conn.execute(select(WellbeingData.mood_score).where(WellbeingData.user_id == user_id)
+                            .order_by(WellbeingData.mood_score)).scalars().all()
+
+
+def seed(user_id, moods):
+    for mood in moods:
+        store_checkin(user_id, {"mood": mood, "sleep_hours": 7.0, "exercise_minutes": 20}, QUOTE, {"temp": 11.0})
+
+
+def test_rebalance_interrupted_before_the_delete_is_safe_to_rerun(app_context, make_user, sharding, monkeypatch):
+    users = [make_user("alice"), make_user("bob")]
+    for user_id in users:
+        seed(user_id, (1, 2, 3))
+    # Check-ins with the same timestamp are all kept
+    db.session.execute(db.update(WellbeingData).values(timestamp=datetime(2026, 3, 1, 9, 0)))
+    db.session.commit()
+    sharding()
+
+    remove_user = rebalance_shards.remove_user
+
+    def crash(engine, user_id):
+        raise RuntimeError("killed between copy and delete")
+
+    monkeypatch.setattr(rebalance_shards, "remove_user", crash)
+    with pytest.raises(RuntimeError):
+        rebalance_shards.rebalance()
+    first = users[0]
+    assert checkins_where(shards.placement(first), first) == [1, 2, 3]
+    assert checkins_where(None, first) == [1, 2, 3]   # the copy is in place, the original too
+
+    monkeypatch.setattr(rebalance_shards, "remove_user", remove_user)
+    summary = rebalance_shards.rebalance()
+
+    assert summary["users_moved"] == 2
+    for user_id in users:
+        assert checkins_where(shards.placement(user_id), user_id) == [1, 2, 3]
+        assert checkins_where(None, user_id) == []
+        assert shards.shard_of(db, user_id) == shards.placement(user_id)
+    for store in (None, 0, 1):
+        engine = db.engine if store is None else shards.get_engine(db, store)
+        assert rebalance_shards.moves_in(engine) == set()
+
+    assert rebalance_shards.rebalance()["users_moved"] == 0
@@ -0,0 +1,160 @@
+import asyncio
+import threading
+
+import pytest
+
+import api_service
+import breaker
+import cache
+from api_service import BoundedExecutor, ExecutorBusy
+from breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(breaker.time, "monotonic", clock)
+    return clock
+
+
+def fail():
+    raise ConnectionError("upstream down")
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    circuit = CircuitBreaker("test", failure_threshold=3, reset_seconds=30)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            circuit.call(fail)
+    assert circuit.state == CLOSED
+
+    assert circuit.call(lambda: "ok") == "ok"   # a success resets the count
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            circuit.call(fail)
+    assert circuit.state == OPEN
+
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        circuit.call(calls.append, "sent")
+    assert calls == []
+
+
+def test_failure_results_count_like_exceptions(clock):
+    circuit = CircuitBreaker("test", failure_threshold=2, reset_seconds=30)
+    for _ in range(2):
+        assert circuit.call(lambda: 503, is_failure=lambda status: status >= 500) == 503
+    assert circuit.state == OPEN
+
+
+def test_one_half_open_probe_closes_the_circuit_on_success(clock):
+    circuit = CircuitBreaker("test", failure_threshold=1, reset_seconds=30)
+    with pytest.raises(ConnectionError):
+        circuit.call(fail)
+
+    clock.now += 29
+    assert not circuit.allow()
+    clock.now += 2
+    assert circuit.allow() and circuit.state == HALF_OPEN
+    assert not circuit.allow()   # the probe is already out
+
+    circuit.record_success()
+    assert circuit.state == CLOSED and circuit.allow()
+
+
+def test_failed_probe_reopens_for_another_reset_period(clock):
+    circuit = CircuitBreaker("test", failure_threshold=5, reset_seconds=30)
+    for _ in range(5):
+        with pytest.raises(ConnectionError):
+            circuit.call(fail)
+
+    clock.now += 31
+    with pytest.raises(ConnectionError):
+        circuit.call(fail)   # the probe
+    assert circuit.state == OPEN
+
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        circuit.call(fail)
+    clock.now += 2
+    assert circuit.call(lambda: "ok") == "ok" and circuit.state == CLOSED
+
+
+def test_bounded_executor_sheds_past_its_queue():
+    release = threading.Event()
+    executor = BoundedExecutor(1, 1, thread_name_prefix="test")
+    running = executor.submit(release.wait, 5)
+    queued = executor.submit(release.wait, 5)
+
+    with pytest.raises(ExecutorBusy):
+        executor.submit(release.wait, 5)
+
+    release.set()
+    assert running.result(5) and queued.result(5)
+    assert executor.submit(lambda: "ok").result(5) == "ok"
+
+
+class CountingExecutor:
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, fn, *args):
+        self.tasks.append((fn, args))
+
+
+def test_concurrent_misses_share_one_executor_task():
+    calls = []
+
+    @cache.cached("shared-test", 60)
+    def lookup(city):
+        calls.append(city)
+        return {"temp": 12.0}
+
+    executor = CountingExecutor()
+    first = lookup.submit(executor, "London")
+    second = lookup.submit(executor, "London")
+    assert len(executor.tasks) == 1 and not first.done()
+
+    fn, args = executor.tasks[0]
+    fn(*args)
+    assert first.result(0) == second.result(0) == {"temp": 12.0}
+    assert calls == ["London"]
+
+    # A hit is answered without the executor
+    assert lookup.submit(executor, "London").result(0) == {"temp": 12.0}
+    assert len(executor.tasks) == 1
+
+
+def test_enrichment_falls_back_when_the_executor_is_full(monkeypatch):
+    class FullExecutor:
+        def submit(self, fn, *args):
+            raise ExecutorBusy("full")
+
+    monkeypatch.setattr(api_service, "get_executor", lambda: FullExecutor())
+
+    quote, weather = api_service.fetch_enrichment("London", budget=1)
+
+    assert quote == api_service.DEFAULT_QUOTE and weather is None
+    assert not cache._inflight
+
+
+def test_background_refresh_task_is_held_until_it_finishes():
+    async def refresh():
+        return {"temp": 12.0}
+
+    async def run():
+        cache._refresh_in_background_async("background-test", refresh, (), None)
+        assert len(cache._background_tasks) == 1
+        await asyncio.gather(*cache._background_tasks)
+        await asyncio.sleep(0)   # the done callbacks
+
+    asyncio.run(run())
+    assert not cache._background_tasks and not cache._refreshing
@@ -0,0 +1,162 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+import requests
+
+import weather_history
+from analysis_engine import compute_stats
+from app import app, db, store_checkin, DailyWeather, WellbeingAggregate, WellbeingData, WeatherObservation
+from benchmarks.stub_apis import ARCHIVE_PATH, start_stub_server
+from ingest import DEFAULT_CITY
+
+QUOTE = {"quote": "Happiness depends upon ourselves.", "author": "Aristotle"}
+MODELS = (db, WellbeingData, WellbeingAggregate, WeatherObservation, DailyWeather)
+
+
+@pytest.fixture(scope="module")
+def stub():
+    server, state, url = start_stub_server(latency_ms=0, jitter_ms=0, seed=1)
+    yield state, url
+    server.shutdown()
+
+
+@pytest.fixture
+def archive(stub, monkeypatch):
+    state, url = stub
+    monkeypatch.setattr(weather_history, "WEATHER_HISTORY_URL", url + ARCHIVE_PATH)
+    state.requests.clear()
+    return state
+
+
+def checkin_on(user_id, day, mood):
+    store_checkin(user_id, {"mood": mood, "sleep_hours": 7.0, "exercise_minutes": 20}, QUOTE, {"temp": 10.0})
+    row = db.session.execute(db.select(WellbeingData).order_by(WellbeingData.id.desc())).scalars().first()
+    row.timestamp = datetime.combine(day, datetime.min.time()) + timedelta(hours=12)
+    db.session.commit()
+
+
+def store_day(day, mean):
+    weather_history.store_daily(db, DailyWeather, [{
+        "location": DEFAULT_CITY, "day": day, "temp_min": mean - 3, "temp_max": mean + 3, "temp_mean": mean,
+        "precipitation": 0.0, "fetched_at": datetime.utcnow(),
+    }])
+    db.session.commit()
+
+
+def data_version(user_id):
+    db.session.expire_all()
+    return db.session.get(WellbeingAggregate, user_id).data_version
+
+
+def full_stats(user_id):
+    _, matrix = weather_history.load_day_weather_series(db, WellbeingData, WeatherObservation, DailyWeather, user_id)
+    return compute_stats(matrix, keys=weather_history.DAY_WEATHER_KEYS)
+
+
+def assert_same_stats(actual, expected):
+    assert actual["entries"] == expected["entries"]
+    for section in ("mean", "stdev", "correlations"):
+        for key, value in expected[section].items():
+            assert actual[section][key] == pytest.approx(value, abs=1e-9) if value is not None else actual[section][key] is None
+
+
+def test_plan_spans_groups_days_up_to_the_span_length():
+    days = [date(2026, 1, 1), date(2026, 1, 2), date(2026, 1, 3), date(2026, 1, 4), date(2026, 3, 1)]
+
+    assert weather_history.plan_spans(days, span_days=3) == [
+        (date(2026, 1, 1), date(2026, 1, 3)),
+        (date(2026, 1, 4), date(2026, 1, 4)),
+        (date(2026, 3, 1), date(2026, 3, 1)),
+    ]
+    assert weather_history.plan_spans([]) == []
+
+
+def test_missing_days_lists_checkin_days_without_history(app_context, make_user):
+    user_id = make_user()
+    for day in (date(2026, 1, 1), date(2026, 1, 2), date(2026, 1, 5)):
+        checkin_on(user_id, day, 3)
+    store_day(date(2026, 1, 2), 5.0)
+
+    assert weather_history.missing_days(db, WellbeingData, WeatherObservation, DailyWeather) == {
+        DEFAULT_CITY: [date(2026, 1, 1), date(2026, 1, 5)],
+    }
+    assert weather_history.missing_days(db, WellbeingData, WeatherObservation, DailyWeather,
+                                        start=date(2026, 1, 3)) == {DEFAULT_CITY: [date(2026, 1, 5)]}
+
+
+def test_backfill_stores_each_span_and_leaves_failed_spans_for_the_next_run(app_context, make_user, archive, monkeypatch):
+    user_id = make_user()
+    days = [date(2026, 1, 1), date(2026, 1, 2), date(2026, 2, 1)]
+    for day in days:
+        checkin_on(user_id, day, 3)
+    version = data_version(user_id)
+
+    fetch = weather_history.fetch_daily_history
+
+    def fail_february(location, start, end):
+        if start.month == 2:
+            raise requests.ConnectionError("archive unreachable")
+        return fetch(location, start, end)
+
+    monkeypatch.setattr(weather_history, "fetch_daily_history", fail_february)
+    summary = weather_history.backfill(*MODELS, span_days=7)
+
+    assert summary == {"requests": 2, "days_stored": 2,
+                       "failed_spans": [{"location": DEFAULT_CITY, "start": "2026-02-01", "end": "2026-02-01"}]}
+    assert archive.requests == {ARCHIVE_PATH: 1}
+    assert sorted(db.session.execute(db.select(DailyWeather.day)).scalars()) == days[:2]
+    assert data_version(user_id) == version + 1
+
+    monkeypatch.setattr(weather_history, "fetch_daily_history", fetch)
+    summary = weather_history.backfill(*MODELS, span_days=7)
+
+    assert summary == {"requests": 1, "days_stored": 1, "failed_spans": []}
+    assert weather_history.missing_days(db, WellbeingData, WeatherObservation, DailyWeather) == {}
+
+
+def test_day_weather_stats_match_the_full_join(app_context, make_user):
+    user_id = make_user(tier="premium")
+    for offset, (mood, mean) in enumerate([(2, 4.0), (3, 6.5), (4, 7.0), (5, 11.0)]):
+        day = date(2026, 1, 1) + timedelta(days=offset)
+        store_day(day, mean)
+        checkin_on(user_id, day, mood)
+    checkin_on(user_id, date(2026, 2, 1), 1)   # no history for this day yet
+
+    result = weather_history.day_weather_stats(*MODELS, user_id)
+
+    assert result["entries"] == 4
+    assert_same_stats(result, full_stats(user_id))
+    assert result["correlations"]["day_mean_temp"] > 0.9
+
+
+def test_day_weather_stats_fold_in_new_checkins_and_reload_after_a_backfill(app_context, make_user):
+    user_id = make_user(tier="premium")
+    for offset, mean in enumerate([3.0, 8.0, 5.0]):
+        day = date(2026, 1, 1) + timedelta(days=offset)
+        store_day(day, mean)
+        checkin_on(user_id, day, offset + 2)
+    weather_history.day_weather_stats(*MODELS, user_id)
+    misses = weather_history.stats["misses"]
+
+    assert weather_history.day_weather_stats(*MODELS, user_id)["entries"] == 3
+    assert weather_history.stats["misses"] == misses
+
+    # A new check-in: only it is joined
+    checkin_on(user_id, date(2026, 1, 2), 5)
+    refreshes = weather_history.stats["tail_refreshes"]
+    result = weather_history.day_weather_stats(*MODELS, user_id)
+    assert weather_history.stats["tail_refreshes"] == refreshes + 1
+    assert result["entries"] == 4
+    assert_same_stats(result, full_stats(user_id))
+
+    # A backfill gives an old check-in its weather: the moments are rebuilt
+    checkin_on(user_id, date(2026, 3, 1), 1)
+    weather_history.day_weather_stats(*MODELS, user_id)
+    store_day(date(2026, 3, 1), 1.0)
+    weather_history.invalidate_reports(db, WellbeingData, WellbeingAggregate, date(2026, 3, 1), date(2026, 3, 1))
+    db.session.commit()
+    misses = weather_history.stats["misses"]
+    result = weather_history.day_weather_stats(*MODELS, user_id)
+    assert weather_history.stats["misses"] == misses + 1
+    assert result["entries"] == 5
+    assert_same_stats(result, full_stats(user_id))
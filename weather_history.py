@@ -0,0 +1,347 @@
+# weather_history.py
+# Local store of daily weather per location (min/max/mean), backfilled in batches from
+# open-meteo's daily API. Analysis joins each check-in to the weather of its day with an
+# indexed lookup, instead of relying on the single reading taken at check-in time.
+# Each worker keeps the running moments of that join per user, tagged with the user's data
+# version, so a new check-in only joins the rows past the last one seen.
+# Usage: python weather_history.py [--location NAME] [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+
+import argparse
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+import requests
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from startup import lazy_import
+from analysis_engine import MIN_VARIANCE
+from api_service import upstream_get
+from ingest import DEFAULT_CITY
+from shards import each_shard, fan_out
+
+np = lazy_import("numpy")
+
+# --- Configuration ---
+# The archive endpoint takes the same daily parameters as the forecast one, for any past range
+WEATHER_HISTORY_URL = os.environ.get("WELLBEING_WEATHER_HISTORY_URL", "https://archive-api.open-meteo.com/v1/archive")
+WEATHER_HISTORY_TIMEZONE = "UTC"    # check-in timestamps are stored in UTC, so the days line up
+BACKFILL_SPAN_DAYS = 366            # days per upstream request
+DEFAULT_COORDINATES = (51.5074, 0.1278)
+LOCATION_COORDINATES = {DEFAULT_CITY: DEFAULT_COORDINATES}
+DAILY_VARIABLES = {
+    "temp_min": "temperature_2m_min",
+    "temp_max": "temperature_2m_max",
+    "temp_mean": "temperature_2m_mean",
+    "precipitation": "precipitation_sum",
+}
+DAY_WEATHER_CACHE_SIZE = 10000      # users whose day-weather moments each worker keeps
+# --- End Configuration ---
+
+# Columns of the day-level series: mood, then the weather of the check-in's day
+DAY_WEATHER_KEYS = ['mood', 'day_mean_temp', 'day_min_temp', 'day_max_temp']
+
+_day_moments = OrderedDict()   # user_id -> DayWeatherEntry, least recently used first
+_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0, "tail_refreshes": 0}
+
+
+def checkin_location(db, WeatherObservation):
+    """SQL expression for a check-in's location (rows without an observation were taken at the default city)."""
+    return db.func.coalesce(WeatherObservation.location, DEFAULT_CITY)
+
+
+def checkin_day(db, WellbeingData):
+    """SQL expression for a check-in's UTC day, comparable with DailyWeather.day."""
+    return db.func.date(WellbeingData.timestamp)
+
+
+def fetch_daily_history(location, start, end):
+    """
+    One upstream request for the daily weather of `location` from `start` to `end` (inclusive).
+    Returns DailyWeather column dicts; days the API has no temperatures for yet are left out.
+    Raises requests.RequestException (or KeyError/ValueError on a malformed body).
+    """
+    latitude, longitude = LOCATION_COORDINATES.get(location, DEFAULT_COORDINATES)
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "daily": list(DAILY_VARIABLES.values()),
+        "timezone": WEATHER_HISTORY_TIMEZONE,
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+    }
+    response = upstream_get("weather_history", WEATHER_HISTORY_URL, params=params)
+    response.raise_for_status()
+    daily = response.json()["daily"]
+
+    columns = {column: daily.get(variable) or [None] * len(daily["time"]) for column, variable in DAILY_VARIABLES.items()}
+    now = datetime.utcnow()
+    rows = []
+    for i, day in enumerate(daily["time"]):
+        row = {column: values[i] for column, values in columns.items()}
+        if row["temp_min"] is None and row["temp_max"] is None and row["temp_mean"] is None:
+            continue
+        if row["temp_mean"] is None and row["temp_min"] is not None and row["temp_max"] is not None:
+            row["temp_mean"] = (row["temp_min"] + row["temp_max"]) / 2
+        row.update(location=location, day=date.fromisoformat(day), fetched_at=now)
+        rows.append(row)
+    return rows
+
+
+def store_daily(db, DailyWeather, rows):
+    """Upserts DailyWeather rows by (location, day) in one statement."""
+    if not rows:
+        return
+    statement = sqlite_insert(DailyWeather.__table__)
+    db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=["location", "day"],
+            set_={column: statement.excluded[column] for column in list(DAILY_VARIABLES) + ["fetched_at"]},
+        ),
+        rows,
+    )
+
+
+def missing_days(db, WellbeingData, WeatherObservation, DailyWeather, location=None, start=None, end=None):
+    """Returns {location: sorted days} that have check-ins but no stored daily weather."""
+    location_column = checkin_location(db, WeatherObservation)
+    day_column = checkin_day(db, WellbeingData)
+    query = (
+        db.select(location_column, day_column).distinct()
+        .select_from(WellbeingData)
+        .outerjoin(WeatherObservation, WellbeingData.weather_id == WeatherObservation.id)
+        .outerjoin(DailyWeather, db.and_(DailyWeather.location == location_column, DailyWeather.day == day_column))
+        .where(DailyWeather.id.is_(None))
+    )
+    if location is not None:
+        query = query.where(location_column == location)
+    if start is not None:
+        query = query.where(WellbeingData.timestamp >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        query = query.where(WellbeingData.timestamp < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+
+    missing = {}
+    # Every shard scanned at once
+    for rows in fan_out(lambda: db.session.execute(query).all()):
+        for name, day in rows:
+            missing.setdefault(name, set()).add(date.fromisoformat(day))
+    return {name: sorted(days) for name, days in missing.items()}
+
+
+def plan_spans(days, span_days=BACKFILL_SPAN_DAYS):
+    """Groups sorted days into (start, end) request ranges of at most `span_days` days each."""
+    spans = []
+    for day in days:
+        if spans and (day - spans[-1][0]).days < span_days:
+            spans[-1][1] = day
+        else:
+            spans.append([day, day])
+    return [tuple(span) for span in spans]
+
+
+def invalidate_reports(db, WellbeingData, WellbeingAggregate, start, end):
+    """
+    Bumps the data version of every user with check-ins between `start` and `end`, so cached
+    reports refresh. Those check-ins now join to different weather, so the version also
+    counts as a rewrite (see aggregates.mark_rewritten) and day-weather moments are rebuilt.
+    """
+    users = (
+        db.select(WellbeingData.user_id).distinct()
+        .where(WellbeingData.timestamp >= datetime.combine(start, datetime.min.time()))
+        .where(WellbeingData.timestamp < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    )
+    for _ in each_shard():
+        db.session.execute(
+            db.update(WellbeingAggregate)
+            .where(WellbeingAggregate.user_id.in_(users))
+            .values(data_version=WellbeingAggregate.data_version + 1,
+                    series_version=WellbeingAggregate.data_version + 1,
+                    updated_at=datetime.utcnow())
+        )
+
+
+def backfill(db, WellbeingData, WellbeingAggregate, WeatherObservation, DailyWeather,
+             location=None, start=None, end=None, span_days=BACKFILL_SPAN_DAYS):
+    """
+    Fetches daily weather for every (location, day) that has check-ins but no history yet,
+    one upstream request per span of up to `span_days` days. Each span is its own transaction,
+    so a failed request only leaves its own days for the next run. Returns a summary dict.
+    """
+    summary = {"requests": 0, "days_stored": 0, "failed_spans": []}
+    for name, days in missing_days(db, WellbeingData, WeatherObservation, DailyWeather, location, start, end).items():
+        for span_start, span_end in plan_spans(days, span_days):
+            summary["requests"] += 1
+            try:
+                rows = fetch_daily_history(name, span_start, span_end)
+            except (requests.RequestException, KeyError, ValueError) as e:
+                print(f"[Weather History] {name} {span_start}..{span_end} failed. Error: {e}")
+                summary["failed_spans"].append({"location": name, "start": span_start.isoformat(), "end": span_end.isoformat()})
+                continue
+            store_daily(db, DailyWeather, rows)
+            if rows:
+                invalidate_reports(db, WellbeingData, WellbeingAggregate, span_start, span_end)
+            db.session.commit()
+            summary["days_stored"] += len(rows)
+            print(f"[Weather History] {name} {span_start}..{span_end}: {len(rows)} days stored")
+    return summary
+
+
+def load_day_weather_series(db, WellbeingData, WeatherObservation, DailyWeather, user_id, after_id=None):
+    """
+    The user's check-ins joined to the weather of their day: (ids, matrix) where `ids` are
+    every check-in read and `matrix` is (n, len(DAY_WEATHER_KEYS)) floats for those whose
+    day has history (the others are left out). The join is a lookup on daily_weather's
+    (location, day) unique index per check-in. With `after_id`, only check-ins past it.
+    """
+    query = (
+        db.select(WellbeingData.id, DailyWeather.id, WellbeingData.mood_score,
+                  DailyWeather.temp_mean, DailyWeather.temp_min, DailyWeather.temp_max)
+        .select_from(WellbeingData)
+        .outerjoin(WeatherObservation, WellbeingData.weather_id == WeatherObservation.id)
+        .outerjoin(DailyWeather, db.and_(
+            DailyWeather.location == checkin_location(db, WeatherObservation),
+            DailyWeather.day == checkin_day(db, WellbeingData),
+        ))
+        .where(WellbeingData.user_id == user_id)
+    )
+    if after_id is not None:
+        # The + 0 keeps SQLite on the rowid range (only the new rows) rather than the user index
+        query = query.where(WellbeingData.id > after_id, WellbeingData.user_id + 0 == user_id)
+    rows = db.session.execute(query).all()
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    matrix = np.array([row[2:] for row in rows if row[1] is not None], dtype=float)
+    return ids, matrix.reshape(len(matrix), len(DAY_WEATHER_KEYS))
+
+
+class DayWeatherEntry:
+    def __init__(self, version, count, max_id, moments):
+        self.version = version
+        self.count = count      # check-ins read, joined or not
+        self.max_id = max_id
+        self.moments = moments
+
+
+def day_weather_moments(values):
+    """
+    Moments of mood (column 0) against every column over the pairwise-complete rows:
+    {n, x_mean, x_m2, y_mean, y_m2, cm}, one array entry per column.
+    """
+    values = np.asarray(values, dtype=float)
+    paired = ~np.isnan(values) & ~np.isnan(values[:, :1])
+    n = paired.sum(axis=0).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = np.where(n > 0, np.where(paired, values[:, :1], 0.0).sum(axis=0) / n, 0.0)
+        y_mean = np.where(n > 0, np.where(paired, values, 0.0).sum(axis=0) / n, 0.0)
+    x_dev = np.where(paired, values[:, :1] - x_mean, 0.0)
+    y_dev = np.where(paired, values - y_mean, 0.0)
+    return {"n": n, "x_mean": x_mean, "x_m2": (x_dev ** 2).sum(axis=0),
+            "y_mean": y_mean, "y_m2": (y_dev ** 2).sum(axis=0), "cm": (x_dev * y_dev).sum(axis=0)}
+
+
+def merge_day_weather_moments(a, b):
+    """Chan et al. combination of two day_weather_moments() results."""
+    n = a["n"] + b["n"]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = np.where(n > 0, a["n"] * b["n"] / n, 0.0)
+        share = np.where(n > 0, b["n"] / n, 0.0)
+    dx = b["x_mean"] - a["x_mean"]
+    dy = b["y_mean"] - a["y_mean"]
+    return {
+        "n": n,
+        "x_mean": a["x_mean"] + dx * share,
+        "x_m2": a["x_m2"] + b["x_m2"] + dx ** 2 * weight,
+        "y_mean": a["y_mean"] + dy * share,
+        "y_m2": a["y_m2"] + b["y_m2"] + dy ** 2 * weight,
+        "cm": a["cm"] + b["cm"] + dx * dy * weight,
+    }
+
+
+def stats_from_day_moments(moments):
+    """The analysis_engine.compute_stats() shape from day_weather_moments(); mood is never NULL."""
+    n, y_m2 = moments["n"], moments["y_m2"]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stdevs = np.where(n > 1, np.sqrt(y_m2 / (n - 1)), 0.0)
+        r = np.clip(moments["cm"] / np.sqrt(moments["x_m2"] * y_m2), -1.0, 1.0)
+    valid_r = (n >= 2) & (moments["x_m2"] > MIN_VARIANCE) & (y_m2 > MIN_VARIANCE)
+    return {
+        'entries': int(n[0]),
+        'mean': {key: float(moments["y_mean"][i]) for i, key in enumerate(DAY_WEATHER_KEYS)},
+        'stdev': {key: float(stdevs[i]) for i, key in enumerate(DAY_WEATHER_KEYS)},
+        'correlations': {
+            key: float(r[i]) if valid_r[i] else None
+            for i, key in enumerate(DAY_WEATHER_KEYS) if i > 0
+        },
+    }
+
+
+def _store_entry(user_id, entry):
+    with _lock:
+        _day_moments[user_id] = entry
+        _day_moments.move_to_end(user_id)
+        while len(_day_moments) > DAY_WEATHER_CACHE_SIZE:
+            _day_moments.popitem(last=False)
+
+
+def day_weather_stats(db, WellbeingData, WellbeingAggregate, WeatherObservation, DailyWeather, user_id):
+    """
+    Mood against the daily mean/min/max temperature, shaped like compute_stats().
+    Served from this worker's moments while the user's data version is unchanged; when only
+    new check-ins were added since (series_version not newer), just those are joined and
+    folded in, otherwise the whole history is joined again.
+    """
+    state = db.session.execute(
+        db.select(WellbeingAggregate.data_version, WellbeingAggregate.count, WellbeingAggregate.series_version)
+        .filter_by(user_id=user_id)
+    ).first()
+    with _lock:
+        entry = _day_moments.get(user_id)
+        if entry is not None:
+            _day_moments.move_to_end(user_id)
+    if state is not None and entry is not None:
+        if entry.version == state.data_version:
+            stats["hits"] += 1
+            return stats_from_day_moments(entry.moments)
+        if entry.version < state.data_version and (state.series_version or 0) <= entry.version:
+            ids, matrix = load_day_weather_series(db, WellbeingData, WeatherObservation, DailyWeather, user_id,
+                                                  after_id=entry.max_id)
+            if entry.count + len(ids) == state.count:
+                moments = merge_day_weather_moments(entry.moments, day_weather_moments(matrix))
+                max_id = max(entry.max_id, int(ids.max())) if len(ids) else entry.max_id
+                _store_entry(user_id, DayWeatherEntry(state.data_version, state.count, max_id, moments))
+                stats["tail_refreshes"] += 1
+                return stats_from_day_moments(moments)
+
+    stats["misses"] += 1
+    ids, matrix = load_day_weather_series(db, WellbeingData, WeatherObservation, DailyWeather, user_id)
+    moments = day_weather_moments(matrix)
+    if state is not None:
+        _store_entry(user_id, DayWeatherEntry(state.data_version, len(ids), int(ids.max()) if len(ids) else 0, moments))
+    return stats_from_day_moments(moments)
+
+
+def invalidate(user_id=None):
+    """Drops one user's day-weather moments, or all of them."""
+    with _lock:
+        if user_id is None:
+            _day_moments.clear()
+        else:
+            _day_moments.pop(user_id, None)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Backfill the local daily weather history for stored check-ins.")
+    parser.add_argument("--location", help="only this location (default: every location with check-ins)")
+    parser.add_argument("--start", type=date.fromisoformat, help="first day to consider (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="last day to consider (YYYY-MM-DD)")
+    parser.add_argument("--span-days", type=int, default=BACKFILL_SPAN_DAYS, help="days per upstream request")
+    args = parser.parse_args()
+
+    from app import app, db, WellbeingData, WellbeingAggregate, WeatherObservation, DailyWeather
+    from migrations import migrate
+
+    with app.app_context():
+        migrate(db.engine)
+        summary = backfill(db, WellbeingData, WellbeingAggregate, WeatherObservation, DailyWeather,
+                           location=args.location, start=args.start, end=args.end, span_days=args.span_days)
+        print(json.dumps(summary, indent=2))